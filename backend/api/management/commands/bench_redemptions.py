@@ -0,0 +1,83 @@
+import threading
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+from api.models import Coupon, Order
+from api.services import redeem, remaining_uses, set_usage_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Đo thông lượng trừ lượt dùng coupon khi nhiều luồng cùng trừ (không chia shard và có chia shard), "
+        "kiểm tra không bị dùng quá usage_limit. Chạy trên database test tạo riêng rồi hủy, không ghi vào DB thật."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--uses', type=int, default=400, help="usage_limit của coupon tạm")
+        parser.add_argument('--shards', nargs='+', type=int, default=[0, 8])
+
+    def handle(self, *args, **options):
+        # Các luồng dùng connection riêng nên không thể bọc trong 1 transaction rồi rollback
+        # (luồng khác không thấy dữ liệu chưa commit): chuyển sang database test như khi chạy test
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            for shards in options['shards']:
+                self._bench(shards, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def _bench(self, shards, options):
+        coupon = Coupon.objects.create(code=f'BENCH-{uuid.uuid4().hex[:8]}', usage_limit=options['uses'])
+        order = Order.objects.create()
+        try:
+            if shards:
+                coupon = set_usage_shards(coupon, shards)
+            redeemed, retries, elapsed = self._run(order, coupon, options['threads'], options['uses'])
+            coupon.refresh_from_db()
+            left = remaining_uses(coupon)
+            line = (
+                f"shards={shards:<3} threads={options['threads']:<3} redeemed={redeemed:<5} left={left:<5} "
+                f"retries={retries:<5} {redeemed / elapsed:,.0f} redemption(s)/s"
+            )
+            if redeemed > options['uses'] or redeemed + left != options['uses']:
+                self.stdout.write(self.style.ERROR(line + "  OVERSOLD"))
+            else:
+                self.stdout.write(line)
+        finally:
+            order.delete()
+            coupon.delete()
+
+    def _run(self, order, coupon, threads, uses):
+        counts = [0, 0]
+        counts_lock = threading.Lock()
+        # Mỗi luồng thử nhiều hơn số lượt để chắc chắn chạm mốc hết lượt
+        attempts = uses * 2 // threads + 1
+
+        def worker():
+            redeemed = retries = 0
+            try:
+                for _ in range(attempts):
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                redeemed += redeem(order, coupon)
+                            break
+                        except OperationalError:
+                            # SQLite khóa cả file khi ghi: thử lại
+                            retries += 1
+            finally:
+                connection.close()
+            with counts_lock:
+                counts[0] += redeemed
+                counts[1] += retries
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return counts[0], counts[1], time.perf_counter() - started
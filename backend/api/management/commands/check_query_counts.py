@@ -0,0 +1,51 @@
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.mixins import ListModelMixin
+from rest_framework.test import APIClient
+from api import urls as api_urls
+
+
+class Command(BaseCommand):
+    help = (
+        "Gọi từng endpoint danh sách (ListCreate) với nhiều giá trị limit và báo lỗi "
+        "nếu số query thay đổi theo kích thước trang (N+1). "
+        "Cần dữ liệu có nhiều dòng hơn limit nhỏ nhất để kết quả có ý nghĩa."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limits', nargs='+', type=int, default=[1, 10, 50])
+
+    def handle(self, *args, **options):
+        limits = sorted(options['limits'])
+        client = APIClient()
+        failures = []
+
+        for pattern in api_urls.urlpatterns:
+            view_class = getattr(pattern.callback, 'view_class', None)
+            if view_class is None or not issubclass(view_class, ListModelMixin) or pattern.pattern.converters:
+                continue
+            url = reverse(pattern.name)
+            counts = []
+            for limit in limits:
+                # Đếm query trên mọi alias vì request đọc có thể được chuyển sang replica
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(conn)) for conn in connections.all()]
+                    response = client.get(url, {'limit': limit})
+                if response.status_code != 200:
+                    failures.append(f"{url}: HTTP {response.status_code}")
+                    break
+                counts.append(sum(len(queries) for queries in captured))
+            else:
+                line = f"{url:<30} " + "  ".join(f"limit={l}: {c}" for l, c in zip(limits, counts))
+                if len(set(counts)) > 1:
+                    failures.append(line)
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+
+        if failures:
+            raise CommandError("Query count depends on page size:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("Query count is constant for every list endpoint."))
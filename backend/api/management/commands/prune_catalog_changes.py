@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.services import prune_catalog_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Xóa nhật ký thay đổi catalog cũ (mặc định CATALOG_CHANGE_RETENTION_DAYS ngày), chạy định kỳ. "
+        "Máy POS đồng bộ từ phiên bản đã bị xóa sẽ nhận lại toàn bộ catalog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None)
+
+    def handle(self, *args, **options):
+        deleted = prune_catalog_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} catalog change(s)."))
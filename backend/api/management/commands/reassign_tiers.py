@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.services import reassign_tiers
+
+
+class Command(BaseCommand):
+    help = "Xếp lại tier của toàn bộ khách hàng theo điểm hiện tại (1 câu UPDATE)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-points', type=int, default=None, help="Chỉ khách có điểm >= giá trị này")
+        parser.add_argument('--max-points', type=int, default=None, help="Chỉ khách có điểm < giá trị này")
+
+    def handle(self, *args, **options):
+        updated = reassign_tiers(min_points=options['min_points'], max_points=options['max_points'])
+        self.stdout.write(self.style.SUCCESS(f"Reassigned tiers for {updated} customer(s)."))
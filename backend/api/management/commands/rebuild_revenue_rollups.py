@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.services import rebuild_daily_revenue
+
+
+class Command(BaseCommand):
+    help = "Tính lại bảng doanh thu theo ngày (DailyRevenue) từ lịch sử đơn hàng và trả hàng."
+
+    def handle(self, *args, **options):
+        days = rebuild_daily_revenue()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt revenue rollups for {days} day(s)."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.services import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Xây lại chỉ mục tìm kiếm toàn văn (FTS5) cho product, variant, khách hàng và nhà cung cấp."
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} row(s)."))
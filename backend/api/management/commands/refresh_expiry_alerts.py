@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.services import refresh_expiry_alerts
+
+
+class Command(BaseCommand):
+    help = "Tính lại danh sách lô sắp hết hạn (ExpiryAlert), chạy định kỳ mỗi ngày."
+
+    def handle(self, *args, **options):
+        count = refresh_expiry_alerts()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} expiry alert(s)."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from api.models import Discount, Coupon
+from api.services import set_usage_shards, remaining_uses
+
+
+class Command(BaseCommand):
+    help = (
+        "Chia lượt dùng còn lại của 1 discount/coupon vào nhiều bộ đếm (shard) trước đợt khuyến mãi lớn "
+        "để các đơn đồng thời không tranh nhau 1 dòng. --shards 0 để gộp lại."
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--discount', type=int)
+        target.add_argument('--coupon', type=int)
+        parser.add_argument('--shards', type=int, required=True)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 256:
+            raise CommandError("--shards phải nằm trong khoảng 0..256.")
+        model, target_id = (Discount, options['discount']) if options['discount'] else (Coupon, options['coupon'])
+        try:
+            target = set_usage_shards(model.objects.get(pk=target_id), options['shards'])
+        except model.DoesNotExist:
+            raise CommandError(f"{model.__name__} {target_id} không tồn tại.")
+        except ValidationError as e:
+            raise CommandError(str(e.detail[0]))
+        self.stdout.write(self.style.SUCCESS(
+            f"{model.__name__} {target.pk}: {remaining_uses(target)} use(s) left across {target.usage_shards} shard(s)."
+        ))
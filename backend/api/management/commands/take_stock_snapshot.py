@@ -0,0 +1,27 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.services import take_stock_snapshot, ledger_drift
+
+
+class Command(BaseCommand):
+    help = "Chốt tồn kho cuối ngày từ sổ kho (mặc định: hôm qua), chạy định kỳ mỗi ngày."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None, help="Ngày cần chốt (YYYY-MM-DD)")
+        parser.add_argument('--check', action='store_true', help="So sánh Inventory.balance với tồn tính từ sổ kho")
+
+    def handle(self, *args, **options):
+        day = options['date'] or timezone.localdate() - timedelta(days=1)
+        try:
+            rows = take_stock_snapshot(day)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Stored {rows} stock snapshot row(s) for {day}."))
+
+        if options['check']:
+            drift = ledger_drift()
+            for variant_id, inventory, ledger in drift:
+                self.stdout.write(self.style.WARNING(f"Variant {variant_id}: inventory {inventory}, ledger {ledger}"))
+            if not drift:
+                self.stdout.write(self.style.SUCCESS("Inventory matches the stock ledger."))
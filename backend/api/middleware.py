@@ -0,0 +1,117 @@
+import logging
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
+from rest_framework.views import APIView
+from backend.routers import use_replica
+from .services.profiling import request_metrics
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+logger = logging.getLogger('api.profiling')
+
+
+class ReadReplicaMiddleware:
+    """
+    Chuyển các request GET tới view danh sách/chi tiết (hoặc view có
+    use_read_replica = True) sang đọc từ replica.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = use_replica.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            use_replica.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS:
+            return None
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        default = view_class is not None and issubclass(view_class, (ListModelMixin, RetrieveModelMixin))
+        if getattr(view_class, 'use_read_replica', default):
+            use_replica.set(True)
+        return None
+
+
+class _QueryCounter:
+    """execute_wrapper đếm số query và thời gian SQL trên mọi connection của request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+
+class QueryProfilingMiddleware:
+    """
+    Đo cho mỗi request tới view DRF: số query, tổng thời gian SQL, thời gian
+    xử lý ngoài SQL (app: thời gian view + render trừ đi SQL, gồm cả kiểm tra quyền, service,
+    serializer) và kích thước response.
+    - Số liệu được cộng dồn theo tên URL, xem tại endpoint metrics/.
+    - QUERY_PROFILING_HEADERS = True: trả thêm header X-Query-Count, Server-Timing...
+    - Ghi log cảnh báo khi số query vượt QUERY_BUDGETS[tên URL] (hoặc DEFAULT_QUERY_BUDGET).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        request._query_counter = counter
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        profile = getattr(request, '_query_profile', None)
+        if profile is None:
+            return response
+        endpoint, view_start, sql_before = profile
+        queries = counter.queries
+        sql_ms = counter.sql_time * 1000
+        view_ms = (time.perf_counter() - view_start) * 1000
+        app_ms = max(view_ms - (counter.sql_time - sql_before) * 1000, 0)
+        size = 0 if response.streaming else len(response.content)
+
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(endpoint, getattr(settings, 'DEFAULT_QUERY_BUDGET', None))
+        over_budget = budget is not None and queries > budget
+        if over_budget:
+            logger.warning(
+                "Endpoint %s vượt ngân sách query: %d query (giới hạn %d) - %s %s",
+                endpoint, queries, budget, request.method, request.get_full_path()
+            )
+        request_metrics.record(endpoint, queries, sql_ms, app_ms, size, over_budget)
+
+        if getattr(settings, 'QUERY_PROFILING_HEADERS', False):
+            response['X-Query-Count'] = str(queries)
+            response['X-SQL-Time-Ms'] = f"{sql_ms:.2f}"
+            response['X-App-Time-Ms'] = f"{app_ms:.2f}"
+            response['Server-Timing'] = f"sql;dur={sql_ms:.2f}, app;dur={app_ms:.2f}"
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        counter = getattr(request, '_query_counter', None)
+        if counter is None or view_class is None or not issubclass(view_class, APIView):
+            return None
+        endpoint = request.resolver_match.url_name or view_class.__name__
+        request._query_profile = (endpoint, time.perf_counter(), counter.sql_time)
+        return None
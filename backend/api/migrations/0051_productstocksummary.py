@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_summaries(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    ProductVariant = apps.get_model('api', 'ProductVariant')
+    VariantAttribute = apps.get_model('api', 'VariantAttribute')
+    Inventory = apps.get_model('api', 'Inventory')
+    ProductStockSummary = apps.get_model('api', 'ProductStockSummary')
+
+    prices = dict(Product.objects.values_list('id', 'prod_price'))
+    summaries = {pid: ProductStockSummary(product_id=pid) for pid in prices}
+    for product_id, balance in Inventory.objects.filter(variant__product__isnull=False).values_list('variant__product_id', 'balance'):
+        summaries[product_id].total_balance += balance or 0
+    first_values = {}
+    for variant_id, value in VariantAttribute.objects.order_by('id').values_list('variant_id', 'value__value'):
+        first_values.setdefault(variant_id, value)
+    for variant in ProductVariant.objects.filter(product__isnull=False).order_by('id'):
+        summary = summaries[variant.product_id]
+        summary.variant_count += 1
+        if variant.id in first_values:
+            summary.attributes_display.append({
+                "value": first_values[variant.id],
+                "default_extra_price": variant.variant_price - prices[variant.product_id],
+                "order": variant.order if variant.order else None
+            })
+    ProductStockSummary.objects.bulk_create(summaries.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0050_batchallocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStockSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_balance', models.IntegerField(default=0)),
+                ('variant_count', models.IntegerField(default=0)),
+                ('attributes_display', models.JSONField(blank=True, default=list)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_summary', to='api.product')),
+            ],
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
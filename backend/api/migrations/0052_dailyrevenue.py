@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:39
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+
+def build_daily_revenue(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    ReturnOrder = apps.get_model('api', 'ReturnOrder')
+    DailyRevenue = apps.get_model('api', 'DailyRevenue')
+
+    rows = {}
+    for item in Order.objects.filter(status='COMPLETE').values('order_date').annotate(total=Sum('total_amount'), count=Count('id')):
+        rows[item['order_date']] = DailyRevenue(date=item['order_date'], total_amount=item['total'] or 0, order_count=item['count'])
+    for item in ReturnOrder.objects.exclude(status='CANCELED').annotate(day=Coalesce('order__order_date', 'return_date')).values('day').annotate(refund=Sum('total_refurn')):
+        rows.setdefault(item['day'], DailyRevenue(date=item['day'])).refund_amount = item['refund'] or 0
+    DailyRevenue.objects.bulk_create(rows.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0051_productstocksummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('total_amount', models.IntegerField(default=0)),
+                ('refund_amount', models.IntegerField(default=0)),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_daily_revenue, migrations.RunPython.noop),
+    ]
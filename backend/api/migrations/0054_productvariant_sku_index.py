@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0053_catalogchange'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productvariant',
+            name='sku',
+            field=models.CharField(blank=True, db_index=True, max_length=50, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = [
+    ('api_product', 'prod_name'),
+    ('api_productvariant', 'variant_name'),
+    ('api_productvariant', 'sku'),
+    ('api_customer', 'cus_name'),
+    ('api_customer', 'cus_phone'),
+    ('api_supplier', 'sup_name'),
+]
+
+# rowid = id * 4 + loại (0: product, 1: variant, 2: customer, 3: supplier)
+SQLITE_POPULATE = [
+    "INSERT INTO api_search_index (rowid, kind, body) SELECT id * 4 + 0, 0, coalesce(prod_name, '') || ' ' || coalesce(barcode, '') FROM api_product",
+    "INSERT INTO api_search_index (rowid, kind, body) SELECT id * 4 + 1, 1, coalesce(variant_name, '') || ' ' || coalesce(sku, '') FROM api_productvariant",
+    "INSERT INTO api_search_index (rowid, kind, body) SELECT id * 4 + 2, 2, coalesce(cus_name, '') || ' ' || coalesce(cus_phone, '') FROM api_customer",
+    "INSERT INTO api_search_index (rowid, kind, body) SELECT id * 4 + 3, 3, coalesce(sup_name, '') FROM api_supplier",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS api_search_index USING fts5("
+            "kind UNINDEXED, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        for sql in SQLITE_POPULATE:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, column in TRIGRAM_INDEXES:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS api_search_index")
+    elif vendor == 'postgresql':
+        for table, column in TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0054_productvariant_sku_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
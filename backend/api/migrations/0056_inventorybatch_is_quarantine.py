@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0055_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorybatch',
+            name='is_quarantine',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:54
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_costs(apps, schema_editor):
+    ProductVariant = apps.get_model('api', 'ProductVariant')
+    Inventory = apps.get_model('api', 'Inventory')
+    InventoryBatch = apps.get_model('api', 'InventoryBatch')
+    BatchAllocation = apps.get_model('api', 'BatchAllocation')
+    PurchaseDetail = apps.get_model('api', 'PurchaseDetail')
+
+    # purchase_price của lô cũ là tổng tiền dòng nhập: giữ lại ở legacy_purchase_total
+    InventoryBatch.objects.update(legacy_purchase_total=F('purchase_price'))
+
+    # Chỉ chia ra giá 1 đơn vị khi tìm lại được số lượng của dòng nhập (đúng 1 số lượng cho cùng variant,
+    # đơn vị, tổng tiền), còn lại lấy giá vốn hiện tại của variant
+    line_qtys = {}
+    for variant_id, unit_id, total, qty in PurchaseDetail.objects.filter(variant__isnull=False, qty__gt=0).values_list(
+        'variant_id', 'unit_id', 'total', 'qty'
+    ):
+        line_qtys.setdefault((variant_id, unit_id, total), set()).add(qty)
+    cost_prices = dict(ProductVariant.objects.values_list('id', 'variant_cost_price'))
+    batches = list(InventoryBatch.objects.filter(variant__isnull=False))
+    for batch in batches:
+        qtys = line_qtys.get((batch.variant_id, batch.unit_id, batch.legacy_purchase_total), set())
+        if len(qtys) == 1:
+            batch.purchase_price = batch.legacy_purchase_total // next(iter(qtys))
+        else:
+            batch.purchase_price = cost_prices.get(batch.variant_id) or 0
+    InventoryBatch.objects.bulk_update(batches, ['purchase_price'], batch_size=500)
+
+    BatchAllocation.objects.filter(batch__isnull=False).update(
+        unit_cost=Subquery(InventoryBatch.objects.filter(id=OuterRef('batch_id')).values('purchase_price')[:1])
+    )
+    cost_price = Subquery(ProductVariant.objects.filter(id=OuterRef('variant_id')).values('variant_cost_price')[:1])
+    Inventory.objects.filter(variant__isnull=False).update(stock_value=F('balance') * cost_price)
+
+
+def restore_purchase_prices(apps, schema_editor):
+    InventoryBatch = apps.get_model('api', 'InventoryBatch')
+    InventoryBatch.objects.filter(legacy_purchase_total__isnull=False).update(purchase_price=F('legacy_purchase_total'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0056_inventorybatch_is_quarantine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batchallocation',
+            name='unit_cost',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='stock_value',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inventorybatch',
+            name='legacy_purchase_total',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_costs, restore_purchase_prices),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def record_opening_balances(apps, schema_editor):
+    Inventory = apps.get_model('api', 'Inventory')
+    StockMovement = apps.get_model('api', 'StockMovement')
+    # Tồn hiện tại là số dư đầu kỳ của sổ kho
+    StockMovement.objects.bulk_create([
+        StockMovement(kind='OPENING', variant_id=row['variant_id'], qty=row['qty'] or 0, value=row['value'] or 0)
+        for row in Inventory.objects.filter(variant__isnull=False).values('variant_id').annotate(qty=Sum('balance'), value=Sum('stock_value')).order_by('variant_id')
+        if row['qty'] or row['value']
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0057_inventory_costing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('OPENING', 'Opening'), ('RECEIPT', 'Receipt'), ('SALE', 'Sale'), ('RELEASE', 'Release')], max_length=10)),
+                ('qty', models.IntegerField()),
+                ('value', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='api.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'variant'], name='stock_movement_time_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.IntegerField(default=0)),
+                ('stock_value', models.BigIntegerField(default=0)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='api.productvariant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'variant'), name='unique_stock_snapshot_date_variant')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
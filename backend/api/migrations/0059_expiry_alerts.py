@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0058_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiryAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant_name', models.CharField(blank=True, max_length=100)),
+                ('unit_name', models.CharField(blank=True, max_length=100)),
+                ('qty', models.IntegerField(default=0)),
+                ('received_date', models.DateField(blank=True, null=True)),
+                ('expiry_date', models.DateField(db_index=True)),
+                ('purchase_price', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='expiry_warning_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='inventorybatch',
+            index=models.Index(fields=['expiry_date', 'qty'], name='batch_expiry_qty_idx'),
+        ),
+        migrations.AddField(
+            model_name='expiryalert',
+            name='batch',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_alert', to='api.inventorybatch'),
+        ),
+        migrations.AddField(
+            model_name='expiryalert',
+            name='variant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.productvariant'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_redemptions(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    PromotionRedemption = apps.get_model('api', 'PromotionRedemption')
+    # Đơn đã dùng discount/coupon trước khi có nhật ký: ghi lại để sửa đơn vẫn hoàn được lượt
+    rows = []
+    for order_id, discount_id, coupon_id in Order.objects.exclude(discount__isnull=True, coupon__isnull=True).values_list('id', 'discount_id', 'coupon_id'):
+        if discount_id:
+            rows.append(PromotionRedemption(order_id=order_id, discount_id=discount_id))
+        if coupon_id:
+            rows.append(PromotionRedemption(order_id=order_id, coupon_id=coupon_id))
+    PromotionRedemption.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0059_expiry_alerts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='usage_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='discount',
+            name='usage_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PromotionRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('coupon', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.coupon')),
+                ('discount', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.discount')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='api.order')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RedemptionShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('remaining', models.IntegerField(default=0)),
+                ('coupon', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='usage_counters', to='api.coupon')),
+                ('discount', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='usage_counters', to='api.discount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('discount', 'index'), name='unique_discount_shard'), models.UniqueConstraint(fields=('coupon', 'index'), name='unique_coupon_shard')],
+            },
+        ),
+        migrations.RunPython(backfill_redemptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+def normalize_codes(apps, schema_editor):
+    # Chuẩn hóa mã như Coupon.normalize_code; mã trùng sau chuẩn hóa được thêm hậu tố -<id>
+    # (-<id>-2, -<id>-3... nếu hậu tố lại trùng 1 mã đã có)
+    Coupon = apps.get_model('api', 'Coupon')
+    coupons = list(Coupon.objects.order_by('id'))
+    normalized = {coupon.id: ' '.join((coupon.code or '').split()).upper() for coupon in coupons}
+    # Mã giữ nguyên (lần xuất hiện đầu tiên) của mọi coupon, để hậu tố không trùng mã nào trong bảng
+    taken = set()
+    renamed = []
+    for coupon in coupons:
+        if normalized[coupon.id] in taken:
+            renamed.append(coupon)
+        else:
+            taken.add(normalized[coupon.id])
+
+    for coupon in renamed:
+        code = normalized[coupon.id]
+        attempt = 1
+        while True:
+            suffix = f'-{coupon.id}' if attempt == 1 else f'-{coupon.id}-{attempt}'
+            candidate = code[:20 - len(suffix)] + suffix
+            if candidate not in taken:
+                break
+            attempt += 1
+        normalized[coupon.id] = candidate
+        taken.add(candidate)
+
+    changed = [coupon for coupon in coupons if normalized[coupon.id] != coupon.code]
+    for coupon in changed:
+        coupon.code = normalized[coupon.id]
+    Coupon.objects.bulk_update(changed, ['code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0060_promotion_redemptions'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='coupon',
+            name='code',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+    ]
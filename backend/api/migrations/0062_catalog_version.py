@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:44
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_changes(apps, schema_editor):
+    CatalogChange = apps.get_model('api', 'CatalogChange')
+    CatalogVersion = apps.get_model('api', 'CatalogVersion')
+    # Các dòng cũ đã commit hết nên id vẫn dùng được làm phiên bản
+    CatalogChange.objects.update(version=F('id'))
+    CatalogVersion.objects.create(pk=1, version=CatalogChange.objects.aggregate(version=Max('id'))['version'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0061_coupon_code_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('pruned_version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='catalogchange',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='catalogchange',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+    ]
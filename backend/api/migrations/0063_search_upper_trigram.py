@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+# icontains trên PostgreSQL sinh UPPER(col::text) LIKE UPPER(%s): index phải dựng trên đúng biểu thức đó
+TRIGRAM_INDEXES = [
+    ('api_product', 'prod_name'),
+    ('api_product', 'barcode'),
+    ('api_productvariant', 'variant_name'),
+    ('api_productvariant', 'sku'),
+    ('api_customer', 'cus_name'),
+    ('api_customer', 'cus_phone'),
+    ('api_supplier', 'sup_name'),
+]
+
+# Index trigram trên cột thô của 0055
+RAW_TRIGRAM_INDEXES = [index for index in TRIGRAM_INDEXES if index != ('api_product', 'barcode')]
+
+
+def create_upper_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in RAW_TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_trgm")
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_{column}_upper_trgm ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def drop_upper_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{column}_upper_trgm")
+    for table, column in RAW_TRIGRAM_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0062_catalog_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_upper_indexes, drop_upper_indexes),
+    ]
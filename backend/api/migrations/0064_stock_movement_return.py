@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0063_search_upper_trigram'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('OPENING', 'Opening'), ('RECEIPT', 'Receipt'), ('SALE', 'Sale'), ('RELEASE', 'Release'), ('RETURN', 'Return'), ('QUARANTINE', 'Quarantine')], max_length=10),
+        ),
+    ]
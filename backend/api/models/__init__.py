@@ -1,6 +1,6 @@
-from .product import Category, Unit, Product, Attribute, AttributeValue, VariantAttribute, ProductVariant
-from .inventory import Inventory, InventoryBatch
-from .promotion import Discount, PromotionCondition, GiftProduct, Coupon, LoyaltyReward, LoyaltyProgram, RewardTier, Customer
-from .order import Order, OrderDetail, Invoice, PointTransactions
+from .product import Category, Unit, Product, Attribute, AttributeValue, VariantAttribute, ProductVariant, CatalogChange, CatalogVersion
+from .inventory import Inventory, InventoryBatch, BatchAllocation, ExpiryAlert, ProductStockSummary, StockMovement, StockSnapshot
+from .promotion import Discount, PromotionCondition, GiftProduct, Coupon, RedemptionShard, PromotionRedemption, LoyaltyReward, LoyaltyProgram, RewardTier, Customer
+from .order import Order, OrderDetail, Invoice, PointTransactions, DailyRevenue
 from .supply import Supplier, PurchaseDetail, PurchaseOrder
 from .return_order import ReturnDetail, ReturnOrder
\ No newline at end of file
@@ -1,11 +1,14 @@
 from django.db import models
-from .product import ProductVariant, Unit
+from django.utils import timezone
+from .product import Product, ProductVariant, Unit
 
 
 class Inventory(models.Model):
     quantity_in = models.IntegerField(default=0)
     quantity_out = models.IntegerField(default=0)
     balance = models.IntegerField(default=0)
+    # Tổng giá trị hàng đang tồn (theo phương pháp tính giá vốn), giá vốn bình quân = stock_value / balance
+    stock_value = models.BigIntegerField(default=0)
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True)
     unit = models.ForeignKey(Unit, on_delete=models.CASCADE, null=True, blank=True)
     
@@ -19,4 +22,78 @@ class InventoryBatch(models.Model):
     expiry_date = models.DateField(blank=True, null=True)
     purchase_price = models.IntegerField(default=0)
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='variant')
-    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, null=True, blank=True)    
\ No newline at end of file
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, null=True, blank=True)    
+    # Lô cách ly chứa hàng trả về chưa bán lại được, không được dùng khi xuất kho
+    is_quarantine = models.BooleanField(default=False)
+    # Lô nhập trước khi tính giá vốn: purchase_price cũ là tổng tiền dòng nhập, giữ lại để đối chiếu
+    legacy_purchase_total = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expiry_date', 'qty'], name='batch_expiry_qty_idx'),
+        ]
+
+class BatchAllocation(models.Model):
+    qty = models.IntegerField(default=0)
+    # qty và giá vốn theo đơn vị của Inventory (lô cũng được giữ theo đơn vị này, xem to_stock_unit).
+    # Giá vốn của 1 đơn vị lúc xuất (giá lô với FIFO, giá bình quân với AVERAGE)
+    unit_cost = models.IntegerField(default=0)
+    batch = models.ForeignKey(InventoryBatch, on_delete=models.CASCADE, related_name='allocations')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE)
+    order_detail = models.ForeignKey('OrderDetail', on_delete=models.CASCADE, related_name='allocations', null=True, blank=True)
+
+
+class ExpiryAlert(models.Model):
+    """Lô sắp hết hạn, tính sẵn bởi refresh_expiry_alerts để endpoint cảnh báo đọc trực tiếp."""
+    batch = models.OneToOneField(InventoryBatch, on_delete=models.CASCADE, related_name='expiry_alert')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE)
+    variant_name = models.CharField(max_length=100, blank=True)
+    unit_name = models.CharField(max_length=100, blank=True)
+    qty = models.IntegerField(default=0)
+    received_date = models.DateField(null=True, blank=True)
+    expiry_date = models.DateField(db_index=True)
+    purchase_price = models.IntegerField(default=0)
+
+
+class ProductStockSummary(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='stock_summary')
+    total_balance = models.IntegerField(default=0)
+    variant_count = models.IntegerField(default=0)
+    attributes_display = models.JSONField(default=list, blank=True)
+
+
+class StockMovement(models.Model):
+    """Sổ kho chỉ ghi thêm: mỗi dòng là 1 lần tăng/giảm tồn của 1 variant."""
+    class Kind(models.TextChoices):
+        OPENING = 'OPENING', 'Opening'
+        RECEIPT = 'RECEIPT', 'Receipt'
+        SALE = 'SALE', 'Sale'
+        RELEASE = 'RELEASE', 'Release'
+        RETURN = 'RETURN', 'Return'
+        # Hàng trả về đưa vào lô cách ly: không thuộc tồn bán được nên không cộng vào tồn của sổ kho
+        QUARANTINE = 'QUARANTINE', 'Quarantine'
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    # Số lượng và giá trị có dấu: nhập dương, xuất âm
+    qty = models.IntegerField()
+    value = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='stock_movements')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'variant'], name='stock_movement_time_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """Tồn kho của variant tại cuối ngày date, tính từ sổ kho."""
+    date = models.DateField()
+    balance = models.IntegerField(default=0)
+    stock_value = models.BigIntegerField(default=0)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='stock_snapshots')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'variant'], name='unique_stock_snapshot_date_variant')
+        ]
@@ -22,6 +22,16 @@ class Order(models.Model):
     employee = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, null=True, blank=True, related_name='order_coupon')
     discount = models.ForeignKey(Discount, on_delete=models.CASCADE, null=True, blank=True, related_name="order_discount")
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lưu trạng thái lúc nạp để biết đơn chuyển sang/khỏi COMPLETE khi save
+        instance.loaded_revenue_state = instance.revenue_state()
+        return instance
+    
+    def revenue_state(self):
+        return (self.__dict__.get('status'), self.__dict__.get('total_amount'), self.__dict__.get('order_date'))
 
 
 class OrderDetail(models.Model):
@@ -54,4 +64,11 @@ class PointTransactions(models.Model):
     points_earned = models.FloatField(default=0)
     points_used = models.FloatField(default=0)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True)
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
\ No newline at end of file
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+    
+    
+class DailyRevenue(models.Model):
+    date = models.DateField(unique=True)
+    total_amount = models.IntegerField(default=0)
+    refund_amount = models.IntegerField(default=0)
+    order_count = models.IntegerField(default=0)
\ No newline at end of file
@@ -1,10 +1,13 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Category(models.Model):
     cate_name = models.CharField(max_length=100)
     cate_desc = models.TextField(max_length=1000, null=True, blank=True)
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True)
+    # Số ngày cảnh báo trước khi lô hết hạn, để trống thì dùng EXPIRY_WARNING_DAYS
+    expiry_warning_days = models.PositiveIntegerField(null=True, blank=True)
     
     def __str__(self):
         return self.cate_name
@@ -81,7 +84,7 @@ class AttributeValue(models.Model):
             
 class ProductVariant(models.Model):
     variant_name = models.CharField(max_length=100, null=True, blank=True)
-    sku = models.CharField(max_length=50, null=True, blank=True)
+    sku = models.CharField(max_length=50, null=True, blank=True, db_index=True)
     variant_price = models.IntegerField(default=0)
     variant_cost_price = models.IntegerField(default=0)
     product = models.ForeignKey(Product, models.CASCADE, null=True, default=True)
@@ -103,4 +106,18 @@ class VariantAttribute(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['value', 'variant'], name='primary_key_variant_value')
         ]
-        
\ No newline at end of file
+        
+
+class CatalogChange(models.Model):
+    # Nhật ký chỉ ghi thêm: version lấy từ CatalogVersion trong cùng transaction ghi (không dùng id tự tăng
+    # vì id của các transaction đồng thời có thể commit không theo thứ tự)
+    version = models.BigIntegerField(default=0, db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+
+
+class CatalogVersion(models.Model):
+    """Bộ đếm phiên bản catalog (1 dòng), khóa dòng khi tăng nên các phiên bản commit đúng thứ tự."""
+    version = models.BigIntegerField(default=0)
+    # Nhật ký tới phiên bản này đã bị xóa (prune_catalog_changes): client cũ hơn phải lấy lại toàn bộ
+    pruned_version = models.BigIntegerField(default=0)
@@ -20,6 +20,8 @@ class Discount(models.Model):
     promotion_value_type = models.CharField(max_length=10, choices=PromotionValueType.choices, null=True, blank=True)
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name="discount", null=True, blank=True)
     qty = models.IntegerField(default=0, null=True, blank=True)
+    # > 0: lượt dùng được chia vào các RedemptionShard để giảm tranh chấp khóa
+    usage_shards = models.PositiveSmallIntegerField(default=0)
     def __str__(self):
         return self.discount_name
     
@@ -51,12 +53,46 @@ class Coupon(models.Model):
         FIX = "FIX", "Fix"
         PERCENTAGE = "PERCENTAGE", "Percentage"
         
-    code = models.CharField(max_length=20)
+    # Luôn lưu dạng chuẩn hóa (normalize_code) nên unique/index trên cột này không phân biệt hoa thường
+    code = models.CharField(max_length=20, unique=True)
     start_date = models.DateTimeField(null=True, blank=True)
     end_date = models.DateTimeField(null=True, blank=True)
     usage_limit = models.IntegerField(null=True, blank=True)
     promotion_value = models.IntegerField(null=True, blank=True)
     promotion_value_type = models.CharField(max_length=10, choices=PromotionValueType.choices, null=True, blank=True)
+    usage_shards = models.PositiveSmallIntegerField(default=0)
+
+    @staticmethod
+    def normalize_code(code):
+        return ' '.join((code or '').split()).upper()
+
+    def save(self, *args, **kwargs):
+        self.code = self.normalize_code(self.code)
+        super().save(*args, **kwargs)
+
+
+class RedemptionShard(models.Model):
+    """1 phần lượt dùng còn lại của discount/coupon được chia shard."""
+    index = models.PositiveSmallIntegerField()
+    remaining = models.IntegerField(default=0)
+    discount = models.ForeignKey(Discount, on_delete=models.CASCADE, null=True, blank=True, related_name='usage_counters')
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, null=True, blank=True, related_name='usage_counters')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['discount', 'index'], name='unique_discount_shard'),
+            models.UniqueConstraint(fields=['coupon', 'index'], name='unique_coupon_shard'),
+        ]
+
+
+class PromotionRedemption(models.Model):
+    """Mỗi lượt dùng discount/coupon của 1 đơn, dùng để hoàn lượt khi sửa đơn."""
+    order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='redemptions')
+    discount = models.ForeignKey(Discount, on_delete=models.CASCADE, null=True, blank=True)
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, null=True, blank=True)
+    # Shard đã bị trừ (None nếu trừ trực tiếp trên usage_limit)
+    shard = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
     
 
 class RewardTier(models.Model):
@@ -78,11 +114,10 @@ class Customer(models.Model):
         return self.cus_name 
     
     def save(self, *args, **kwargs):
-        if not self.tier:
-            try:
-                self.tier = RewardTier.objects.get(pk=1)
-            except RewardTier.DoesNotExist:
-                pass  # Hoặc raise lỗi nếu cần
+        if not self.tier_id:
+            # Tier thấp nhất lấy từ bảng tier đã cache, không query mỗi lần lưu
+            from ..services.loyalty import default_tier
+            self.tier = default_tier()
         super().save(*args, **kwargs)  
        
     
@@ -19,6 +19,19 @@ class ReturnOrder(models.Model):
     status = models.CharField(max_length=10, default=Status.PENDING, choices=Status.choices)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True)
     order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lưu trạng thái lúc nạp để biết phiếu bị hủy/khôi phục hay đổi số tiền hoàn khi save
+        instance.loaded_refund_state = instance.refund_state()
+        return instance
+
+    def refund_state(self):
+        return (
+            self.__dict__.get('status'), self.__dict__.get('total_refurn'),
+            self.__dict__.get('order_id'), self.__dict__.get('return_date')
+        )
     
 
 class ReturnDetail(models.Model):
@@ -0,0 +1,163 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Coupon, Discount, PromotionCondition, GiftProduct, Product, ProductVariant, VariantAttribute, AttributeValue, Unit, Inventory, Order, ReturnOrder, Customer, Supplier, RewardTier
+from .services.inventory import schedule_stock_summary_refresh
+from .services.catalog import record_catalog_changes
+from .services.deferred import run_on_commit_batched
+from .services.scan import invalidate_scan_cache
+from .services.revenue import record_order_revenue, record_return_refund
+from .services.search import SEARCH_FIELDS, index_instances, remove_instances
+from .services.loyalty import invalidate_tier_cache
+from .services.expiry import refresh_expiry_alerts
+from .services.units import invalidate_unit_factors
+from .services.promotions import invalidate_promotion_rules
+from .services.coupons import invalidate_coupon_cache
+from .signals import stock_changed
+
+
+def _refresh_summaries_for_variants(variant_ids):
+    # Dùng query thay vì instance.variant vì variant có thể đã bị xóa (cascade)
+    product_ids = ProductVariant.objects.filter(id__in=variant_ids).values_list('product_id', flat=True)
+    schedule_stock_summary_refresh(set(product_ids))
+
+
+@receiver(stock_changed)
+def refresh_summaries_on_stock_changed(sender, variant_ids, **kwargs):
+    _refresh_summaries_for_variants(variant_ids)
+
+
+@receiver([post_save, post_delete], sender=Inventory)
+@receiver([post_save, post_delete], sender=VariantAttribute)
+def refresh_summary_on_variant_relation(sender, instance, **kwargs):
+    if instance.variant_id:
+        _refresh_summaries_for_variants([instance.variant_id])
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def refresh_summary_on_variant(sender, instance, **kwargs):
+    schedule_stock_summary_refresh({instance.product_id})
+
+
+@receiver(post_save, sender=Product)
+def refresh_summary_on_product(sender, instance, **kwargs):
+    schedule_stock_summary_refresh({instance.id})
+
+
+@receiver(post_save, sender=Order)
+def update_revenue_on_order_save(sender, instance, **kwargs):
+    record_order_revenue(instance)
+
+
+@receiver(post_delete, sender=Order)
+def update_revenue_on_order_delete(sender, instance, **kwargs):
+    record_order_revenue(instance, deleted=True)
+
+
+@receiver(post_save, sender=ReturnOrder)
+def update_refund_on_return_save(sender, instance, **kwargs):
+    record_return_refund(instance)
+
+
+@receiver(post_delete, sender=ReturnOrder)
+def update_refund_on_return_delete(sender, instance, **kwargs):
+    record_return_refund(instance, deleted=True)
+
+
+def _variants_changed(variant_ids):
+    # Catalog POS và cache quét mã đều phải biết variant nào vừa thay đổi
+    variant_ids = list(variant_ids)
+    record_catalog_changes(variant_ids)
+    run_on_commit_batched(invalidate_scan_cache, variant_ids)
+
+
+@receiver(stock_changed)
+def variants_changed_on_stock_changed(sender, variant_ids, **kwargs):
+    _variants_changed(variant_ids)
+
+
+@receiver([post_save, post_delete], sender=Inventory)
+@receiver([post_save, post_delete], sender=VariantAttribute)
+def variants_changed_on_variant_relation(sender, instance, **kwargs):
+    _variants_changed([instance.variant_id])
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def variants_changed_on_variant(sender, instance, **kwargs):
+    _variants_changed([instance.id])
+
+
+@receiver(post_save, sender=Product)
+def variants_changed_on_product(sender, instance, **kwargs):
+    _variants_changed(ProductVariant.objects.filter(product=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Unit)
+def variants_changed_on_unit(sender, instance, **kwargs):
+    # Cache quét mã không giữ tên đơn vị nên chỉ catalog cần biết
+    record_catalog_changes(ProductVariant.objects.filter(product__unit=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=AttributeValue)
+def variants_changed_on_attribute_value(sender, instance, **kwargs):
+    _variants_changed(ProductVariant.objects.filter(variantattribute__value=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Supplier)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    # Bỏ qua các lần lưu không đụng tới field được index (ví dụ cập nhật tier, công nợ)
+    if update_fields and not set(update_fields) & set(SEARCH_FIELDS[sender]):
+        return
+    index_instances([instance])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Supplier)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_instances(sender, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=RewardTier)
+def invalidate_tiers_on_change(sender, instance, **kwargs):
+    # Xóa ngay cho transaction hiện tại và xóa lại khi commit để không giữ bản cũ
+    invalidate_tier_cache()
+    transaction.on_commit(invalidate_tier_cache)
+
+
+@receiver(stock_changed)
+def refresh_expiry_alerts_on_stock_changed(sender, variant_ids, **kwargs):
+    # Số lượng của lô thay đổi hoặc có lô mới: tính lại cảnh báo của các variant này khi commit
+    run_on_commit_batched(refresh_expiry_alerts, variant_ids)
+
+
+@receiver(post_save, sender=Category)
+def refresh_expiry_alerts_on_category(sender, instance, **kwargs):
+    run_on_commit_batched(refresh_expiry_alerts, ProductVariant.objects.filter(product__category=instance).values_list('id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Unit)
+def invalidate_unit_factors_on_change(sender, instance, **kwargs):
+    invalidate_unit_factors()
+    transaction.on_commit(invalidate_unit_factors)
+
+
+@receiver([post_save, post_delete], sender=Discount)
+@receiver([post_save, post_delete], sender=PromotionCondition)
+@receiver([post_save, post_delete], sender=GiftProduct)
+@receiver([post_save, post_delete], sender=ProductVariant)
+def invalidate_promotions_on_change(sender, instance, **kwargs):
+    # Giá variant dùng để tính giá trị quà tặng nên cũng biên dịch lại khi variant đổi.
+    # Trừ/hoàn lượt dùng đi qua services.redemptions (update trực tiếp, không phát signal)
+    invalidate_promotion_rules()
+    transaction.on_commit(invalidate_promotion_rules)
+
+
+@receiver([post_save, post_delete], sender=Coupon)
+def invalidate_coupons_on_change(sender, instance, **kwargs):
+    invalidate_coupon_cache()
+    transaction.on_commit(invalidate_coupon_cache)
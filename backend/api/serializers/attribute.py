@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from ..models import Unit, Attribute, AttributeValue
+from ..services import creates_unit_cycle
 from django.db import transaction       
 
 
@@ -8,6 +9,16 @@ class UnitSerializer(serializers.ModelSerializer):
     class Meta:
         model = Unit
         fields = ['id', 'unit_name', 'contains', 'reference_unit', 'reference_unit_name']
+
+    def validate(self, attrs):
+        reference_unit = attrs.get('reference_unit', self.instance.reference_unit if self.instance else None)
+        contains = attrs.get('contains', self.instance.contains if self.instance else None)
+        if reference_unit:
+            if not contains or contains <= 0:
+                raise serializers.ValidationError("contains phải lớn hơn 0 khi có đơn vị tham chiếu.")
+            if self.instance and creates_unit_cycle(self.instance.id, reference_unit.id):
+                raise serializers.ValidationError("Đơn vị tham chiếu tạo thành vòng lặp quy đổi.")
+        return attrs
         
 
 class AttributeValueSerializer(serializers.ModelSerializer):
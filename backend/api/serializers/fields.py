@@ -0,0 +1,31 @@
+from rest_framework import serializers
+from ..models import ProductVariant, Unit
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Lấy instance từ dữ liệu đã nạp sẵn ở serializer gốc thay vì 1 query cho mỗi dòng
+    def to_internal_value(self, data):
+        prefetched = getattr(self.root, '_prefetched', {}).get(self.get_queryset().model, {})
+        try:
+            return prefetched[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+class PrefetchedDetailsMixin:
+    """
+    Nạp toàn bộ variant và unit của danh sách chi tiết (details_field) bằng 2 query
+    trước khi validate, dùng cùng PrefetchedPrimaryKeyRelatedField ở serializer chi tiết.
+    """
+    details_field = None
+
+    def to_internal_value(self, data):
+        details = data.get(self.details_field) if hasattr(data, 'get') else None
+        if isinstance(details, list):
+            variant_ids = {d.get('variant') for d in details if isinstance(d, dict)}
+            unit_ids = {d.get('unit') for d in details if isinstance(d, dict)}
+            self._prefetched = {
+                ProductVariant: ProductVariant.objects.in_bulk([i for i in variant_ids if str(i).isdigit()]),
+                Unit: Unit.objects.in_bulk([i for i in unit_ids if str(i).isdigit()]),
+            }
+        return super().to_internal_value(data)
@@ -1,13 +1,13 @@
 from rest_framework import serializers
-from ..models import InventoryBatch, Inventory
+from ..models import ExpiryAlert, Inventory
 
 
-class InventoryBatchExpiryWarningSerializer(serializers.ModelSerializer):
-    variant_name = serializers.CharField(source='variant.variant_name', read_only=True)
-    unit_name = serializers.CharField(source='unit.unit_name', read_only=True)
+class ExpiryAlertSerializer(serializers.ModelSerializer):
+    # Giữ id là id của lô như trước khi có bảng ExpiryAlert
+    id = serializers.IntegerField(source='batch_id', read_only=True)
 
     class Meta:
-        model = InventoryBatch
+        model = ExpiryAlert
         fields = ['id', 'qty', 'received_date', 'expiry_date', 'purchase_price', 'variant_name', 'unit_name']
 
 
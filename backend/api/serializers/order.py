@@ -1,18 +1,25 @@
 from rest_framework import serializers
 from django.db import transaction
-from ..models import Order, OrderDetail, ProductVariant, Inventory, InventoryBatch, Discount, Coupon, GiftProduct
-from django.db.models import F
+from ..models import Order, OrderDetail, ProductVariant, Discount, GiftProduct, Unit, BatchAllocation
+from ..services import deduct_stock, release_stock, best_promotion, promotion_applies, refresh_promotion_rules, redeem, release_redemptions
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
+from .fields import PrefetchedPrimaryKeyRelatedField, PrefetchedDetailsMixin
 
 
 class OrderDetailSerializer(serializers.ModelSerializer):
+    # Cho phép gửi id khi sửa đơn để biết dòng nào giữ lại, dòng nào là dòng mới
+    id = serializers.IntegerField(required=False)
+    variant = PrefetchedPrimaryKeyRelatedField(queryset=ProductVariant.objects.all(), allow_null=True, required=False)
+    unit = PrefetchedPrimaryKeyRelatedField(queryset=Unit.objects.all())
+
     class Meta: 
         model = OrderDetail
         fields = ['id', 'order', 'variant', 'qty', 'total', 'unit']
         
         
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(PrefetchedDetailsMixin, serializers.ModelSerializer):
+    details_field = 'order_details'
     order_details = OrderDetailSerializer(
         many=True,
         required=False
@@ -26,40 +33,25 @@ class OrderSerializer(serializers.ModelSerializer):
         # Gán giá trị status là PENDING
         validated_data['status']="PENDING"
         total_amount = 0
-        
-        discount = None
-        coupon = None
-        discount_id = validated_data.get('discount', None)
-        coupon_id = validated_data.get('coupon', None)
-
-        if discount_id:
-            discount = Discount.objects.select_for_update().get(id=discount_id)
-        if coupon_id:
-            coupon = Coupon.objects.select_for_update().get(id=coupon_id)
+        coupon = validated_data.get('coupon', None)
         
         with transaction.atomic():
+            # Kiểm tra điều kiện discount được chọn hoặc tự áp dụng khuyến mãi tốt nhất
+            discount, auto = self._select_discount(validated_data.get('discount'), details_data)
+            validated_data['discount'] = discount
             order = Order.objects.create(**validated_data)
             
+            # Trừ kho cho toàn bộ giỏ hàng một lần
+            allocations = deduct_stock([(d['variant'], d['qty'], d['unit'].id) for d in details_data])
+            
             order_details = []
             for detail_data in details_data:
                 variant = detail_data['variant']
                 qty = detail_data['qty']
                 unit = detail_data['unit']
-                price=ProductVariant.objects.get(id=variant.id).variant_price
-                total = price * qty
+                total = variant.variant_price * qty
                 total_amount += total
                 
-                # Kiểm tra và cập nhật tồn kho
-                inventory = Inventory.objects.select_for_update().get(variant=variant)
-                if inventory.balance < qty:
-                    raise serializers.ValidationError(f"Sản phẩm {variant} không đủ tồn kho")
-                inventory.quantity_out = F('quantity_out') + qty
-                inventory.balance = F('balance') - qty
-                inventory.save()
-                
-                # Trừ hàng từ các batch theo FIFO
-                self._deduct_from_batches(variant, qty)
-                
                 # Tạo OrderDetail
                 detail = OrderDetail(
                     variant=variant,
@@ -70,14 +62,15 @@ class OrderSerializer(serializers.ModelSerializer):
                 )
                 order_details.append(detail)
             OrderDetail.objects.bulk_create(order_details)
+            self._save_allocations(order_details, allocations)
             
             # Xử lý discount
             if discount:
-                total_amount = self._apply_discount(order, discount, discount_id, total_amount)
+                total_amount = self._apply_discount(order, discount, discount.id, total_amount, auto)
             
             # Xử lý coupon
             if coupon: 
-                total_amount = self._apply_coupon(coupon, total_amount)
+                total_amount = self._apply_coupon(order, coupon, total_amount)
 
             order.total_amount = max(total_amount, 0)
             order.save()
@@ -85,8 +78,6 @@ class OrderSerializer(serializers.ModelSerializer):
     
     def update(self, instance, validate_data):
         order_details_data = validate_data.pop('order_details', None)  # Cho phép là None nếu không truyền
-        discount_id = validate_data.get('discount', None)
-        coupon_id = validate_data.get('coupon', None)
 
         with transaction.atomic():
             # ✅ Nếu không truyền order_details => chỉ cập nhật các field đơn giản
@@ -96,88 +87,131 @@ class OrderSerializer(serializers.ModelSerializer):
                 instance.save()
                 return instance
 
-            # 🔄 Nếu có order_details => thực hiện đầy đủ logic (rollback khuyến mãi, cập nhật kho,...)
-            if discount_id:
-                new_discount = Discount.objects.select_for_update().get(id=discount_id)
-            if coupon_id:
-                new_coupon = Coupon.objects.select_for_update().get(id=coupon_id)
+            # 🔄 Nếu có order_details => rollback khuyến mãi, cập nhật kho theo phần chênh lệch
+            if validate_data.get('status', instance.status) != Order.Status.PENDING:
+                raise ValidationError("Chỉ có thể sửa chi tiết của đơn đang chờ (PENDING).")
+
+            # Không gửi coupon/discount thì giữ cái cũ (lượt cũ được hoàn rồi trừ lại).
+            # Chỉ tự áp dụng khuyến mãi tốt nhất khi đơn chưa từng có discount
+            coupon = validate_data.get('coupon', instance.coupon)
+            discount = validate_data.get('discount', instance.discount)
 
             self._rollback_old_promotions(instance)
 
+            discount, auto = self._select_discount(discount, order_details_data, auto_apply=instance.discount is None)
+            validate_data['discount'] = discount
             for attr, value in validate_data.items():
                 setattr(instance, attr, value)
-            instance.save()
-
-            total_amount = 0
-
-            if instance.status == "PENDING":
-                # update order detail + inventory như hiện tại
-                new_order_detail_ids = {d.get('id') for d in order_details_data if d.get('id')}
-                old_order_detail_ids = set(instance.details.values_list('id', flat=True))
 
-                for old_detail_id in old_order_detail_ids:
-                    order_detail = OrderDetail.objects.get(id=old_detail_id, order=instance)
-                    variant = order_detail.variant
-                    qty = order_detail.qty
+            total_amount = self._apply_detail_changes(instance, order_details_data)
+            total_amount = self._apply_discount(instance, discount, discount, total_amount, auto)
+            total_amount = self._apply_coupon(instance, coupon, total_amount)
 
-                    inventory = Inventory.objects.get(variant=variant)
-                    inventory.quantity_out -= qty
-                    inventory.balance += qty
-                    inventory.save()
-
-                    batch = InventoryBatch.objects.filter(variant=variant).order_by('received_date').first()
-                    if batch:
-                        batch.qty += qty
-                        batch.save()
-
-                instance.details.filter(id__in=old_order_detail_ids - new_order_detail_ids).delete()
-
-                for detail_data in order_details_data:
-                    detail_id = detail_data.get('id')
-                    variant_id = detail_data.get('variant')
-                    qty = detail_data.get('qty', 1)
-                    unit = detail_data.get('unit', '')
+            instance.total_amount = max(total_amount, 0)
+            instance.save()
 
-                    price = ProductVariant.objects.get(id=variant_id).variant_price
-                    total = qty * price
-                    total_amount += total
+            return instance
+    
+    def _apply_detail_changes(self, order, details_data):
+        """
+        So sánh giỏ hàng đã lưu với giỏ hàng gửi lên (theo id của dòng):
+        - dòng bị bỏ hoặc đổi variant/đơn vị: hoàn kho toàn bộ số lượng cũ
+        - dòng tăng/giảm số lượng: chỉ xuất/hoàn phần chênh lệch
+        - dòng mới: xuất kho như khi tạo đơn
+        Dòng không đổi không đụng tới kho. Trả về tổng tiền hàng.
+        """
+        stored = {detail.id: detail for detail in order.order_details.all()}
+        requested_ids = {d.get('id') for d in details_data if d.get('id')}
+        unknown_ids = requested_ids - set(stored)
+        if unknown_ids:
+            raise ValidationError(f"Chi tiết đơn hàng {sorted(unknown_ids)} không thuộc đơn hàng này.")
 
-                    if detail_id and detail_id in old_order_detail_ids:
-                        OrderDetail.objects.filter(id=detail_id).update(
-                            variant=variant_id,
-                            order=instance,
-                            qty=qty,
-                            total=total,
-                            unit=unit
-                        )
-                    else:
-                        OrderDetail.objects.create(
-                            variant=variant_id,
-                            order=instance,
-                            qty=qty,
-                            total=total,
-                            unit=unit
-                        )
+        releases = [(detail, detail.qty) for detail_id, detail in stored.items() if detail_id not in requested_ids]
+        demands = []
+        changes = []
+        total_amount = 0
+        for detail_data in details_data:
+            variant = detail_data.get('variant')
+            qty = detail_data['qty']
+            total = variant.variant_price * qty if variant else 0
+            total_amount += total
+            detail = stored.get(detail_data.get('id'))
+            variant_id = variant.id if variant else None
+            if detail is None:
+                detail = OrderDetail(order=order)
+                if variant:
+                    demands.append((detail, variant, qty))
+            elif detail.variant_id != variant_id or detail.unit_id != detail_data['unit'].id:
+                releases.append((detail, detail.qty))
+                if variant:
+                    demands.append((detail, variant, qty))
+            elif qty > detail.qty:
+                demands.append((detail, variant, qty - detail.qty))
+            elif qty < detail.qty:
+                releases.append((detail, detail.qty - qty))
+            changes.append((detail, variant, qty, total, detail_data['unit']))
 
-                total_amount = self._apply_discount(instance, new_discount, discount_id, total_amount)
-                total_amount = self._apply_coupon(new_coupon, total_amount)
+        # Hoàn kho trước (theo variant cũ của dòng) để hàng vừa trả có thể xuất lại ngay
+        release_stock(releases)
 
-            instance.total_amount = max(total_amount, 0)
-            instance.save()
+        removed_ids = set(stored) - requested_ids
+        if removed_ids:
+            OrderDetail.objects.filter(id__in=removed_ids).delete()
 
-            return instance
+        created, updated = [], []
+        for detail, variant, qty, total, unit in changes:
+            if detail.pk is None:
+                detail.variant, detail.qty, detail.total, detail.unit = variant, qty, total, unit
+                created.append(detail)
+            elif (detail.variant_id, detail.qty, detail.total, detail.unit_id) != (
+                variant.id if variant else None, qty, total, unit.id
+            ):
+                detail.variant, detail.qty, detail.total, detail.unit = variant, qty, total, unit
+                updated.append(detail)
+        OrderDetail.objects.bulk_update(updated, ['variant', 'qty', 'total', 'unit'])
+        OrderDetail.objects.bulk_create(created)
 
+        if demands:
+            allocations = deduct_stock([(variant, qty, detail.unit_id) for detail, variant, qty in demands])
+            self._save_allocations([detail for detail, _, _ in demands], allocations)
+        return total_amount
     
-    def _apply_discount(self, order, discount, discount_id, total_amount):
+    def _select_discount(self, discount, details_data, auto_apply=True):
+        """
+        Discount được chọn phải thỏa điều kiện tối thiểu (PromotionCondition) với giỏ hàng.
+        Không chọn thì tự áp dụng khuyến mãi có lợi nhất (tính trên bảng luật đã biên dịch) nếu auto_apply.
+        Trả về (Discount hoặc None, có phải tự áp dụng không). Không khóa: lượt dùng được trừ có điều kiện khi áp dụng.
+        """
+        lines = [
+            (d['variant'].id, d['qty'], d['variant'].variant_price * d['qty'])
+            for d in details_data if d.get('variant')
+        ]
+        if discount:
+            if not promotion_applies(discount.id, lines):
+                # Có thể discount vừa được tạo/sửa ở worker khác: kiểm tra lại trên bảng luật mới nạp
+                if not (refresh_promotion_rules() and promotion_applies(discount.id, lines)):
+                    raise ValidationError("Đơn hàng không đủ điều kiện áp dụng khuyến mãi.")
+            return discount, False
+        if not auto_apply:
+            return None, False
+        best = best_promotion(lines)
+        discount = best and Discount.objects.filter(id=best['discount_id']).first()
+        if best and discount is None and refresh_promotion_rules():
+            # Bảng luật của process này còn discount đã bị xóa ở worker khác: nạp lại rồi chọn lại
+            best = best_promotion(lines)
+            discount = best and Discount.objects.filter(id=best['discount_id']).first()
+        return (discount, True) if discount else (None, False)
+
+    def _apply_discount(self, order, discount, discount_id, total_amount, auto=False):
         now = timezone.now()
         if discount:
-            if discount.usage_limit == 0:
-                raise ValidationError("Mã giảm giá đã hết lượt sử dụng.")
-            if not (discount.start_date <= now.date() <= discount.end_date):
-                raise ValidationError("Mã giảm giá không còn hiệu lực")
-            
-            discount.usage_limit -=1
-            discount.save()
+            expired = (discount.start_date and discount.start_date > now) or (discount.end_date and discount.end_date < now)
+            if expired or not redeem(order, discount):
+                if auto:
+                    # Khuyến mãi tự động vừa hết hạn/hết lượt (bảng luật chưa kịp cập nhật): bỏ qua thay vì báo lỗi
+                    order.discount = None
+                    return total_amount
+                raise ValidationError("Mã giảm giá không còn hiệu lực" if expired else "Mã giảm giá đã hết lượt sử dụng.")
             
             if discount.discount_type == "BUY_X_GET_Y" or discount.discount_type == "Buy-X-Get-Y":
                 self._apply_gift_product(order, discount_id)
@@ -188,89 +222,41 @@ class OrderSerializer(serializers.ModelSerializer):
                     total_amount -= discount.promotion_value 
         return total_amount
     
-    def _apply_coupon(self, coupon, total_amount):
+    def _apply_coupon(self, order, coupon, total_amount):
         now = timezone.now()
         if coupon: 
-            if coupon.usage_limit is not None:
-                if coupon.usage_limit == 0:
-                    raise ValidationError('Mã coupon đã hết lượt sử dụng.')
-                if not (coupon.start_date <= now.date() <= coupon.end_date):
-                    raise ValidationError('Mã coupon không còn hiệu lực.')
-                coupon.usage_limit -= 1
-                coupon.save()
-                if coupon.promotion_value_type == 'PERCENTAGE' or coupon.promotion_value_type == 'Percentage':
-                        total_amount *= (1 - coupon.promotion_value/100)
-                elif coupon.promotion_value_type == 'FIX' or coupon.promotion_value_type == 'Fix':
-                        total_amount -= coupon.promotion_value 
+            if (coupon.start_date and coupon.start_date > now) or (coupon.end_date and coupon.end_date < now):
+                raise ValidationError('Mã coupon không còn hiệu lực.')
+            if not redeem(order, coupon):
+                raise ValidationError('Mã coupon đã hết lượt sử dụng.')
+            if coupon.promotion_value_type == 'PERCENTAGE' or coupon.promotion_value_type == 'Percentage':
+                    total_amount *= (1 - coupon.promotion_value/100)
+            elif coupon.promotion_value_type == 'FIX' or coupon.promotion_value_type == 'Fix':
+                    total_amount -= coupon.promotion_value 
         return total_amount
     
     def _apply_gift_product(self, order, discount_id):
-        gift_variant = GiftProduct.objects.get(discount=discount_id)
-        gift_qty = gift_variant.qty
-        OrderDetail.objects.create(
+        gift = GiftProduct.objects.select_related('variant').get(discount=discount_id)
+        detail = OrderDetail.objects.create(
             order=order,
-            variant=gift_variant,
-            qty=gift_qty,
+            variant=gift.variant,
+            qty=gift.qty,
             total=0,
-            unit=gift_variant.unit
+            unit=gift.unit
         )
-        
-        gift_inventory = Inventory.objects.select_for_update().get(variant=gift_variant)
-        gift_inventory.quantity_out = F('quantity_out') + gift_qty
-        gift_inventory.balance = F('balance') - gift_qty
-        gift_inventory.save()
-        
-        gift_batches = InventoryBatch.objects.filter(variant=gift_variant).order_by('receied_date')
-        remaining_qty = gift_qty
-        for batch in gift_batches:
-            if batch.qty >= remaining_qty:
-                batch.qty -= remaining_qty
-                batch.save()
-                break
-            else:
-                remaining_qty -= batch.qty
-                batch.qty = 0
-                batch.save()
+        allocations = deduct_stock([(gift.variant, gift.qty, gift.unit_id)])
+        self._save_allocations([detail], allocations)
     
-    def _rollback_old_promotions(self, instance):
-        old_discount = instance.discount
-        old_coupon = instance.coupon
-        
-        # Hoàn lại usage_limit cho discount cũ
-        if old_discount and old_discount.usage_limit is not None:
-            old_discount.usage_limit +=1
-            old_discount.save()
-            
-        # Hoàn lại usage_limit cho coupon cũ
-        if old_coupon and old_coupon.usage_limit is not None:
-            old_coupon.usage_limit +=1
-            old_coupon.save()
-            
-        if old_discount and (old_discount.discount_type == "BUY_X_GET_Y" or old_discount.discount_type == "Buy-X-Get-Y"):
-            GiftProduct.objects.filter(id=old_discount.id).delete()
+    def _save_allocations(self, details, allocations):
+        # Lưu lại lô đã xuất cho từng OrderDetail (phục vụ trả hàng và giá vốn)
+        records = []
+        for detail, detail_allocations in zip(details, allocations):
+            for allocation in detail_allocations:
+                allocation.order_detail = detail
+                records.append(allocation)
+        BatchAllocation.objects.bulk_create(records)
     
-    def _deduct_from_batches(self, variant, qty_needed):
-        # Trừ số lượng từ InventoryBatch theo FIFO cho 1 variant.
-        
-        batches = InventoryBatch.objects.select_for_update().filter(
-            variant=variant,
-            qty__gt=0
-        ).order_by('received_date')
-
-        for batch in batches:
-            if qty_needed <= 0:
-                break
-
-            if batch.qty >= qty_needed:
-                batch.qty -= qty_needed
-                batch.save()
-                qty_needed = 0
-            else:
-                qty_needed -= batch.qty
-                batch.qty = 0
-                batch.save()
-
-        if qty_needed > 0:
-            raise serializers.ValidationError(
-                f"Tồn kho theo lô không đủ để đáp ứng số lượng yêu cầu cho variant {variant.id}"
-            )
\ No newline at end of file
+    def _rollback_old_promotions(self, instance):
+        # Hoàn lại lượt dùng discount/coupon cũ theo nhật ký PromotionRedemption của đơn.
+        # GiftProduct là cấu hình của discount nên không xóa; dòng quà cũ không gửi lại được hoàn kho ở _apply_detail_changes
+        release_redemptions(instance)
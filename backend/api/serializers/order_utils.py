@@ -1,15 +1,19 @@
 from rest_framework import serializers
-from ..models import ReturnDetail, ReturnOrder
+from ..models import ReturnDetail, ReturnOrder, Order, Customer
 
 
 class MergeOrderSerializer(serializers.Serializer):
     order_ids = serializers.ListField(
         child = serializers.IntegerField(), min_length=2,
-        help_text="List of order IDs to merge"
+        help_text="List of order IDs to merge, the first one is the target order"
     )   
+    consolidate = serializers.BooleanField(
+        default=False,
+        help_text="Merge lines with the same variant and unit into one line"
+    )
     
-    def validate(self, value):
-        if len(value) < 2:
+    def validate_order_ids(self, value):
+        if len(set(value)) < 2:
             raise serializers.ValidationError("Phải chọn ít nhất 2 đơn để gộp.")
         return value
     
@@ -19,20 +23,35 @@ class SplitItemSerializer(serializers.Serializer):
     qty = serializers.IntegerField(min_value=1)
    
     
+class SplitGroupSerializer(serializers.Serializer):
+    # Mỗi nhóm là 1 đơn mới (ví dụ 1 người trả tiền)
+    items = SplitItemSerializer(many=True, allow_empty=False)
+    customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all(), required=False, allow_null=True)
+    payment_method = serializers.ChoiceField(choices=Order.PaymentMethod.choices, required=False)
+    
+    
 class SplitOrderSerializer(serializers.Serializer):
     order_id = serializers.IntegerField()
-    split_items = SplitItemSerializer(many=True)
+    # Tách 2 phần: các dòng trong split_items chuyển sang 1 đơn mới
+    split_items = SplitItemSerializer(many=True, required=False)
+    # Tách N phần: mỗi phần tử của splits là 1 đơn mới
+    splits = SplitGroupSerializer(many=True, required=False, allow_empty=False)
     
     def validate(self, data):
-        if not data.get("split_items"):
+        if not data.get("split_items") and not data.get("splits"):
             raise serializers.ValidationError("Danh sách split_items không được rỗng.")
+        if data.get("split_items") and data.get("splits"):
+            raise serializers.ValidationError("Chỉ gửi 1 trong 2: split_items hoặc splits.")
         return data
     
 
 class ReturnDetailSerializer(serializers.ModelSerializer):
+    # False: hàng lỗi, đưa vào lô cách ly thay vì nhập lại lô đã xuất
+    restock = serializers.BooleanField(default=True, write_only=True)
+
     class Meta:
         model = ReturnDetail
-        fields = ['id', 'qty', 'unit_price', 'refund_amount', 'reason', 'variant', 'unit']
+        fields = ['id', 'qty', 'unit_price', 'refund_amount', 'reason', 'variant', 'unit', 'restock']
     
     
 class ReturnOrderSerializer(serializers.ModelSerializer):
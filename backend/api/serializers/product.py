@@ -1,12 +1,12 @@
 from rest_framework import serializers
 from django.db import transaction
-from ..models import Category, Product, ProductVariant, VariantAttribute, AttributeValue, Inventory
+from ..models import Category, Product, ProductVariant, VariantAttribute, AttributeValue
 
 class CategorySerializer(serializers.ModelSerializer):
     parent_name = serializers.CharField(source='parent.cate_name', read_only=True)
     class Meta:
         model = Category
-        fields = ['id', 'cate_name', 'cate_desc', 'parent', 'parent_name']
+        fields = ['id', 'cate_name', 'cate_desc', 'parent', 'parent_name', 'expiry_warning_days']
         extra_kwargs = {
             'cate_name': { 'required':True },
             'cate_desc': { 'allow_null':True, 'allow_blank':True },
@@ -35,33 +35,23 @@ class ProductSerializer(serializers.ModelSerializer):
     )
     attributes_display = serializers.SerializerMethodField(read_only=True)
     total_inventory = serializers.SerializerMethodField(read_only=True)
+    variant_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta: 
         model = Product
-        fields = ['id', 'prod_name', 'prod_type', 'barcode', 'prod_price', 'prod_cost_price', 'taxes', 'category', 'unit', 'order', 'image', 'attributes', 'total_inventory', 'attributes_display']
+        fields = ['id', 'prod_name', 'prod_type', 'barcode', 'prod_price', 'prod_cost_price', 'taxes', 'category', 'unit', 'order', 'image', 'attributes', 'total_inventory', 'variant_count', 'attributes_display']
     
     def get_attributes_display(self, obj):
-        variants = ProductVariant.objects.filter(product=obj)
-        result = []
-        for variant in variants:
-            attribute = VariantAttribute.objects.filter(variant=variant).first()
-            if attribute:
-                result.append({
-                    "value": attribute.value.value,  
-                    "default_extra_price": variant.variant_price - obj.prod_price,
-                    "order": variant.order if variant.order else None
-                })
-        return result
-
+        summary = getattr(obj, 'stock_summary', None)
+        return summary.attributes_display if summary else []
 
     def get_total_inventory(self, obj):
-        variants = ProductVariant.objects.filter(product=obj)
-        total = 0
-        for variant in variants:
-            inventories = Inventory.objects.filter(variant=variant.id)
-            for inventory in inventories:
-                total += inventory.balance or 0
-        return total
+        summary = getattr(obj, 'stock_summary', None)
+        return summary.total_balance if summary else 0
+
+    def get_variant_count(self, obj):
+        summary = getattr(obj, 'stock_summary', None)
+        return summary.variant_count if summary else 0
 
         
     def create(self, validated_data):
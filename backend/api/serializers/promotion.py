@@ -1,6 +1,8 @@
 from rest_framework import serializers
-from ..models import PromotionCondition, Discount, Coupon, LoyaltyProgram, Customer, LoyaltyReward, RewardTier, GiftProduct
+from ..models import PromotionCondition, Discount, Coupon, LoyaltyProgram, Customer, LoyaltyReward, RewardTier, GiftProduct, ProductVariant
 from django.db import transaction
+from ..services.loyalty import schedule_tier_reassignment
+from .fields import PrefetchedPrimaryKeyRelatedField, PrefetchedDetailsMixin
 
 
 class LoyaltyProgramSerializer(serializers.ModelSerializer):
@@ -19,11 +21,8 @@ class RewardTierSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         reward_tier = RewardTier.objects.create(**validated_data)
-        loyalty_programs = LoyaltyProgram.objects.filter(points__gte=reward_tier.min_points)
-        for program in loyalty_programs:
-            cus = Customer.objects.get(id=program.customer)
-            cus.tier = reward_tier
-            cus.save()
+        # Khách hàng đủ điểm của tier mới có thể được lên hạng
+        schedule_tier_reassignment(min_points=reward_tier.min_points)
         return reward_tier
     
     def update(self, instance, validated_data):
@@ -34,14 +33,8 @@ class RewardTierSerializer(serializers.ModelSerializer):
         instance.save()
         # Cập nhập Customer.tier
         if old_min_points != instance.min_points: # Nếu min_points thay đổi
-            customers = Customer.objects.filter(tier=instance)
-            loyalty_programs = LoyaltyProgram.objects.filter(customer__in=customers)
-            for program in loyalty_programs:
-                if program.points < instance.min_points:
-                    tier = None # Xóa tier cho Customer không đủ điểm
-                else:
-                    tier = instance # Cập nhật tier cho Customer đủ điểm 
-                Customer.objects.filter(id=program.customer).update(tier=tier)
+            low, high = sorted((old_min_points, instance.min_points))
+            schedule_tier_reassignment(min_points=low, max_points=high, tier=instance)
         return instance
 
 
@@ -204,9 +197,46 @@ class CouponSerializer(serializers.ModelSerializer):
     class Meta:
         model = Coupon
         fields = ['id', 'code', 'start_date', 'end_date', 'usage_limit', 'promotion_value', 'promotion_value_type']
+
+    def validate_code(self, value):
+        # So trùng trên mã đã chuẩn hóa (UniqueValidator mặc định so với mã thô)
+        code = Coupon.normalize_code(value)
+        if not code:
+            raise serializers.ValidationError("Mã coupon không được để trống.")
+        duplicates = Coupon.objects.filter(code=code)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError(f"Mã coupon {code} đã tồn tại.")
+        return code
         
         
 class LoyaltyRewardSerializer(serializers.ModelSerializer):
     class Meta:
         model = LoyaltyReward
-        fields = ['id', 'reward_type', 'coupon', 'discount', 'tier']
\ No newline at end of file
+        fields = ['id', 'reward_type', 'coupon', 'discount', 'tier']
+
+
+class PromotionCartItemSerializer(serializers.Serializer):
+    variant = PrefetchedPrimaryKeyRelatedField(queryset=ProductVariant.objects.all())
+    qty = serializers.IntegerField(min_value=1)
+
+
+class PromotionEvaluateSerializer(PrefetchedDetailsMixin, serializers.Serializer):
+    details_field = 'items'
+    items = PromotionCartItemSerializer(many=True, allow_empty=False)
+
+    def cart_lines(self):
+        return [
+            (item['variant'].id, item['qty'], item['variant'].variant_price * item['qty'])
+            for item in self.validated_data['items']
+        ]
+
+
+class CouponValidateSerializer(PrefetchedDetailsMixin, serializers.Serializer):
+    details_field = 'items'
+    code = serializers.CharField(max_length=20)
+    items = PromotionCartItemSerializer(many=True, required=False)
+
+    def cart_total(self):
+        return sum(item['variant'].variant_price * item['qty'] for item in self.validated_data.get('items', []))
\ No newline at end of file
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from ..models import Supplier, PurchaseDetail, PurchaseOrder, ProductVariant, Inventory, InventoryBatch
+from ..models import Supplier, PurchaseDetail, PurchaseOrder, ProductVariant, Unit
+from .fields import PrefetchedPrimaryKeyRelatedField, PrefetchedDetailsMixin
+from ..services import post_goods_receipt
 from django.db import transaction
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -14,13 +16,16 @@ class SupplierSerializer(serializers.ModelSerializer):
 class PurchaseDetailSerializer(serializers.ModelSerializer):
     expiry_date = serializers.DateField(required=False)
     id = serializers.IntegerField(required=False)
+    variant = PrefetchedPrimaryKeyRelatedField(queryset=ProductVariant.objects.all(), allow_null=True, required=False)
+    unit = PrefetchedPrimaryKeyRelatedField(queryset=Unit.objects.all())
     
     class Meta: 
         model = PurchaseDetail
         fields = ['id', 'qty', 'total', 'unit', 'variant', 'expiry_date']
         
         
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderSerializer(PrefetchedDetailsMixin, serializers.ModelSerializer):
+    details_field = 'purchase_details'
     purchase_details = PurchaseDetailSerializer(
         many=True,
         required=False
@@ -75,42 +80,7 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
         """
         Cập nhật Inventory và tạo InventoryBatch khi status = RECEIVE.
         """
-        with transaction.atomic():
-            for detail in purchase_order_instance.purchase_details.all():
-                variant_id = detail.variant.id
-                
-                # 1. Update giá cost của ProductVariant
-                if detail.qty > 0:
-                    new_cost_price = detail.total / detail.qty
-                    ProductVariant.objects.filter(id=variant_id).update(
-                        variant_cost_price=new_cost_price
-                    )
-                
-                # 2. Cập nhật Inventory
-                inventory, created = Inventory.objects.get_or_create(
-                    variant=detail.variant,
-                    defaults={ 
-                        'quantity_in': 0, 
-                        'quantity_out': 0, 
-                        'balance': 0,
-                        'unit': detail.unit
-                    }
-                )
-                
-                inventory.quantity_in += detail.qty
-                inventory.balance = inventory.quantity_in - inventory.quantity_out
-                inventory.save()
-                
-                expiry_date = expiry_map.get(detail.id)
-                
-                # 3. Tạo InventoryBatch
-                InventoryBatch.objects.create(
-                    qty=detail.qty,
-                    expiry_date=expiry_date,
-                    purchase_price=detail.total,
-                    variant=detail.variant,
-                    unit=detail.unit
-                )
+        post_goods_receipt(purchase_order_instance, expiry_map)
 
     def update(self, instance: PurchaseOrder, validated_data):
         """
@@ -121,9 +91,8 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
         """
         new_status = validated_data.get('status', "")
         details_data = validated_data.pop('purchase_details', None)
-        existing_variant_ids = list(
-            instance.purchase_details.values_list('variant', flat=True)
-        )
+        existing_details = {detail.id: detail for detail in instance.purchase_details.all()}
+        existing_variant_ids = {detail.variant_id for detail in existing_details.values()}
         expiry_map = {}
         
         with transaction.atomic():
@@ -135,9 +104,6 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
                         "Can only update purchase details when status is PENDING."
                     )
                 
-                # Lấy danh sách detail IDs từ request
-                detail_ids_from_request = [d.get('id') for d in details_data if d.get('id')]
-                existing_detail_ids = list(instance.purchase_details.values_list('id', flat=True))
                 expiry_map = {
                     d['id']: d.get('expiry_date') for d in details_data if 'id' in d
                 }
@@ -155,27 +121,20 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
                         )
                     
                     detail_id = detail_data.get('id')
-                    if detail_id not in existing_detail_ids:
+                    if detail_id not in existing_details:
                         raise serializers.ValidationError(
                             f"Purchase detail with id {detail_id} does not exist in this order."
                         )
                 
-                # Cập nhật từng detail
+                # Cập nhật qty, total của các detail bằng 1 bulk_update
+                changed_details = []
                 for detail_data in details_data:
-                    detail_id = detail_data.get('id')
-                    try:
-                        detail = PurchaseDetail.objects.get(id=detail_id, purchase_order=instance)
-                        
-                        # Cập nhật qty, total, expiry_date
-                        detail.qty = detail_data.get('qty', detail.qty)
-                        detail.total = detail_data.get('total', detail.total)
-                        # detail.expiry_date = detail_data.get('expiry_date', detail.expiry_date)
-                        detail.save()
-                        
-                    except PurchaseDetail.DoesNotExist:
-                        raise serializers.ValidationError(
-                            f"Purchase detail with id {detail_id} not found."
-                        )
+                    detail = existing_details[detail_data.get('id')]
+                    detail.qty = detail_data.get('qty', detail.qty)
+                    detail.total = detail_data.get('total', detail.total)
+                    # detail.expiry_date = detail_data.get('expiry_date', detail.expiry_date)
+                    changed_details.append(detail)
+                PurchaseDetail.objects.bulk_update(changed_details, ['qty', 'total'])
             
             # 2. Xử lý cập nhật status
             if instance.status == PurchaseOrder.Status.PENDING:
@@ -0,0 +1,16 @@
+from .inventory import allocate_batches, deduct_stock, release_stock, restock_stock, quarantine_stock, inventory_valuation
+from .revenue import add_daily_revenue, record_order_revenue, record_return_refund, rebuild_daily_revenue
+from .catalog import record_catalog_changes, catalog_version, catalog_snapshot, catalog_delta, prune_catalog_changes
+from .scan import scan_lookup, invalidate_scan_cache
+from .search import search, index_instances, remove_instances, rebuild_search_index
+from .orders import merge_orders, split_order
+from .returns import process_return
+from .loyalty import tier_for_points, default_tier, get_tier, invalidate_tier_cache, reassign_tiers, schedule_tier_reassignment
+from .invoice import settle_invoice
+from .receiving import post_goods_receipt
+from .ledger import record_movements, stock_as_of, take_stock_snapshot, ledger_drift
+from .expiry import refresh_expiry_alerts
+from .units import convert_qty, convert_price, unit_factor, unit_factors, invalidate_unit_factors, creates_unit_cycle
+from .promotions import evaluate_promotions, best_promotion, promotion_applies, refresh_promotion_rules, invalidate_promotion_rules
+from .coupons import lookup_coupons, validate_coupon, code_prefix_filter, invalidate_coupon_cache
+from .redemptions import redeem, release_redemptions, remaining_uses, set_usage_shards
\ No newline at end of file
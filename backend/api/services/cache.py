@@ -0,0 +1,58 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def process_local_cache():
+    """True nếu cache mặc định chỉ nằm trong process (không báo thay đổi được cho worker khác)."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+class VersionedTable:
+    """
+    Bảng dữ liệu nhỏ nạp từ DB bằng loader() và giữ trong process.
+    Nạp lại khi:
+    - invalidate() được gọi trong process này,
+    - phiên bản lưu ở Django cache dưới key bị process khác tăng (chỉ thấy được khi CACHES dùng chung giữa các process),
+    - đã quá ttl giây (ttl là số hoặc hàm trả về số). Không có ttl mà cache chỉ nằm trong process
+      (LocMemCache) thì dùng LOCAL_CACHE_TABLE_TTL, vì process khác không thể báo thay đổi.
+    """
+
+    def __init__(self, key, loader, ttl=None):
+        self.key = key
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def _expires_at(self):
+        ttl = self.ttl() if callable(self.ttl) else self.ttl
+        if ttl is None and process_local_cache():
+            ttl = getattr(settings, 'LOCAL_CACHE_TABLE_TTL', 10)
+        return time.monotonic() + ttl if ttl is not None else None
+
+    def get(self):
+        version = cache.get_or_set(self.key, 1, None)
+        entry = self._entry
+        if entry is None or entry[0] != version or (entry[1] is not None and entry[1] < time.monotonic()):
+            entry = (version, self._expires_at(), self.loader())
+            with self._lock:
+                self._entry = entry
+        return entry[2]
+
+    def refresh(self):
+        """Bỏ bảng trong process này để lần get() sau nạp lại, không báo cho process khác."""
+        with self._lock:
+            self._entry = None
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+        try:
+            cache.incr(self.key)
+        except ValueError:
+            # Chưa có key (cache vừa khởi động): dùng giá trị mới để không trùng phiên bản cũ
+            cache.set(self.key, time.time_ns(), None)
@@ -0,0 +1,117 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max, Prefetch, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from ..models import ProductVariant, VariantAttribute, CatalogChange, CatalogVersion
+from .deferred import run_on_commit_batched
+
+
+SNAPSHOT_CACHE_KEY = 'catalog_snapshot:{version}'
+SNAPSHOT_CACHE_TIMEOUT = 60 * 60
+
+
+def _write_catalog_changes(variant_ids):
+    """
+    Ghi các variant thay đổi với phiên bản mới của bộ đếm CatalogVersion, trong 1 transaction.
+    UPDATE bộ đếm giữ khóa dòng tới khi commit nên phiên bản N+1 chỉ được cấp sau khi N đã commit:
+    client thấy phiên bản N thì mọi thay đổi tới N đều đã đọc được.
+    """
+    with transaction.atomic():
+        if not CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+            CatalogVersion.objects.get_or_create(pk=1)
+            CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1)
+        version = CatalogVersion.objects.values_list('version', flat=True).get(pk=1)
+        CatalogChange.objects.bulk_create([
+            CatalogChange(variant_id=variant_id, version=version) for variant_id in sorted(variant_ids)
+        ])
+
+
+def record_catalog_changes(variant_ids):
+    """Ghi nhận các variant thay đổi, mỗi variant 1 dòng mỗi transaction."""
+    run_on_commit_batched(_write_catalog_changes, variant_ids)
+
+
+def _catalog_state():
+    # (phiên bản hiện tại, phiên bản cuối cùng đã bị xóa khỏi nhật ký)
+    return CatalogVersion.objects.filter(pk=1).values_list('version', 'pruned_version').first() or (0, 0)
+
+
+def catalog_version():
+    return _catalog_state()[0]
+
+
+def prune_catalog_changes(days=None):
+    """
+    Xóa nhật ký thay đổi cũ hơn days ngày (mặc định CATALOG_CHANGE_RETENTION_DAYS).
+    Mốc pruned_version được ghi cùng transaction, client có since cũ hơn mốc nhận lại toàn bộ catalog.
+    Trả về số dòng đã xóa.
+    """
+    days = getattr(settings, 'CATALOG_CHANGE_RETENTION_DAYS', 30) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    with transaction.atomic():
+        pruned = CatalogChange.objects.filter(created_at__lt=cutoff).aggregate(version=Max('version'))['version']
+        if pruned is None:
+            return 0
+        CatalogVersion.objects.filter(pk=1).update(pruned_version=Greatest(F('pruned_version'), pruned))
+        deleted, _ = CatalogChange.objects.filter(version__lte=pruned).delete()
+    return deleted
+
+
+def _catalog_rows(queryset):
+    queryset = (
+        queryset
+        .filter(product__isnull=False)
+        .select_related('product__unit')
+        .prefetch_related(Prefetch(
+            'variantattribute_set',
+            queryset=VariantAttribute.objects.select_related('value').order_by('id')
+        ))
+        .annotate(stock=Sum('inventory__balance'))
+        .order_by('id')
+    )
+    return [
+        {
+            'id': variant.id,
+            'sku': variant.sku,
+            'variant_name': variant.variant_name,
+            'product': variant.product_id,
+            'product_name': variant.product.prod_name,
+            'barcode': variant.product.barcode,
+            'price': variant.variant_price,
+            'unit': variant.product.unit_id,
+            'unit_name': variant.product.unit.unit_name,
+            'attribute_values': [va.value.value for va in variant.variantattribute_set.all()],
+            'stock': variant.stock or 0,
+        }
+        for variant in queryset
+    ]
+
+
+def catalog_snapshot():
+    """Toàn bộ variant đang bán kèm giá, đơn vị, thuộc tính và tồn kho, cache theo phiên bản."""
+    version = catalog_version()
+    key = SNAPSHOT_CACHE_KEY.format(version=version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = {'version': version, 'full': True, 'variants': _catalog_rows(ProductVariant.objects.all()), 'deleted': []}
+        cache.set(key, snapshot, SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+def catalog_delta(since):
+    """
+    Chỉ các variant thay đổi sau phiên bản since; variant không còn tồn tại nằm trong deleted.
+    since cũ hơn phần nhật ký còn giữ (hoặc lớn hơn phiên bản hiện tại) thì trả về toàn bộ catalog.
+    """
+    version, pruned_version = _catalog_state()
+    if since < pruned_version or since > version:
+        return catalog_snapshot()
+    changed_ids = set(
+        CatalogChange.objects.filter(version__gt=since, version__lte=version).values_list('variant_id', flat=True)
+    )
+    rows = _catalog_rows(ProductVariant.objects.filter(id__in=changed_ids)) if changed_ids else []
+    deleted = sorted(changed_ids - {row['id'] for row in rows})
+    return {'version': version, 'full': False, 'variants': rows, 'deleted': deleted}
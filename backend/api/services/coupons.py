@@ -0,0 +1,85 @@
+import bisect
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from ..models import Coupon
+from .cache import VersionedTable
+
+
+# Key phiên bản bảng coupon trong Django cache, tăng mỗi khi Coupon thay đổi
+COUPON_VERSION_KEY = 'coupon_table_version'
+
+
+def code_prefix_filter(prefix):
+    """
+    Lọc mã bắt đầu bằng prefix, dùng được index của cột code:
+    - PostgreSQL: LIKE 'prefix%' dùng index varchar_pattern_ops Django tạo sẵn cho cột unique (không phụ thuộc collation).
+    - SQLite: khoảng giá trị trên index (so sánh BINARY), vì LIKE của SQLite không phân biệt hoa thường nên không dùng index.
+    """
+    prefix = Coupon.normalize_code(prefix)
+    if connection.vendor == 'postgresql':
+        return Q(code__startswith=prefix)
+    return Q(code__gte=prefix, code__lt=prefix + '\U0010ffff')
+
+
+def _build_coupon_table():
+    """Các coupon chưa hết hạn: ({code: coupon}, [code đã sắp xếp])."""
+    coupons = Coupon.objects.filter(Q(end_date__isnull=True) | Q(end_date__gte=timezone.now()))
+    by_code = {coupon.code: coupon for coupon in coupons}
+    return by_code, sorted(by_code)
+
+
+# Lượt dùng bị trừ không phát signal nên bảng còn tự nạp lại sau COUPON_CACHE_TTL giây
+_coupon_table = VersionedTable(COUPON_VERSION_KEY, _build_coupon_table, ttl=lambda: getattr(settings, 'COUPON_CACHE_TTL', 30))
+
+
+def lookup_coupons(prefix, limit=10):
+    """Mã coupon còn hạn bắt đầu bằng prefix (gợi ý khi đang gõ mã), không query."""
+    prefix = Coupon.normalize_code(prefix)
+    if not prefix:
+        return []
+    by_code, codes = _coupon_table.get()
+    now = timezone.now()
+    result = []
+    for code in codes[bisect.bisect_left(codes, prefix):]:
+        if not code.startswith(prefix) or len(result) >= limit:
+            break
+        coupon = by_code[code]
+        if _invalid_reason(coupon, now) is None:
+            result.append({'id': coupon.id, 'code': coupon.code})
+    return result
+
+
+def _invalid_reason(coupon, now):
+    if coupon.start_date and coupon.start_date > now:
+        return "Mã coupon chưa đến thời gian áp dụng."
+    if coupon.end_date and coupon.end_date < now:
+        return "Mã coupon không còn hiệu lực."
+    if coupon.usage_limit is not None and coupon.usage_limit <= 0:
+        return "Mã coupon đã hết lượt sử dụng."
+    return None
+
+
+def validate_coupon(code, total_amount=0):
+    """
+    Mã coupon có dùng được cho giỏ hàng (tổng tiền total_amount) lúc này không, đọc từ bảng coupon đã cache.
+    Lượt dùng được kiểm tra lại khi tạo đơn nên kết quả chỉ mang tính tham khảo trong COUPON_CACHE_TTL giây.
+    """
+    code = Coupon.normalize_code(code)
+    coupon = _coupon_table.get()[0].get(code)
+    if coupon is None:
+        return {'code': code, 'valid': False, 'error': "Mã coupon không tồn tại hoặc đã hết hạn."}
+    error = _invalid_reason(coupon, timezone.now())
+    if error:
+        return {'code': code, 'coupon_id': coupon.id, 'valid': False, 'error': error}
+    value = coupon.promotion_value or 0
+    if (coupon.promotion_value_type or '').upper() == Coupon.PromotionValueType.PERCENTAGE:
+        saving = total_amount * value / 100
+    else:
+        saving = min(value, total_amount)
+    return {'code': code, 'coupon_id': coupon.id, 'valid': True, 'saving': int(saving)}
+
+
+def invalidate_coupon_cache():
+    _coupon_table.invalidate()
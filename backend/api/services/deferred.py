@@ -0,0 +1,38 @@
+import threading
+from django.db import transaction
+
+
+_pending = threading.local()
+
+
+def _flush(func):
+    items = _pending.items.pop(func, set())
+    if items:
+        func(items)
+
+
+def run_on_commit_batched(func, items):
+    """
+    Gom items của nhiều lần gọi trong cùng transaction và gọi func(items)
+    đúng 1 lần khi commit. Ngoài transaction thì gọi ngay.
+    """
+    items = {item for item in items if item}
+    if not items:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        func(items)
+        return
+    if not hasattr(_pending, 'items'):
+        _pending.items = {}
+    # Nếu transaction trước bị rollback thì callback cũ đã bị hủy, cần đăng ký lại;
+    # callback đã chạy (items đã được lấy ra) cũng không tính
+    scheduled = func in _pending.items and any(
+        getattr(callback, 'batched_func', None) is func for _, callback, _ in connection.run_on_commit
+    )
+    if not scheduled:
+        def callback():
+            _flush(func)
+        callback.batched_func = func
+        transaction.on_commit(callback)
+    _pending.items.setdefault(func, set()).update(items)
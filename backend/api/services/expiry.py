@@ -0,0 +1,54 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from ..models import Category, InventoryBatch, ExpiryAlert
+
+
+def default_warning_days():
+    return getattr(settings, 'EXPIRY_WARNING_DAYS', 10)
+
+
+def refresh_expiry_alerts(variant_ids=None):
+    """
+    Tính lại bảng ExpiryAlert: các lô còn hàng hết hạn trong khoảng
+    [hôm nay, hôm nay + số ngày cảnh báo của category].
+    - Quét InventoryBatch theo index (expiry_date, qty) với khoảng lớn nhất, lọc theo category trong bộ nhớ.
+    - variant_ids: chỉ tính lại các variant này (sau khi nhập/xuất kho).
+    Trả về số lô đang được cảnh báo trong phạm vi tính lại.
+    """
+    default_days = default_warning_days()
+    max_days = max(Category.objects.aggregate(days=Max('expiry_warning_days'))['days'] or 0, default_days)
+    today = timezone.localdate()
+
+    batches = InventoryBatch.objects.filter(
+        expiry_date__range=(today, today + timedelta(days=max_days)),
+        qty__gt=0
+    ).select_related('variant__product__category', 'unit')
+    alerts = ExpiryAlert.objects.all()
+    if variant_ids is not None:
+        batches = batches.filter(variant_id__in=variant_ids)
+        alerts = alerts.filter(variant_id__in=variant_ids)
+
+    rows = []
+    for batch in batches:
+        product = batch.variant.product
+        days = product.category.expiry_warning_days if product and product.category else None
+        if batch.expiry_date > today + timedelta(days=default_days if days is None else days):
+            continue
+        rows.append(ExpiryAlert(
+            batch=batch,
+            variant_id=batch.variant_id,
+            variant_name=batch.variant.variant_name or '',
+            unit_name=batch.unit.unit_name if batch.unit else '',
+            qty=batch.qty,
+            received_date=batch.received_date,
+            expiry_date=batch.expiry_date,
+            purchase_price=batch.purchase_price,
+        ))
+
+    with transaction.atomic():
+        alerts.delete()
+        ExpiryAlert.objects.bulk_create(rows)
+    return len(rows)
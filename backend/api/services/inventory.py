@@ -0,0 +1,454 @@
+from django.conf import settings
+from django.db.models import F, Sum
+from rest_framework import serializers
+from ..models import Product, ProductVariant, VariantAttribute, Inventory, InventoryBatch, BatchAllocation, ProductStockSummary, StockMovement
+from ..signals import stock_changed
+from .deferred import run_on_commit_batched
+from .ledger import record_movements
+from .units import convert_qty, convert_price, unit_factors
+
+
+FIFO = 'FIFO'
+FEFO = 'FEFO'
+AVERAGE = 'AVERAGE'
+
+# Phương pháp tính giá vốn hàng xuất kho
+COSTING_METHODS = (AVERAGE, FIFO)
+
+BATCH_ORDERING = {
+    # Lô nhập trước xuất trước
+    FIFO: ('received_date', 'id'),
+    # Lô hết hạn trước xuất trước, lô không có hạn dùng xuất sau cùng
+    FEFO: (F('expiry_date').asc(nulls_last=True), 'received_date', 'id'),
+}
+
+
+def costing_method():
+    method = getattr(settings, 'INVENTORY_COSTING_METHOD', AVERAGE)
+    if method not in COSTING_METHODS:
+        raise ValueError(f"Unknown costing method: {method}")
+    return method
+
+
+def average_cost(inventory):
+    """Giá vốn bình quân của 1 đơn vị đang tồn."""
+    return inventory.stock_value // inventory.balance if inventory.balance > 0 else 0
+
+
+def sync_cost_prices(inventories):
+    """Ghi giá vốn bình quân hiện tại vào variant_cost_price bằng 1 bulk_update."""
+    ProductVariant.objects.bulk_update([
+        ProductVariant(id=inventory.variant_id, variant_cost_price=average_cost(inventory))
+        for inventory in inventories
+        if inventory.variant_id and inventory.balance > 0
+    ], ['variant_cost_price'])
+
+
+def to_stock_unit(batches, unit_ids, factors=None):
+    """
+    Quy ước: qty và purchase_price của lô luôn theo đơn vị của Inventory (đơn vị tồn kho),
+    BatchAllocation cũng vậy. Lô cũ nhập theo đơn vị khác được quy đổi số lượng và giá
+    về đơn vị tồn kho khi được chạm tới. unit_ids: {variant_id: đơn vị của Inventory},
+    factors: bảng quy đổi của thao tác đang chạy (unit_factors()).
+    Trả về các lô vừa được quy đổi (chưa lưu).
+    """
+    changed = []
+    for batch in batches:
+        unit_id = unit_ids.get(batch.variant_id)
+        if unit_id and batch.unit_id and batch.unit_id != unit_id:
+            batch.qty = convert_qty(batch.qty, batch.unit_id, unit_id, factors)
+            batch.purchase_price = convert_price(batch.purchase_price, batch.unit_id, unit_id, factors)
+            batch.unit_id = unit_id
+            changed.append(batch)
+    return changed
+
+
+def allocate_batches(demands, strategy=None, units=None, factors=None):
+    """
+    Phân bổ số lượng xuất kho cho các InventoryBatch còn hàng.
+    - demands: danh sách (variant, qty), một variant có thể xuất hiện nhiều lần.
+    - units: {variant_id: đơn vị của qty} (đơn vị của Inventory), lô theo đơn vị khác
+      được quy đổi về đơn vị đó trước khi phân bổ (to_stock_unit).
+    - Khóa và nạp tất cả lô của các variant bằng 1 query, phân bổ trong bộ nhớ,
+      ghi lại bằng 1 bulk_update.
+    Trả về danh sách BatchAllocation (chưa lưu) cho từng demand, đúng thứ tự demands.
+    """
+    strategy = strategy or getattr(settings, 'INVENTORY_ALLOCATION_STRATEGY', FIFO)
+    if strategy not in BATCH_ORDERING:
+        raise ValueError(f"Unknown allocation strategy: {strategy}")
+
+    variant_ids = sorted({variant.id for variant, _ in demands})
+    batches_by_variant = {}
+    for batch in InventoryBatch.objects.select_for_update().filter(
+        variant_id__in=variant_ids,
+        qty__gt=0,
+        is_quarantine=False
+    ).order_by('variant_id', *BATCH_ORDERING[strategy]):
+        batches_by_variant.setdefault(batch.variant_id, []).append(batch)
+
+    changed_batches = {
+        batch.id: batch
+        for batch in to_stock_unit([batch for items in batches_by_variant.values() for batch in items], units or {}, factors)
+    }
+    allocations = []
+    for variant, qty_needed in demands:
+        demand_allocations = []
+        for batch in batches_by_variant.get(variant.id, []):
+            if qty_needed <= 0:
+                break
+            if batch.qty <= 0:
+                continue
+            taken = min(batch.qty, qty_needed)
+            batch.qty -= taken
+            qty_needed -= taken
+            changed_batches[batch.id] = batch
+            demand_allocations.append(BatchAllocation(batch=batch, variant=variant, qty=taken))
+
+        if qty_needed > 0:
+            raise serializers.ValidationError(
+                f"Tồn kho theo lô không đủ để đáp ứng số lượng yêu cầu cho variant {variant.id}"
+            )
+        allocations.append(demand_allocations)
+
+    InventoryBatch.objects.bulk_update(changed_batches.values(), ['qty', 'unit', 'purchase_price'])
+    return allocations
+
+
+def deduct_stock(demands, strategy=None):
+    """
+    Trừ Inventory và InventoryBatch cho danh sách (variant, qty, unit_id).
+    Số lượng được quy đổi về đơn vị của Inventory trước khi trừ, lô theo đơn vị khác được quy đổi theo (to_stock_unit).
+    Inventory được khóa theo thứ tự variant_id trước, sau đó tới các lô,
+    để các giao dịch đồng thời luôn khóa theo cùng một thứ tự.
+    Giá vốn xuất (unit_cost của allocation) lấy theo costing_method():
+    giá bình quân trước khi xuất (AVERAGE) hoặc giá nhập của từng lô (FIFO).
+    Mỗi variant ghi 1 dòng sổ kho (StockMovement) với số lượng và giá trị xuất.
+    Trả về kết quả của allocate_batches.
+    """
+    factors = unit_factors()
+    method = costing_method()
+    variants = {variant.id: variant for variant, _, _ in demands}
+
+    inventories = {}
+    for inventory in Inventory.objects.select_for_update().filter(
+        variant_id__in=sorted(variants)
+    ).order_by('variant_id', 'id'):
+        inventories.setdefault(inventory.variant_id, inventory)
+
+    stock_demands = []
+    qty_by_variant = {}
+    for variant, qty, unit_id in demands:
+        inventory = inventories.get(variant.id)
+        if inventory is None:
+            raise serializers.ValidationError(f"Sản phẩm {variant} không đủ tồn kho")
+        qty = convert_qty(qty, unit_id, inventory.unit_id, factors)
+        stock_demands.append((variant, qty))
+        qty_by_variant[variant.id] = qty_by_variant.get(variant.id, 0) + qty
+
+    average_costs, values_before = {}, {}
+    for variant_id in sorted(qty_by_variant):
+        qty = qty_by_variant[variant_id]
+        inventory = inventories[variant_id]
+        if inventory.balance < qty:
+            raise serializers.ValidationError(f"Sản phẩm {variants[variant_id]} không đủ tồn kho")
+        average_costs[variant_id] = average_cost(inventory)
+        values_before[variant_id] = inventory.stock_value
+        inventory.quantity_out += qty
+        inventory.balance -= qty
+
+    allocations = allocate_batches(
+        stock_demands, strategy, {variant_id: inventory.unit_id for variant_id, inventory in inventories.items()}, factors
+    )
+    for demand_allocations in allocations:
+        for allocation in demand_allocations:
+            if method == FIFO:
+                allocation.unit_cost = allocation.batch.purchase_price
+            else:
+                allocation.unit_cost = average_costs[allocation.variant_id]
+            inventory = inventories[allocation.variant_id]
+            inventory.stock_value -= allocation.qty * allocation.unit_cost
+    for inventory in inventories.values():
+        # Hết hàng thì không còn giá trị tồn (bỏ phần lẻ do làm tròn)
+        if inventory.balance <= 0 or inventory.stock_value < 0:
+            inventory.stock_value = 0
+
+    Inventory.objects.bulk_update(inventories.values(), ['quantity_out', 'balance', 'stock_value'])
+    if method == FIFO:
+        sync_cost_prices(inventories.values())
+    record_movements(StockMovement.Kind.SALE, {
+        variant_id: (-qty, inventories[variant_id].stock_value - values_before[variant_id])
+        for variant_id, qty in qty_by_variant.items()
+    })
+    stock_changed.send(sender=Inventory, variant_ids=list(qty_by_variant))
+    return allocations
+
+
+def release_stock(releases, kind=StockMovement.Kind.RELEASE):
+    """
+    Hoàn kho cho danh sách (order_detail, qty), ngược với deduct_stock.
+    qty tính theo đơn vị của dòng đơn hàng, được quy đổi về đơn vị của Inventory.
+    - Trả lại đúng các lô đã xuất cho dòng đó (BatchAllocation), lô xuất sau
+      cùng được hoàn trước, các allocation về 0 bị xóa.
+    - Phần không có allocation (đơn tạo trước khi có BatchAllocation) được
+      cộng vào lô nhập sớm nhất của variant.
+    - Giá trị tồn được cộng lại theo unit_cost của allocation, phần không có
+      allocation theo giá bình quân hiện tại.
+    - Mỗi variant ghi 1 dòng sổ kho loại kind (RELEASE khi sửa đơn, RETURN khi khách trả hàng).
+    Khóa Inventory rồi tới lô theo thứ tự variant_id giống deduct_stock.
+    """
+    releases = [(detail, qty) for detail, qty in releases if detail.variant_id and qty > 0]
+    if not releases:
+        return
+    factors = unit_factors()
+
+    inventories = {}
+    for inventory in Inventory.objects.select_for_update().filter(
+        variant_id__in=sorted({detail.variant_id for detail, _ in releases})
+    ).order_by('variant_id', 'id'):
+        inventories.setdefault(inventory.variant_id, inventory)
+
+    releases = [
+        (detail, convert_qty(qty, detail.unit_id, inventories[detail.variant_id].unit_id, factors) if detail.variant_id in inventories else qty)
+        for detail, qty in releases
+    ]
+    qty_by_variant = {}
+    for detail, qty in releases:
+        qty_by_variant[detail.variant_id] = qty_by_variant.get(detail.variant_id, 0) + qty
+    average_costs = {variant_id: average_cost(inventory) for variant_id, inventory in inventories.items()}
+    values_before = {variant_id: inventory.stock_value for variant_id, inventory in inventories.items()}
+    for variant_id, inventory in inventories.items():
+        inventory.quantity_out -= qty_by_variant[variant_id]
+        inventory.balance += qty_by_variant[variant_id]
+
+    allocations_by_detail = {}
+    for allocation in BatchAllocation.objects.filter(
+        order_detail_id__in={detail.id for detail, _ in releases}
+    ).order_by('-id'):
+        allocations_by_detail.setdefault(allocation.order_detail_id, []).append(allocation)
+    batches = {
+        batch.id: batch
+        for batch in InventoryBatch.objects.select_for_update().filter(
+            id__in={allocation.batch_id for items in allocations_by_detail.values() for allocation in items}
+        ).order_by('variant_id', 'id')
+    }
+    stock_units = {variant_id: inventory.unit_id for variant_id, inventory in inventories.items()}
+    to_stock_unit(batches.values(), stock_units, factors)
+
+    changed_allocations, emptied_allocations, leftovers = {}, set(), {}
+    for detail, qty in releases:
+        for allocation in allocations_by_detail.get(detail.id, []):
+            if qty <= 0:
+                break
+            if allocation.qty <= 0:
+                continue
+            taken = min(allocation.qty, qty)
+            allocation.qty -= taken
+            batches[allocation.batch_id].qty += taken
+            qty -= taken
+            if detail.variant_id in inventories:
+                inventories[detail.variant_id].stock_value += taken * allocation.unit_cost
+            if allocation.qty == 0:
+                emptied_allocations.add(allocation.id)
+                changed_allocations.pop(allocation.id, None)
+            else:
+                changed_allocations[allocation.id] = allocation
+        if qty > 0:
+            leftovers[detail.variant_id] = leftovers.get(detail.variant_id, 0) + qty
+            if detail.variant_id in inventories:
+                inventories[detail.variant_id].stock_value += qty * average_costs[detail.variant_id]
+
+    if leftovers:
+        for batch in InventoryBatch.objects.select_for_update().filter(
+            variant_id__in=sorted(leftovers),
+            is_quarantine=False
+        ).order_by('variant_id', 'received_date', 'id'):
+            if batch.variant_id in leftovers:
+                batch = batches.setdefault(batch.id, batch)
+                to_stock_unit([batch], stock_units, factors)
+                batch.qty += leftovers.pop(batch.variant_id)
+
+    Inventory.objects.bulk_update(inventories.values(), ['quantity_out', 'balance', 'stock_value'])
+    sync_cost_prices(inventories.values())
+    record_movements(kind, {
+        variant_id: (qty_by_variant[variant_id], inventory.stock_value - values_before[variant_id])
+        for variant_id, inventory in inventories.items()
+    })
+    InventoryBatch.objects.bulk_update(batches.values(), ['qty', 'unit', 'purchase_price'])
+    BatchAllocation.objects.bulk_update(changed_allocations.values(), ['qty'])
+    if emptied_allocations:
+        BatchAllocation.objects.filter(id__in=emptied_allocations).delete()
+    stock_changed.send(sender=Inventory, variant_ids=list(qty_by_variant))
+
+
+def restock_stock(items):
+    """
+    Nhập lại hàng trả về không có đơn gốc (không biết lô đã xuất): items là danh sách (variant_id, unit_id, qty).
+    qty được quy đổi về đơn vị của Inventory và cộng vào lô nhập sớm nhất của variant (lô được quy đổi theo, to_stock_unit)
+    (chưa có lô thì tạo lô mới), giá trị tồn cộng theo giá bình quân hiện tại
+    (hết hàng thì theo variant_cost_price). Variant chưa có Inventory được tạo mới theo đơn vị của dòng trả.
+    Khóa Inventory rồi tới lô theo thứ tự variant_id giống deduct_stock.
+    """
+    items = [(variant_id, unit_id, qty) for variant_id, unit_id, qty in items if variant_id and qty > 0]
+    if not items:
+        return
+    factors = unit_factors()
+    variant_ids = sorted({variant_id for variant_id, _, _ in items})
+
+    inventories = {}
+    for inventory in Inventory.objects.select_for_update().filter(variant_id__in=variant_ids).order_by('variant_id', 'id'):
+        inventories.setdefault(inventory.variant_id, inventory)
+    new_inventories = [
+        Inventory(variant_id=variant_id, unit_id=unit_id, quantity_in=0, quantity_out=0, balance=0)
+        for variant_id, unit_id in {variant_id: unit_id for variant_id, unit_id, _ in reversed(items)}.items()
+        if variant_id not in inventories
+    ]
+    Inventory.objects.bulk_create(new_inventories)
+    inventories.update({inventory.variant_id: inventory for inventory in new_inventories})
+
+    qty_by_variant = {}
+    for variant_id, unit_id, qty in items:
+        qty_by_variant[variant_id] = qty_by_variant.get(variant_id, 0) + convert_qty(qty, unit_id, inventories[variant_id].unit_id, factors)
+    cost_prices = dict(ProductVariant.objects.filter(id__in=variant_ids).values_list('id', 'variant_cost_price'))
+    values_before = {}
+    for variant_id, inventory in inventories.items():
+        values_before[variant_id] = inventory.stock_value
+        unit_cost = average_cost(inventory) if inventory.balance > 0 else cost_prices.get(variant_id, 0)
+        inventory.quantity_in += qty_by_variant[variant_id]
+        inventory.balance += qty_by_variant[variant_id]
+        inventory.stock_value += qty_by_variant[variant_id] * unit_cost
+
+    batches = {}
+    for batch in InventoryBatch.objects.select_for_update().filter(
+        variant_id__in=variant_ids,
+        is_quarantine=False
+    ).order_by('variant_id', 'received_date', 'id'):
+        batches.setdefault(batch.variant_id, batch)
+    created = []
+    for variant_id, qty in qty_by_variant.items():
+        inventory = inventories[variant_id]
+        batch = batches.get(variant_id)
+        if batch is None:
+            batch = InventoryBatch(variant_id=variant_id, unit_id=inventory.unit_id, qty=0, purchase_price=average_cost(inventory))
+            batches[variant_id] = batch
+            created.append(batch)
+        to_stock_unit([batch], {variant_id: inventory.unit_id}, factors)
+        batch.qty += qty
+
+    Inventory.objects.bulk_update(inventories.values(), ['quantity_in', 'balance', 'stock_value'])
+    sync_cost_prices(inventories.values())
+    record_movements(StockMovement.Kind.RETURN, {
+        variant_id: (qty_by_variant[variant_id], inventory.stock_value - values_before[variant_id])
+        for variant_id, inventory in inventories.items()
+    })
+    InventoryBatch.objects.bulk_update([batch for batch in batches.values() if batch.pk], ['qty', 'unit', 'purchase_price'])
+    InventoryBatch.objects.bulk_create(created)
+    stock_changed.send(sender=Inventory, variant_ids=list(qty_by_variant))
+
+
+def quarantine_stock(items):
+    """
+    Đưa hàng trả về vào lô cách ly: items là danh sách (variant_id, unit_id, qty).
+    Mỗi (variant, đơn vị) dùng chung 1 lô cách ly, chỉ tạo khi chưa có.
+    Hàng cách ly không được cộng vào Inventory.balance vì chưa bán lại được; sổ kho ghi 1 dòng QUARANTINE
+    cho mỗi variant (số lượng theo đơn vị của Inventory, không có giá trị) để theo dõi, không tính vào tồn.
+    """
+    qty_by_key = {}
+    for variant_id, unit_id, qty in items:
+        if qty > 0:
+            qty_by_key[(variant_id, unit_id)] = qty_by_key.get((variant_id, unit_id), 0) + qty
+    if not qty_by_key:
+        return
+
+    batches = {}
+    for batch in InventoryBatch.objects.select_for_update().filter(
+        variant_id__in=sorted({variant_id for variant_id, _ in qty_by_key}),
+        is_quarantine=True
+    ).order_by('variant_id', 'id'):
+        batches.setdefault((batch.variant_id, batch.unit_id), batch)
+
+    created = []
+    for (variant_id, unit_id), qty in qty_by_key.items():
+        batch = batches.get((variant_id, unit_id))
+        if batch is None:
+            batch = InventoryBatch(variant_id=variant_id, unit_id=unit_id, qty=0, is_quarantine=True)
+            batches[(variant_id, unit_id)] = batch
+            created.append(batch)
+        batch.qty += qty
+    InventoryBatch.objects.bulk_update([batch for batch in batches.values() if batch.pk], ['qty'])
+    InventoryBatch.objects.bulk_create(created)
+
+    factors = unit_factors()
+    stock_units = {}
+    for variant_id, unit_id in Inventory.objects.filter(
+        variant_id__in={variant_id for variant_id, _ in qty_by_key}
+    ).order_by('variant_id', 'id').values_list('variant_id', 'unit_id'):
+        stock_units.setdefault(variant_id, unit_id)
+    qty_by_variant = {}
+    for (variant_id, unit_id), qty in qty_by_key.items():
+        qty_by_variant[variant_id] = qty_by_variant.get(variant_id, 0) + convert_qty(qty, unit_id, stock_units.get(variant_id, unit_id), factors)
+    record_movements(StockMovement.Kind.QUARANTINE, {variant_id: (qty, 0) for variant_id, qty in qty_by_variant.items()})
+
+
+def inventory_valuation(by_variant=False):
+    """
+    Tổng giá trị tồn kho theo giá vốn, đọc từ Inventory.stock_value được cập nhật
+    dần khi nhập/xuất (1 aggregate, không phải duyệt lô).
+    by_variant=True: thêm danh sách giá trị tồn của từng variant.
+    """
+    queryset = Inventory.objects.filter(variant__isnull=False)
+    totals = queryset.aggregate(total_value=Sum('stock_value'), total_qty=Sum('balance'))
+    result = {
+        'method': costing_method(),
+        'total_value': totals['total_value'] or 0,
+        'total_qty': totals['total_qty'] or 0,
+    }
+    if by_variant:
+        result['variants'] = list(
+            queryset.values('variant_id', 'variant__variant_name')
+            .annotate(value=Sum('stock_value'), qty=Sum('balance'))
+            .order_by('variant_id')
+        )
+    return result
+
+
+def refresh_stock_summaries(product_ids):
+    """
+    Tính lại ProductStockSummary (tổng tồn, số biến thể, danh sách thuộc tính)
+    cho các product với số query cố định.
+    """
+    prices = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'prod_price'))
+    balances = dict(
+        Inventory.objects.filter(variant__product_id__in=prices)
+        .values('variant__product_id')
+        .annotate(total=Sum('balance'))
+        .values_list('variant__product_id', 'total')
+    )
+    # Giá trị thuộc tính đầu tiên của mỗi variant
+    first_values = {}
+    for variant_id, value in VariantAttribute.objects.filter(
+        variant__product_id__in=prices
+    ).order_by('id').values_list('variant_id', 'value__value'):
+        first_values.setdefault(variant_id, value)
+
+    summaries = {pid: ProductStockSummary(product_id=pid, total_balance=balances.get(pid) or 0) for pid in prices}
+    for variant in ProductVariant.objects.filter(product_id__in=prices).order_by('id').only('id', 'product_id', 'variant_price', 'order'):
+        summary = summaries[variant.product_id]
+        summary.variant_count += 1
+        if variant.id in first_values:
+            summary.attributes_display.append({
+                "value": first_values[variant.id],
+                "default_extra_price": variant.variant_price - prices[variant.product_id],
+                "order": variant.order if variant.order else None
+            })
+
+    ProductStockSummary.objects.bulk_create(
+        summaries.values(),
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['total_balance', 'variant_count', 'attributes_display']
+    )
+
+
+def schedule_stock_summary_refresh(product_ids):
+    """Tính lại tồn kho tổng hợp của các product một lần khi transaction commit."""
+    run_on_commit_batched(refresh_stock_summaries, product_ids)
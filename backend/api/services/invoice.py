@@ -0,0 +1,76 @@
+from django.db import transaction
+from rest_framework import serializers
+from ..models import Invoice, Order, Customer, LoyaltyReward, PointTransactions, LoyaltyProgram
+from .loyalty import tier_for_points, get_tier
+
+
+def _settle_loyalty(order, customer, total_amount):
+    """Ghi giao dịch điểm, cộng/trừ điểm và xếp lại tier cho khách. Trả về số điểm mới."""
+    points_used = 0
+    if order.coupon_id:
+        loyalty_reward = LoyaltyReward.objects.filter(tier=customer.tier_id, coupon=order.coupon_id).first()
+        points_used = loyalty_reward.points_required if loyalty_reward else 0
+    tier = get_tier(customer.tier_id)
+    exchange_rate = (tier.exchange_rate if tier else None) or 1
+    points_earned = total_amount // exchange_rate
+
+    loyalty_program = LoyaltyProgram.objects.select_for_update().filter(customer=customer).first()
+    if loyalty_program is None:
+        loyalty_program = LoyaltyProgram(customer=customer)
+    loyalty_program.points = int(loyalty_program.points + points_earned - points_used)
+    loyalty_program.save()
+
+    PointTransactions.objects.create(
+        points_earned=points_earned,
+        points_used=points_used,
+        customer=customer,
+        order=order
+    )
+
+    new_tier = tier_for_points(loyalty_program.points)
+    if new_tier:
+        customer.tier = new_tier
+    return loyalty_program.points
+
+
+def settle_invoice(validated_data):
+    """
+    Tạo invoice cho đơn PENDING với số query cố định:
+    - Khóa đơn rồi khóa khách hàng, mỗi bước 1 query (không khóa qua LEFT JOIN vì customer có thể null,
+      PostgreSQL không cho FOR UPDATE phía nullable của outer join).
+    - Tier mới lấy từ bảng tier đã cache (tìm nhị phân), không query RewardTier.
+    - Khách hàng (tier, công nợ) được lưu đúng 1 lần.
+    """
+    with transaction.atomic():
+        order = validated_data.get('order')
+        if order:
+            order = Order.objects.select_for_update().filter(id=order.id).first()
+        if not order or order.status.upper() != Order.Status.PENDING:
+            raise serializers.ValidationError("Order must be in PENDING status.")
+        validated_data['order'] = order
+
+        total_amount = validated_data.get('total_amount', 0)
+        amount_received = validated_data.get('amount_received', 0)
+
+        # Trạng thái thanh toán được tính trước để chỉ ghi invoice 1 lần
+        if amount_received == 0:
+            validated_data['payment_status'] = Invoice.PaymentStatus.UNPAID
+        elif amount_received >= total_amount:
+            validated_data['payment_status'] = Invoice.PaymentStatus.PAID
+        else:
+            validated_data['payment_status'] = Invoice.PaymentStatus.PARTIALLY_PAID
+        invoice = Invoice.objects.create(**validated_data)
+
+        customer = Customer.objects.select_for_update().filter(id=order.customer_id).first() if order.customer_id else None
+        if customer:
+            _settle_loyalty(order, customer, total_amount)
+            update_fields = ['tier']
+            if invoice.payment_status == Invoice.PaymentStatus.PARTIALLY_PAID:
+                customer.debt_amount += total_amount - amount_received
+                update_fields.append('debt_amount')
+            customer.save(update_fields=update_fields)
+
+        if invoice.payment_status == Invoice.PaymentStatus.PAID:
+            order.status = Order.Status.COMPLETE
+            order.save()
+    return invoice
@@ -0,0 +1,97 @@
+from datetime import datetime, time, timedelta
+from django.db.models import Max, Sum
+from django.utils import timezone
+from ..models import Inventory, StockMovement, StockSnapshot
+
+
+def record_movements(kind, changes):
+    """
+    Ghi sổ kho bằng 1 bulk_create: changes là {variant_id: (qty, value)} có dấu.
+    Bỏ qua các variant không thay đổi.
+    """
+    created_at = timezone.now()
+    StockMovement.objects.bulk_create([
+        StockMovement(kind=kind, variant_id=variant_id, qty=qty, value=value, created_at=created_at)
+        for variant_id, (qty, value) in sorted(changes.items())
+        if qty or value
+    ])
+
+
+def _day_end(date):
+    return timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min))
+
+
+def _balances_as_of(date, variant_ids=None):
+    """
+    Tồn cuối ngày date = snapshot gần nhất trước đó + phát sinh sau snapshot (trừ hàng cách ly).
+    Trả về (ngày snapshot được dùng, {variant_id: [balance, stock_value]}).
+    """
+    snapshots = StockSnapshot.objects.filter(date__lte=date)
+    movements = StockMovement.objects.filter(created_at__lt=_day_end(date)).exclude(kind=StockMovement.Kind.QUARANTINE)
+    if variant_ids is not None:
+        snapshots = snapshots.filter(variant_id__in=variant_ids)
+        movements = movements.filter(variant_id__in=variant_ids)
+
+    balances = {}
+    snapshot_date = snapshots.aggregate(date=Max('date'))['date']
+    if snapshot_date:
+        for variant_id, balance, stock_value in snapshots.filter(date=snapshot_date).values_list('variant_id', 'balance', 'stock_value'):
+            balances[variant_id] = [balance, stock_value]
+        movements = movements.filter(created_at__gte=_day_end(snapshot_date))
+
+    for row in movements.values('variant_id').annotate(qty=Sum('qty'), value=Sum('value')).order_by():
+        item = balances.setdefault(row['variant_id'], [0, 0])
+        item[0] += row['qty']
+        item[1] += row['value']
+    return snapshot_date, balances
+
+
+def stock_as_of(date, variant_ids=None):
+    """Tồn kho (số lượng, giá trị) của các variant tại cuối ngày date."""
+    snapshot_date, balances = _balances_as_of(date, variant_ids)
+    return {
+        'date': date,
+        'snapshot_date': snapshot_date,
+        'variants': [
+            {'variant_id': variant_id, 'balance': balance, 'stock_value': stock_value}
+            for variant_id, (balance, stock_value) in sorted(balances.items())
+            if balance or stock_value
+        ],
+    }
+
+
+def take_stock_snapshot(date):
+    """
+    Chốt tồn cuối ngày date từ sổ kho, ghi đè snapshot cũ của ngày đó.
+    Chỉ chốt ngày đã qua để không bỏ sót phát sinh trong ngày. Trả về số dòng đã ghi.
+    """
+    if date >= timezone.localdate():
+        raise ValueError("Chỉ chốt tồn cho ngày đã qua.")
+    _, balances = _balances_as_of(date)
+    rows = [
+        StockSnapshot(date=date, variant_id=variant_id, balance=balance, stock_value=stock_value)
+        for variant_id, (balance, stock_value) in sorted(balances.items())
+        if balance or stock_value
+    ]
+    StockSnapshot.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['date', 'variant'],
+        update_fields=['balance', 'stock_value']
+    )
+    return len(rows)
+
+
+def ledger_drift():
+    """Các variant có Inventory.balance khác với tồn tính từ sổ kho: [(variant_id, inventory, ledger)]."""
+    _, balances = _balances_as_of(timezone.localdate())
+    inventory = dict(
+        Inventory.objects.filter(variant__isnull=False)
+        .values('variant_id').annotate(total=Sum('balance')).order_by()
+        .values_list('variant_id', 'total')
+    )
+    return [
+        (variant_id, inventory.get(variant_id, 0), balances.get(variant_id, [0, 0])[0])
+        for variant_id in sorted(set(inventory) | set(balances))
+        if inventory.get(variant_id, 0) != balances.get(variant_id, [0, 0])[0]
+    ]
@@ -0,0 +1,99 @@
+import logging
+import threading
+from bisect import bisect_right
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from ..models import RewardTier, Customer, LoyaltyProgram
+from .cache import VersionedTable
+
+
+logger = logging.getLogger(__name__)
+
+
+# Key phiên bản bảng tier trong Django cache, tăng mỗi khi RewardTier thay đổi
+TIER_VERSION_KEY = 'reward_tier_version'
+
+
+def _build_tier_table():
+    """Bảng tier sắp theo min_points: (min_points, tiers, {tier_id: tier})."""
+    tiers = list(RewardTier.objects.order_by('min_points', 'id'))
+    return [tier.min_points for tier in tiers], tiers, {tier.id: tier for tier in tiers}
+
+
+_tier_table = VersionedTable(TIER_VERSION_KEY, _build_tier_table)
+
+
+def tier_for_points(points):
+    """Tier cao nhất có min_points <= points (tìm nhị phân trên bảng tier đã cache), None nếu không có."""
+    thresholds, tiers, _ = _tier_table.get()
+    index = bisect_right(thresholds, points) - 1
+    return tiers[index] if index >= 0 else None
+
+
+def default_tier():
+    """Tier thấp nhất, gán cho khách hàng mới."""
+    tiers = _tier_table.get()[1]
+    return tiers[0] if tiers else None
+
+
+def get_tier(tier_id):
+    return _tier_table.get()[2].get(tier_id)
+
+
+def invalidate_tier_cache():
+    _tier_table.invalidate()
+
+
+def reassign_tiers(min_points=None, max_points=None, tier=None):
+    """
+    Xếp lại tier cho khách hàng bằng 1 câu UPDATE: tier mới là tier có
+    min_points lớn nhất <= điểm của khách (điểm lấy từ LoyaltyProgram đầu tiên).
+    Chỉ các khách có điểm trong [min_points, max_points) hoặc đang ở tier được cập nhật.
+    Trả về số khách hàng đã cập nhật.
+    """
+    points = Coalesce(Subquery(
+        LoyaltyProgram.objects.filter(customer=OuterRef(OuterRef('pk'))).order_by('id').values('points')[:1]
+    ), 0)
+    new_tier = Subquery(
+        RewardTier.objects.filter(min_points__lte=points).order_by('-min_points', '-id').values('id')[:1]
+    )
+
+    customers = Customer.objects.all()
+    if min_points is not None or max_points is not None or tier is not None:
+        programs = LoyaltyProgram.objects.all()
+        if min_points is not None:
+            programs = programs.filter(points__gte=min_points)
+        if max_points is not None:
+            programs = programs.filter(points__lt=max_points)
+        condition = Q(pk__in=programs.values('customer_id'))
+        if tier is not None:
+            condition |= Q(tier=tier)
+        customers = customers.filter(condition)
+    return customers.update(tier=new_tier)
+
+
+def _reassign_tiers_in_background(kwargs):
+    def run():
+        try:
+            updated = reassign_tiers(**kwargs)
+            logger.info("Đã xếp lại tier cho %d khách hàng", updated)
+        except Exception:
+            logger.exception("Xếp lại tier thất bại")
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, name='reassign-tiers', daemon=True).start()
+
+
+def schedule_tier_reassignment(min_points=None, max_points=None, tier=None):
+    """
+    Xếp lại tier sau khi ngưỡng tier thay đổi.
+    TIER_REASSIGN_IN_BACKGROUND = True: chạy trong thread nền sau khi transaction commit
+    (cho tập khách hàng rất lớn), ngược lại chạy ngay trong request.
+    """
+    kwargs = {'min_points': min_points, 'max_points': max_points, 'tier': tier}
+    if getattr(settings, 'TIER_REASSIGN_IN_BACKGROUND', False):
+        transaction.on_commit(lambda: _reassign_tiers_in_background(kwargs))
+        return None
+    return reassign_tiers(**kwargs)
@@ -0,0 +1,192 @@
+from django.db import transaction
+from django.db.models import Case, Sum, When
+from rest_framework import serializers
+from ..models import Order, OrderDetail, Inventory, BatchAllocation, Discount
+from .units import convert_qty, unit_factors
+from .redemptions import release_redemptions
+
+
+def _consolidate_details(order):
+    """
+    Gộp các dòng trùng (variant, unit) của đơn thành 1 dòng (giữ dòng có id nhỏ nhất),
+    chuyển BatchAllocation của các dòng bị gộp sang dòng giữ lại.
+    """
+    keepers = {}
+    duplicates = {}
+    for detail in order.order_details.order_by('id'):
+        key = (detail.variant_id, detail.unit_id)
+        keeper = keepers.setdefault(key, detail)
+        if keeper is not detail:
+            keeper.qty += detail.qty
+            keeper.total += detail.total
+            duplicates[detail.id] = keeper
+    if not duplicates:
+        return
+
+    BatchAllocation.objects.filter(order_detail_id__in=duplicates).update(
+        order_detail_id=Case(*[When(order_detail_id=detail_id, then=keeper.id) for detail_id, keeper in duplicates.items()])
+    )
+    OrderDetail.objects.bulk_update({keeper.id: keeper for keeper in duplicates.values()}.values(), ['qty', 'total'])
+    OrderDetail.objects.filter(id__in=duplicates).delete()
+
+
+def _promotion_total(order, subtotal):
+    """
+    Tổng tiền hàng sau discount và coupon đang gắn với đơn, tính như OrderSerializer.
+    Không trừ thêm lượt dùng (đã ghi nhận khi áp dụng); quà BUY_X_GET_Y đã nằm trong các dòng của đơn.
+    """
+    total_amount = subtotal
+    for promotion in (order.discount, order.coupon):
+        if promotion is None:
+            continue
+        if isinstance(promotion, Discount) and promotion.discount_type.upper().replace('-', '_') == Discount.DiscountType.BUY_X_GET_Y:
+            continue
+        value_type = (promotion.promotion_value_type or '').upper()
+        if value_type == Discount.PromotionValueType.PERCENTAGE:
+            total_amount *= (1 - (promotion.promotion_value or 0) / 100)
+        elif value_type == Discount.PromotionValueType.FIX:
+            total_amount -= promotion.promotion_value or 0
+    return max(int(total_amount), 0)
+
+
+def merge_orders(order_ids, consolidate=False):
+    """
+    Gộp các đơn PENDING vào đơn đầu tiên trong order_ids.
+    - Chuyển toàn bộ dòng của các đơn còn lại bằng 1 UPDATE, hoàn lượt discount/coupon của các đơn đó
+      rồi hủy chúng bằng 1 UPDATE.
+    - consolidate=True: gộp các dòng trùng (variant, unit) thành 1 dòng.
+    Tổng tiền được tính lại từ mọi dòng của đơn sau khi gộp (1 aggregate) rồi áp lại discount/coupon
+    của đơn đích (giỏ sau khi gộp chứa giỏ cũ nên vẫn thỏa điều kiện, giữ nguyên lượt đã dùng).
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    with transaction.atomic():
+        orders = {
+            order.id: order
+            for order in Order.objects.select_for_update().filter(id__in=order_ids, status=Order.Status.PENDING)
+        }
+        if len(orders) != len(order_ids):
+            raise serializers.ValidationError("Một số đơn hàng không hợp lệ hoặc không ở trạng thái PENDING")
+
+        base_order = orders[order_ids[0]]
+        source_ids = order_ids[1:]
+
+        OrderDetail.objects.filter(order_id__in=source_ids).update(order=base_order)
+        for source_id in source_ids:
+            release_redemptions(orders[source_id])
+        Order.objects.filter(id__in=source_ids).update(status=Order.Status.CANCEL)
+        if consolidate:
+            _consolidate_details(base_order)
+
+        subtotal = base_order.order_details.aggregate(total=Sum('total'))['total'] or 0
+        base_order.total_amount = _promotion_total(base_order, subtotal)
+        base_order.save(update_fields=['total_amount'])
+    return base_order
+
+
+def _carve_allocations(moves):
+    """
+    Tách BatchAllocation theo các dòng được chuyển: moves là (dòng gốc, dòng mới, qty).
+    Lấy từ allocation cũ nhất của dòng gốc, tạo allocation tương ứng cho dòng mới.
+    qty theo đơn vị của dòng, được quy đổi về đơn vị của Inventory (đơn vị của allocation).
+    """
+    factors = unit_factors()
+    allocations_by_detail = {}
+    for allocation in BatchAllocation.objects.filter(
+        order_detail_id__in={source.id for source, _, _ in moves}
+    ).order_by('id'):
+        allocations_by_detail.setdefault(allocation.order_detail_id, []).append(allocation)
+    stock_units = dict(
+        Inventory.objects.filter(variant_id__in={source.variant_id for source, _, _ in moves})
+        .order_by('-id').values_list('variant_id', 'unit_id')
+    )
+
+    changed, created = {}, []
+    for source, target, qty in moves:
+        allocations = allocations_by_detail.get(source.id, [])
+        if allocations:
+            qty = convert_qty(qty, source.unit_id, stock_units.get(source.variant_id, source.unit_id), factors)
+        for allocation in allocations:
+            if qty <= 0:
+                break
+            if allocation.qty <= 0:
+                continue
+            taken = min(allocation.qty, qty)
+            allocation.qty -= taken
+            qty -= taken
+            changed[allocation.id] = allocation
+            created.append(BatchAllocation(
+                batch_id=allocation.batch_id, variant_id=allocation.variant_id, order_detail=target, qty=taken,
+                unit_cost=allocation.unit_cost
+            ))
+
+    BatchAllocation.objects.bulk_create(created)
+    BatchAllocation.objects.bulk_update([a for a in changed.values() if a.qty > 0], ['qty'])
+    BatchAllocation.objects.filter(id__in=[a.id for a in changed.values() if a.qty == 0]).delete()
+
+
+def split_order(order_id, splits):
+    """
+    Tách đơn PENDING thành nhiều đơn mới, mỗi phần tử của splits là 1 đơn:
+    {'items': [{'detail_id', 'qty'}], 'customer' (tùy chọn), 'payment_method' (tùy chọn)}.
+    - Kiểm tra toàn bộ trong bộ nhớ trên 1 lần nạp chi tiết đơn.
+    - Ghi đơn mới, dòng mới và dòng gốc bằng bulk_create/bulk_update.
+    - Đơn gốc phải còn lại ít nhất 1 sản phẩm.
+    - Khuyến mãi của đơn gốc (discount/coupon) được chia theo tỷ lệ tiền hàng: mỗi đơn mới nhận tiền hàng
+      nhân tỷ lệ tổng đơn/tiền hàng của đơn gốc, tổng các đơn sau khi tách bằng tổng đơn gốc trước khi tách.
+    Trả về danh sách đơn mới theo thứ tự splits.
+    """
+    with transaction.atomic():
+        original = Order.objects.select_for_update().filter(id=order_id, status=Order.Status.PENDING).first()
+        if original is None:
+            raise serializers.ValidationError("Đơn hàng không tồn tại hoặc không ở trạng thái PENDING")
+        details = {detail.id: detail for detail in original.order_details.all()}
+
+        remaining = {detail_id: detail.qty for detail_id, detail in details.items()}
+        for split in splits:
+            for item in split['items']:
+                if item['detail_id'] not in details:
+                    raise serializers.ValidationError(f"Chi tiết đơn hàng {item['detail_id']} không thuộc đơn hàng này.")
+                remaining[item['detail_id']] -= item['qty']
+                if remaining[item['detail_id']] < 0:
+                    raise serializers.ValidationError(f"Số lượng tách không hợp lệ cho item {item['detail_id']}")
+        if not any(qty > 0 for qty in remaining.values()):
+            raise serializers.ValidationError("Đơn gốc phải còn lại ít nhất 1 sản phẩm.")
+
+        new_orders = [
+            Order(
+                customer=split.get('customer', original.customer),
+                employee=original.employee,
+                payment_method=split.get('payment_method', original.payment_method),
+                status=Order.Status.PENDING,
+            )
+            for split in splits
+        ]
+        # Giữ đơn giá của dòng gốc (dòng quà tặng có tổng 0)
+        unit_prices = {detail_id: detail.total // detail.qty if detail.qty else 0 for detail_id, detail in details.items()}
+        subtotal = sum(detail.total for detail in details.values())
+        new_details, moves = [], []
+        moved_total = 0
+        for order, split in zip(new_orders, splits):
+            order_subtotal = 0
+            for item in split['items']:
+                source = details[item['detail_id']]
+                total = unit_prices[source.id] * item['qty']
+                detail = OrderDetail(order=order, variant_id=source.variant_id, unit_id=source.unit_id, qty=item['qty'], total=total)
+                new_details.append(detail)
+                moves.append((source, detail, item['qty']))
+                order_subtotal += total
+                source.qty -= item['qty']
+                source.total -= total
+            order.total_amount = round(order_subtotal * original.total_amount / subtotal) if subtotal else 0
+            moved_total += order.total_amount
+        Order.objects.bulk_create(new_orders)
+        OrderDetail.objects.bulk_create(new_details)
+        _carve_allocations(moves)
+
+        sources = {source.id: source for source, _, _ in moves}
+        OrderDetail.objects.bulk_update([d for d in sources.values() if d.qty > 0], ['qty', 'total'])
+        OrderDetail.objects.filter(id__in=[d.id for d in sources.values() if d.qty == 0]).delete()
+
+        original.total_amount = max(original.total_amount - moved_total, 0)
+        original.save(update_fields=['total_amount'])
+    return new_orders
@@ -0,0 +1,55 @@
+import threading
+
+
+class EndpointMetrics:
+    """Số liệu cộng dồn trong process cho từng endpoint (theo tên URL)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, queries, sql_ms, app_ms, size, over_budget):
+        with self._lock:
+            item = self._data.setdefault(endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'sql_ms': 0.0,
+                'app_ms': 0.0,
+                'response_bytes': 0,
+                'max_response_bytes': 0,
+                'over_budget': 0,
+            })
+            item['requests'] += 1
+            item['queries'] += queries
+            item['max_queries'] = max(item['max_queries'], queries)
+            item['sql_ms'] += sql_ms
+            item['app_ms'] += app_ms
+            item['response_bytes'] += size
+            item['max_response_bytes'] = max(item['max_response_bytes'], size)
+            item['over_budget'] += int(over_budget)
+
+    def snapshot(self):
+        with self._lock:
+            rows = []
+            for endpoint, item in sorted(self._data.items()):
+                requests = item['requests']
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': requests,
+                    'avg_queries': round(item['queries'] / requests, 2),
+                    'max_queries': item['max_queries'],
+                    'avg_sql_ms': round(item['sql_ms'] / requests, 2),
+                    'avg_app_ms': round(item['app_ms'] / requests, 2),
+                    'avg_response_bytes': item['response_bytes'] // requests,
+                    'max_response_bytes': item['max_response_bytes'],
+                    'over_budget': item['over_budget'],
+                })
+            return rows
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+request_metrics = EndpointMetrics()
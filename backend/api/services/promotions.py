@@ -0,0 +1,159 @@
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from ..models import Discount, GiftProduct
+from .cache import VersionedTable, process_local_cache
+
+
+# Key phiên bản bảng luật khuyến mãi trong Django cache, tăng mỗi khi dữ liệu khuyến mãi thay đổi
+PROMOTION_VERSION_KEY = 'promotion_rules_version'
+
+
+class PromotionRule:
+    """
+    1 Discount đã biên dịch: điều kiện của mọi PromotionCondition được gộp lại
+    (phải thỏa tất cả => lấy ngưỡng lớn nhất), quà tặng kèm giá để tính giá trị.
+    """
+    __slots__ = (
+        'discount_id', 'name', 'discount_type', 'value', 'value_type', 'variant_id',
+        'start_date', 'end_date', 'usage_limit', 'min_qty', 'min_amount', 'gifts', 'gift_value'
+    )
+
+    def __init__(self, discount):
+        conditions = list(discount.conditions.all())
+        gifts = [gift for gift in discount.giftproduct_set.all() if gift.variant_id]
+        self.discount_id = discount.id
+        self.name = discount.discount_name
+        self.discount_type = discount.discount_type.upper().replace('-', '_')
+        self.value = discount.promotion_value or 0
+        self.value_type = (discount.promotion_value_type or '').upper()
+        self.variant_id = discount.variant_id
+        self.start_date = discount.start_date
+        self.end_date = discount.end_date
+        self.usage_limit = discount.usage_limit
+        self.min_qty = max((condition.min_purchase_qty for condition in conditions), default=0)
+        self.min_amount = max((condition.min_purchase_amount for condition in conditions), default=0)
+        self.gifts = [(gift.variant_id, gift.qty, gift.unit_id) for gift in gifts]
+        self.gift_value = sum(gift.qty * gift.variant.variant_price for gift in gifts)
+
+    def is_active(self, now):
+        return (
+            (self.start_date is None or self.start_date <= now)
+            and (self.end_date is None or now <= self.end_date)
+            and (self.usage_limit is None or self.usage_limit > 0)
+        )
+
+    def saving(self, total_amount):
+        """Số tiền khách được lợi (giảm trên tổng đơn như _apply_discount, hoặc giá trị quà)."""
+        if self.discount_type == Discount.DiscountType.BUY_X_GET_Y:
+            return self.gift_value
+        if self.value_type == Discount.PromotionValueType.PERCENTAGE:
+            return total_amount * self.value / 100
+        if self.value_type == Discount.PromotionValueType.FIX:
+            return min(self.value, total_amount)
+        return 0
+
+
+def _build_rules_table():
+    """
+    Luật của các Discount chưa hết hạn (3 query):
+    ({variant_id: [luật]}, [luật không gắn variant], {discount_id: luật}).
+    """
+    discounts = (
+        Discount.objects
+        .filter(Q(end_date__isnull=True) | Q(end_date__gte=timezone.now()))
+        .prefetch_related('conditions', Prefetch('giftproduct_set', queryset=GiftProduct.objects.select_related('variant')))
+    )
+    by_variant, general, by_id = {}, [], {}
+    for discount in discounts:
+        rule = PromotionRule(discount)
+        by_id[rule.discount_id] = rule
+        if rule.variant_id:
+            by_variant.setdefault(rule.variant_id, []).append(rule)
+        else:
+            general.append(rule)
+    return by_variant, general, by_id
+
+
+_rules_table = VersionedTable(PROMOTION_VERSION_KEY, _build_rules_table)
+
+
+def _cart_totals(lines):
+    """lines: (variant_id, qty, amount) -> ({variant_id: [qty, amount]}, tổng qty, tổng tiền)."""
+    by_variant = {}
+    for variant_id, qty, amount in lines:
+        item = by_variant.setdefault(variant_id, [0, 0])
+        item[0] += qty
+        item[1] += amount
+    return by_variant, sum(item[0] for item in by_variant.values()), sum(item[1] for item in by_variant.values())
+
+
+def _applies(rule, by_variant, total_qty, total_amount, now):
+    if not rule.is_active(now):
+        return False
+    if rule.variant_id:
+        # Luật gắn variant: giỏ phải có variant đó, ngưỡng tính trên các dòng của variant
+        if rule.variant_id not in by_variant:
+            return False
+        qty, amount = by_variant[rule.variant_id]
+    else:
+        qty, amount = total_qty, total_amount
+    return qty >= rule.min_qty and amount >= rule.min_amount
+
+
+def _as_dict(rule, total_amount):
+    return {
+        'discount_id': rule.discount_id,
+        'discount_name': rule.name,
+        'discount_type': rule.discount_type,
+        'saving': int(rule.saving(total_amount)),
+        'gifts': [{'variant': variant_id, 'qty': qty, 'unit': unit_id} for variant_id, qty, unit_id in rule.gifts],
+    }
+
+
+def evaluate_promotions(lines):
+    """
+    Các khuyến mãi áp dụng được cho giỏ hàng, sắp theo số tiền được lợi giảm dần.
+    Chỉ xét luật không gắn variant và luật của các variant có trong giỏ, không query thêm.
+    """
+    rules_by_variant, general, _ = _rules_table.get()
+    by_variant, total_qty, total_amount = _cart_totals(lines)
+    now = timezone.now()
+    candidates = list(general)
+    for variant_id in by_variant:
+        candidates.extend(rules_by_variant.get(variant_id, ()))
+    applicable = [rule for rule in candidates if _applies(rule, by_variant, total_qty, total_amount, now)]
+    applicable.sort(key=lambda rule: (-rule.saving(total_amount), rule.discount_id))
+    return [_as_dict(rule, total_amount) for rule in applicable]
+
+
+def best_promotion(lines):
+    """Khuyến mãi có lợi nhất cho giỏ hàng (None nếu không có hoặc PROMOTION_AUTO_APPLY = False)."""
+    if not getattr(settings, 'PROMOTION_AUTO_APPLY', True):
+        return None
+    promotions = evaluate_promotions(lines)
+    return promotions[0] if promotions and promotions[0]['saving'] > 0 else None
+
+
+def promotion_applies(discount_id, lines):
+    """Discount được chọn có thỏa thời gian, lượt dùng và điều kiện tối thiểu với giỏ hàng không."""
+    rule = _rules_table.get()[2].get(discount_id)
+    if rule is None:
+        return False
+    by_variant, total_qty, total_amount = _cart_totals(lines)
+    return _applies(rule, by_variant, total_qty, total_amount, timezone.now())
+
+
+def refresh_promotion_rules():
+    """
+    Cache chỉ nằm trong process thì bảng luật có thể còn discount mà worker khác đã xóa/sửa:
+    bỏ bảng để lần sau nạp lại. Trả về True nếu đã bỏ (cache dùng chung thì bảng luôn mới, không cần).
+    """
+    if not process_local_cache():
+        return False
+    _rules_table.refresh()
+    return True
+
+
+def invalidate_promotion_rules():
+    _rules_table.invalidate()
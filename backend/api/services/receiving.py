@@ -0,0 +1,71 @@
+from ..models import ProductVariant, Inventory, InventoryBatch, StockMovement
+from ..signals import stock_changed
+from .inventory import average_cost
+from .ledger import record_movements
+from .units import convert_qty, unit_factors
+
+
+def post_goods_receipt(purchase_order, expiry_map=None):
+    """
+    Nhập kho cho phiếu nhập (status RECEIVE) với số query cố định:
+    - Nạp chi tiết phiếu kèm variant bằng 1 query, khóa Inventory theo thứ tự variant_id.
+    - Số lượng nhập được quy đổi về đơn vị của Inventory (Inventory mới dùng đơn vị
+      của sản phẩm), lô mới lưu số lượng và giá theo đơn vị đó.
+    - Tính số lượng nhập, tồn và giá trị tồn trong bộ nhớ; giá vốn variant là
+      giá bình quân gia quyền sau khi nhập, lô lưu giá nhập của 1 đơn vị.
+    - Ghi bằng bulk_update (variant, Inventory) và bulk_create (Inventory mới, InventoryBatch, sổ kho).
+    """
+    expiry_map = expiry_map or {}
+    details = [
+        detail for detail in purchase_order.purchase_details.select_related('variant__product').order_by('id')
+        if detail.variant_id
+    ]
+    if not details:
+        return
+    factors = unit_factors()
+
+    variants = {detail.variant_id: detail.variant for detail in details}
+    inventories = {}
+    for inventory in Inventory.objects.select_for_update().filter(
+        variant_id__in=sorted(variants)
+    ).order_by('variant_id', 'id'):
+        inventories.setdefault(inventory.variant_id, inventory)
+
+    new_inventories = []
+    stock_qty = {}
+    qty_by_variant = {}
+    value_by_variant = {}
+    for detail in details:
+        inventory = inventories.get(detail.variant_id)
+        if inventory is None:
+            unit_id = detail.variant.product.unit_id if detail.variant.product else detail.unit_id
+            inventory = Inventory(variant_id=detail.variant_id, unit_id=unit_id, quantity_in=0, quantity_out=0, balance=0)
+            inventories[detail.variant_id] = inventory
+            new_inventories.append(inventory)
+        stock_qty[detail.id] = convert_qty(detail.qty, detail.unit_id, inventory.unit_id, factors)
+        qty_by_variant[detail.variant_id] = qty_by_variant.get(detail.variant_id, 0) + stock_qty[detail.id]
+        value_by_variant[detail.variant_id] = value_by_variant.get(detail.variant_id, 0) + detail.total
+    for variant_id, inventory in inventories.items():
+        inventory.quantity_in += qty_by_variant[variant_id]
+        inventory.balance = inventory.quantity_in - inventory.quantity_out
+        inventory.stock_value += value_by_variant[variant_id]
+        if inventory.balance > 0:
+            variants[variant_id].variant_cost_price = average_cost(inventory)
+
+    ProductVariant.objects.bulk_update(variants.values(), ['variant_cost_price'])
+    Inventory.objects.bulk_update([inventory for inventory in inventories.values() if inventory.pk], ['quantity_in', 'balance', 'stock_value'])
+    Inventory.objects.bulk_create(new_inventories)
+    record_movements(StockMovement.Kind.RECEIPT, {
+        variant_id: (qty, value_by_variant[variant_id]) for variant_id, qty in qty_by_variant.items()
+    })
+    InventoryBatch.objects.bulk_create([
+        InventoryBatch(
+            qty=stock_qty[detail.id],
+            expiry_date=expiry_map.get(detail.id),
+            purchase_price=detail.total // stock_qty[detail.id] if stock_qty[detail.id] else 0,
+            variant_id=detail.variant_id,
+            unit_id=inventories[detail.variant_id].unit_id
+        )
+        for detail in details
+    ])
+    stock_changed.send(sender=Inventory, variant_ids=list(qty_by_variant))
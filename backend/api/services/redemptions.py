@@ -0,0 +1,114 @@
+import random
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from rest_framework import serializers
+from ..models import Discount, Coupon, RedemptionShard, PromotionRedemption
+from .promotions import invalidate_promotion_rules
+from .coupons import invalidate_coupon_cache
+
+
+def _target_field(target):
+    return 'discount' if isinstance(target, Discount) else 'coupon'
+
+
+def _take_from_shard(target):
+    """Trừ 1 lượt ở 1 shard còn lượt, bắt đầu từ shard ngẫu nhiên. Trả về index của shard hoặc None."""
+    field = _target_field(target)
+    count = target.usage_shards
+    start = random.randrange(count)
+    for offset in range(count):
+        index = (start + offset) % count
+        if RedemptionShard.objects.filter(**{field: target}, index=index, remaining__gt=0).update(remaining=F('remaining') - 1):
+            return index
+    return None
+
+
+def _exhausted(target):
+    # Vừa hết lượt: bảng luật khuyến mãi/bảng coupon không còn gợi ý nó nữa
+    if isinstance(target, Discount):
+        invalidate_promotion_rules()
+    else:
+        invalidate_coupon_cache()
+
+
+def redeem(order, target):
+    """
+    Dùng 1 lượt của discount/coupon cho đơn hàng, không đọc-rồi-ghi và không khóa trước:
+    - usage_limit None: không giới hạn, chỉ ghi nhật ký.
+    - Có shard: trừ ở 1 shard còn lượt.
+    - Còn lại: UPDATE ... SET usage_limit = usage_limit - 1 WHERE usage_limit > 0.
+    Trả về False nếu đã hết lượt.
+    """
+    model = type(target)
+    shard = None
+    if target.usage_shards:
+        shard = _take_from_shard(target)
+        if shard is None:
+            # Các shard đã hết: đánh dấu usage_limit = 0 để bảng luật không gợi ý nữa
+            model.objects.filter(pk=target.pk, usage_limit__gt=0).update(usage_limit=0)
+            _exhausted(target)
+            return False
+    elif target.usage_limit is not None:
+        if not model.objects.filter(pk=target.pk, usage_limit__gt=0).update(usage_limit=F('usage_limit') - 1):
+            _exhausted(target)
+            return False
+    PromotionRedemption.objects.create(order=order, shard=shard, **{_target_field(target): target})
+    return True
+
+
+def release_redemptions(order):
+    """Hoàn lại toàn bộ lượt đã dùng của đơn hàng (theo nhật ký) và xóa nhật ký."""
+    groups = list(
+        PromotionRedemption.objects.filter(order=order)
+        .values('discount_id', 'coupon_id', 'shard')
+        .annotate(count=Count('id'))
+        .order_by('discount_id', 'coupon_id', 'shard')
+    )
+    if not groups:
+        return
+    for group in groups:
+        model, field, target_id = (
+            (Discount, 'discount', group['discount_id']) if group['discount_id'] else (Coupon, 'coupon', group['coupon_id'])
+        )
+        if group['shard'] is not None:
+            RedemptionShard.objects.filter(**{field: target_id}, index=group['shard']).update(
+                remaining=F('remaining') + group['count']
+            )
+            # Bỏ đánh dấu đã hết (nếu có)
+            model.objects.filter(pk=target_id, usage_limit=0).update(usage_limit=group['count'])
+        else:
+            model.objects.filter(pk=target_id, usage_limit__isnull=False).update(usage_limit=F('usage_limit') + group['count'])
+    PromotionRedemption.objects.filter(order=order).delete()
+    if any(group['discount_id'] for group in groups):
+        invalidate_promotion_rules()
+
+
+def remaining_uses(target):
+    """Số lượt còn lại (cộng các shard nếu có), None nếu không giới hạn."""
+    if target.usage_shards:
+        field = _target_field(target)
+        return RedemptionShard.objects.filter(**{field: target}).aggregate(total=Sum('remaining'))['total'] or 0
+    return target.usage_limit
+
+
+def set_usage_shards(target, shards):
+    """
+    Chia lượt còn lại của discount/coupon vào shards bộ đếm (shards = 0: gộp lại vào usage_limit).
+    Khi đang chia shard, usage_limit chỉ là mốc: 0 khi các shard đã hết, dương khi còn lượt.
+    """
+    field = _target_field(target)
+    with transaction.atomic():
+        target = type(target).objects.select_for_update().get(pk=target.pk)
+        if target.usage_limit is None and not target.usage_shards:
+            raise serializers.ValidationError("Không chia shard cho khuyến mãi không giới hạn lượt dùng.")
+        counters = RedemptionShard.objects.select_for_update().filter(**{field: target})
+        remaining = sum(counter.remaining for counter in counters) if target.usage_shards else target.usage_limit
+        counters.delete()
+        RedemptionShard.objects.bulk_create([
+            RedemptionShard(index=index, remaining=remaining // shards + (1 if index < remaining % shards else 0), **{field: target})
+            for index in range(shards)
+        ])
+        target.usage_limit = remaining
+        target.usage_shards = shards
+        target.save(update_fields=['usage_limit', 'usage_shards'])
+    return target
@@ -0,0 +1,120 @@
+from django.db import transaction
+from django.db.models import Sum
+from rest_framework import serializers
+from ..models import Order, ReturnOrder, ReturnDetail, StockMovement
+from .inventory import release_stock, restock_stock, quarantine_stock
+from .units import convert_qty, unit_factor, unit_factors
+
+
+def _base_qty(qty, unit_id, factors):
+    # Số lượng theo đơn vị gốc của chuỗi quy đổi, để so sánh các dòng khác đơn vị
+    return convert_qty(qty, unit_id, unit_factor(unit_id, factors)[0], factors)
+
+
+def _returnable_details(order, return_details, factors):
+    """
+    Kiểm tra số lượng trả không vượt quá số đã bán trừ số đã trả trước đó
+    (so sánh theo đơn vị gốc vì dòng bán và dòng trả có thể khác đơn vị).
+    Trả về (các dòng của đơn gốc theo variant - dòng mới nhất trước, số đã trả trước đó theo variant).
+    """
+    variant_ids = {item['variant'].id for item in return_details}
+    details_by_variant = {}
+    for detail in order.order_details.filter(variant_id__in=variant_ids).order_by('-id'):
+        details_by_variant.setdefault(detail.variant_id, []).append(detail)
+    returnable = {
+        variant_id: sum(_base_qty(detail.qty, detail.unit_id, factors) for detail in details)
+        for variant_id, details in details_by_variant.items()
+    }
+    returned = {}
+    for variant_id, unit_id, total in (
+        ReturnDetail.objects.filter(return_order__order=order, variant_id__in=variant_ids)
+        .exclude(return_order__status=ReturnOrder.Status.CANCELED)
+        .values('variant_id', 'unit_id')
+        .annotate(total=Sum('qty'))
+        .values_list('variant_id', 'unit_id', 'total')
+    ):
+        returned[variant_id] = returned.get(variant_id, 0) + _base_qty(total or 0, unit_id, factors)
+    for variant_id, qty in returned.items():
+        returnable[variant_id] = returnable.get(variant_id, 0) - qty
+    for item in return_details:
+        variant_id = item['variant'].id
+        returnable[variant_id] = returnable.get(variant_id, 0) - _base_qty(item['qty'], item['unit'].id, factors)
+        if returnable[variant_id] < 0:
+            raise serializers.ValidationError(
+                f"Số lượng trả vượt quá số lượng đã bán của sản phẩm {item['variant']} trong đơn {order.id}"
+            )
+    return details_by_variant, returned
+
+
+def _take(details, capacity, qty):
+    """Lấy qty (đơn vị gốc) từ phần còn trả được của các dòng, dòng mới nhất trước. Trả về [(dòng, qty đơn vị gốc)]."""
+    taken = []
+    for detail in details:
+        if qty <= 0:
+            break
+        amount = min(capacity[detail.id], qty)
+        if amount > 0:
+            taken.append((detail, amount))
+            capacity[detail.id] -= amount
+            qty -= amount
+    return taken
+
+
+def process_return(data, return_details):
+    """
+    Tạo phiếu trả hàng và nhập lại kho với số query cố định.
+    - Dòng restock của phiếu có đơn gốc: hoàn về đúng các lô đã xuất cho đơn
+      (BatchAllocation) và cộng lại Inventory, không tạo lô mới.
+    - Dòng restock của phiếu không có đơn gốc: nhập lại thành hàng bán được vào lô nhập sớm nhất
+      (như trước đây, chỉ không tạo lô mới cho mỗi lần trả).
+    - Dòng không restock (hàng lỗi): đưa vào lô cách ly.
+    Sổ kho ghi RETURN cho hàng nhập lại, QUARANTINE cho hàng cách ly.
+    """
+    order = data.get('order')
+    with transaction.atomic():
+        factors = unit_factors()
+        releases, restocked, quarantined = [], [], []
+        if order:
+            # Khóa đơn gốc để 2 phiếu trả đồng thời không cùng vượt số lượng đã bán
+            list(Order.objects.select_for_update().filter(id=order.id).values_list('id', flat=True))
+            details_by_variant, returned = _returnable_details(order, return_details, factors)
+            capacity = {
+                detail.id: _base_qty(detail.qty, detail.unit_id, factors)
+                for details in details_by_variant.values() for detail in details
+            }
+            # Phần đã trả ở các phiếu trước không còn trên dòng bán, trừ theo cùng thứ tự như khi trả
+            for variant_id, qty in returned.items():
+                _take(details_by_variant.get(variant_id, []), capacity, qty)
+
+        rows = []
+        for item in return_details:
+            rows.append(ReturnDetail(
+                variant=item['variant'],
+                qty=item['qty'],
+                unit_price=item['unit_price'],
+                refund_amount=item['qty'] * item['unit_price'],
+                reason=item['reason'],
+                unit=item['unit']
+            ))
+            # Hàng lỗi cũng tính vào phần đã trả của các dòng bán
+            qty = _base_qty(item['qty'], item['unit'].id, factors)
+            taken = _take(details_by_variant[item['variant'].id], capacity, qty) if order else []
+            if not item.get('restock', True):
+                quarantined.append((item['variant'].id, item['unit'].id, item['qty']))
+                continue
+            if not order:
+                restocked.append((item['variant'].id, item['unit'].id, item['qty']))
+                continue
+            for detail, qty in taken:
+                releases.append((detail, convert_qty(qty, unit_factor(detail.unit_id, factors)[0], detail.unit_id, factors)))
+
+        data['total_refurn'] = sum(row.refund_amount for row in rows)
+        return_order = ReturnOrder.objects.create(**data)
+        for row in rows:
+            row.return_order = return_order
+        ReturnDetail.objects.bulk_create(rows)
+
+        release_stock(releases, kind=StockMovement.Kind.RETURN)
+        restock_stock(restocked)
+        quarantine_stock(quarantined)
+    return return_order
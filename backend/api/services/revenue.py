@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from ..models import Order, DailyRevenue, ReturnOrder
+
+
+def add_daily_revenue(date, amount=0, refund=0, count=0):
+    """Cộng dồn doanh thu/hoàn tiền/số đơn vào dòng DailyRevenue của ngày."""
+    if not date or not (amount or refund or count):
+        return
+    DailyRevenue.objects.get_or_create(date=date)
+    DailyRevenue.objects.filter(date=date).update(
+        total_amount=F('total_amount') + amount,
+        refund_amount=F('refund_amount') + refund,
+        order_count=F('order_count') + count
+    )
+
+
+def record_order_revenue(order, deleted=False):
+    """
+    Cập nhật bảng tổng hợp khi đơn chuyển sang COMPLETE (cộng) hoặc rời
+    COMPLETE/bị xóa (trừ). Trạng thái cũ lấy từ lúc đơn được nạp từ database.
+    """
+    old_status, old_total, old_date = getattr(order, 'loaded_revenue_state', (None, None, None))
+    new_status, new_total, new_date = (None, None, None) if deleted else order.revenue_state()
+    if (old_status, old_total, old_date) == (new_status, new_total, new_date):
+        return
+    if old_status == Order.Status.COMPLETE:
+        add_daily_revenue(old_date, amount=-(old_total or 0), count=-1)
+    if new_status == Order.Status.COMPLETE:
+        add_daily_revenue(new_date, amount=new_total or 0, count=1)
+    order.loaded_revenue_state = (new_status, new_total, new_date)
+
+
+def _refund_day(order_id, return_date):
+    # Hoàn tiền được trừ vào ngày của đơn gốc để khớp với lệnh rebuild
+    if order_id:
+        return Order.objects.filter(id=order_id).values_list('order_date', flat=True).first() or return_date
+    return return_date
+
+
+def record_return_refund(return_order, deleted=False):
+    """
+    Cập nhật tiền hoàn trong bảng tổng hợp khi phiếu trả được tạo, đổi số tiền, bị hủy (CANCELED)
+    hoặc khôi phục, bị xóa. Phiếu đã hủy không tính, giống rebuild_daily_revenue.
+    Trạng thái cũ lấy từ lúc phiếu được nạp từ database.
+    """
+    old_status, old_refund, old_order_id, old_date = getattr(return_order, 'loaded_refund_state', (None, None, None, None))
+    new_status, new_refund, new_order_id, new_date = (None, None, None, None) if deleted else return_order.refund_state()
+    if (old_status, old_refund, old_order_id, old_date) == (new_status, new_refund, new_order_id, new_date):
+        return
+    if old_status not in (None, ReturnOrder.Status.CANCELED):
+        add_daily_revenue(_refund_day(old_order_id, old_date), refund=-(old_refund or 0))
+    if new_status not in (None, ReturnOrder.Status.CANCELED):
+        add_daily_revenue(_refund_day(new_order_id, new_date), refund=new_refund or 0)
+    return_order.loaded_refund_state = (new_status, new_refund, new_order_id, new_date)
+
+
+def rebuild_daily_revenue():
+    """Tính lại toàn bộ DailyRevenue từ lịch sử Order và ReturnOrder."""
+    rows = {}
+    for item in (
+        Order.objects.filter(status=Order.Status.COMPLETE)
+        .values('order_date')
+        .annotate(total=Sum('total_amount'), count=Count('id'))
+    ):
+        rows[item['order_date']] = DailyRevenue(
+            date=item['order_date'], total_amount=item['total'] or 0, order_count=item['count']
+        )
+    for item in (
+        ReturnOrder.objects.exclude(status=ReturnOrder.Status.CANCELED)
+        .annotate(day=Coalesce('order__order_date', 'return_date'))
+        .values('day')
+        .annotate(refund=Sum('total_refurn'))
+    ):
+        rows.setdefault(item['day'], DailyRevenue(date=item['day'])).refund_amount = item['refund'] or 0
+
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        DailyRevenue.objects.bulk_create(rows.values())
+    return len(rows)
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import Sum
+from ..models import ProductVariant
+
+
+class LRUCache:
+    """
+    Cache LRU trong process, có TTL để các worker khác nhau không giữ dữ liệu cũ quá lâu.
+    Lưu thêm chỉ mục variant_id -> các key để xóa theo variant.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._keys_by_variant = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value, _ = item
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, variant_ids):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, variant_ids)
+            for variant_id in variant_ids:
+                self._keys_by_variant.setdefault(variant_id, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def invalidate_variants(self, variant_ids):
+        with self._lock:
+            for variant_id in variant_ids:
+                for key in list(self._keys_by_variant.get(variant_id, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._keys_by_variant.clear()
+
+    def _remove(self, key):
+        _, _, variant_ids = self._data.pop(key)
+        for variant_id in variant_ids:
+            keys = self._keys_by_variant.get(variant_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_variant[variant_id]
+
+
+scan_cache = LRUCache(
+    maxsize=getattr(settings, 'SCAN_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'SCAN_CACHE_TTL', 30),
+)
+
+
+def _scan_rows(queryset):
+    return [
+        {
+            'id': variant.id,
+            'sku': variant.sku,
+            'variant_name': variant.variant_name,
+            'barcode': variant.product.barcode if variant.product else None,
+            'price': variant.variant_price,
+            'unit': variant.product.unit_id if variant.product else None,
+            'unit_name': variant.product.unit.unit_name if variant.product else None,
+            'balance': variant.balance or 0,
+        }
+        for variant in queryset.select_related('product__unit').annotate(balance=Sum('inventory__balance')).order_by('id')
+    ]
+
+
+def _matches(row, code):
+    return row['sku'] == code or row['barcode'] == code
+
+
+def scan_lookup(code):
+    """
+    Tìm variant theo SKU, nếu không có thì theo barcode của product.
+    Trả về danh sách variant khớp (barcode có thể ứng với nhiều variant).
+    Cache chỉ giữ mã -> id variant (ít đổi); giá, đơn vị và tồn kho luôn đọc mới bằng 1 query
+    để quầy không thấy tồn cũ sau khi worker khác vừa bán. Mã trong cache đã bị worker khác
+    đổi sang variant khác thì được tra lại từ đầu.
+    """
+    code = (code or '').strip()
+    if not code:
+        return []
+    variant_ids = scan_cache.get(code)
+    if variant_ids is not None:
+        rows = _scan_rows(ProductVariant.objects.filter(id__in=variant_ids))
+        if rows and all(_matches(row, code) for row in rows):
+            return rows
+    rows = _scan_rows(ProductVariant.objects.filter(sku=code))
+    if not rows:
+        rows = _scan_rows(ProductVariant.objects.filter(product__barcode=code))
+    # Không cache kết quả rỗng để mã mới tạo được nhận ngay
+    if rows:
+        variant_ids = [row['id'] for row in rows]
+        scan_cache.set(code, variant_ids, variant_ids)
+    return rows
+
+
+def invalidate_scan_cache(variant_ids):
+    scan_cache.invalidate_variants(variant_ids)
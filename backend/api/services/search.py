@@ -0,0 +1,110 @@
+import re
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+from ..models import Product, ProductVariant, Customer, Supplier
+
+
+SEARCH_TABLE = 'api_search_index'
+
+# rowid trong bảng FTS5 = id * len(KINDS) + mã loại, để cập nhật/xóa theo rowid
+KINDS = {
+    Product: 0,
+    ProductVariant: 1,
+    Customer: 2,
+    Supplier: 3,
+}
+
+SEARCH_FIELDS = {
+    Product: ('prod_name', 'barcode'),
+    ProductVariant: ('variant_name', 'sku'),
+    Customer: ('cus_name', 'cus_phone'),
+    Supplier: ('sup_name',),
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _rowid(model, pk):
+    return pk * len(KINDS) + KINDS[model]
+
+
+def _body(instance):
+    return ' '.join(str(getattr(instance, field) or '') for field in SEARCH_FIELDS[type(instance)])
+
+
+def _match_expression(term):
+    # Mỗi từ khóa là 1 prefix query: "sua"* "tuoi"*
+    tokens = TOKEN_RE.findall(term)
+    return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+def index_instances(instances):
+    """Cập nhật bảng FTS5 cho các instance (chỉ SQLite, Postgres dùng index trigram)."""
+    instances = [instance for instance in instances if type(instance) in KINDS]
+    if not instances:
+        return
+    connection = connections[router.db_for_write(type(instances[0]))]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        rows = [(_rowid(type(instance), instance.pk), KINDS[type(instance)], _body(instance)) for instance in instances]
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(f"INSERT INTO {SEARCH_TABLE} (rowid, kind, body) VALUES (%s, %s, %s)", rows)
+
+
+def remove_instances(model, pks):
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != 'sqlite' or not pks:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(_rowid(model, pk),) for pk in pks])
+
+
+def rebuild_search_index():
+    """Xây lại toàn bộ bảng FTS5 từ dữ liệu hiện có. Trả về số dòng đã index."""
+    connection = connections[router.db_for_write(Product)]
+    if connection.vendor != 'sqlite':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    total = 0
+    for model, fields in SEARCH_FIELDS.items():
+        instances = list(model.objects.only('pk', *fields))
+        index_instances(instances)
+        total += len(instances)
+    return total
+
+
+def search(queryset, term):
+    """
+    Lọc queryset theo từ khóa, xếp hạng theo độ liên quan. Kết quả vẫn là queryset
+    nên đếm và phân trang chạy trong SQL (không giới hạn số kết quả).
+    - SQLite: FTS5 (bm25) với prefix match, không phân biệt dấu.
+    - PostgreSQL: index trigram (pg_trgm) trên UPPER(cột), khớp với icontains + TrigramSimilarity.
+    - Backend khác: icontains.
+    """
+    model = queryset.model
+    fields = SEARCH_FIELDS[model]
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'sqlite':
+        match = _match_expression(term)
+        if not match:
+            return queryset.none()
+        rowid = f'"{model._meta.db_table}"."{model._meta.pk.column}" * {len(KINDS)} + {KINDS[model]}'
+        hits = RawSQL(f"SELECT rowid / {len(KINDS)} FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind = %s", [match, KINDS[model]])
+        rank = RawSQL(f"SELECT rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid = {rowid}", [match])
+        return queryset.filter(pk__in=hits).annotate(search_rank=rank).order_by('search_rank', 'pk')
+
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': term})
+    queryset = queryset.filter(condition)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        similarities = [TrigramSimilarity(field, term) for field in fields]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        return queryset.annotate(search_rank=rank).order_by('-search_rank', 'pk')
+    return queryset
@@ -0,0 +1,113 @@
+from rest_framework import serializers
+from ..models import Unit
+from .cache import VersionedTable
+
+
+# Key phiên bản bảng quy đổi đơn vị trong Django cache, tăng mỗi khi Unit thay đổi
+UNIT_VERSION_KEY = 'unit_factor_version'
+
+
+def _build_factors(parents):
+    """
+    Đi theo chuỗi reference_unit của mỗi đơn vị đúng 1 lần (có nhớ kết quả):
+    factor = contains * factor(reference_unit), đơn vị gốc có factor 1.
+    Trả về {unit_id: (id đơn vị gốc, factor)}, đơn vị nằm trong vòng lặp có factor None.
+    """
+    factors = {}
+    for unit_id in parents:
+        chain = []
+        current = unit_id
+        while current not in factors:
+            if current in chain or current not in parents:
+                # Vòng lặp hoặc tham chiếu tới đơn vị không tồn tại: không quy đổi được
+                factors[current] = (current, None)
+                break
+            chain.append(current)
+            reference_id, contains = parents[current]
+            if reference_id is None:
+                factors[current] = (current, 1.0)
+                chain.pop()
+                break
+            current = reference_id
+        for child in reversed(chain):
+            reference_id, contains = parents[child]
+            root, factor = factors[reference_id]
+            factors[child] = (root, factor * contains if factor is not None and contains else None)
+    return factors
+
+
+def _build_unit_table():
+    """Bảng factor của mọi Unit: ({unit_id: (reference_unit_id, contains)}, {unit_id: (gốc, factor)})."""
+    parents = {
+        unit_id: (reference_id, contains)
+        for unit_id, reference_id, contains in Unit.objects.values_list('id', 'reference_unit_id', 'contains')
+    }
+    return parents, _build_factors(parents)
+
+
+_unit_table = VersionedTable(UNIT_VERSION_KEY, _build_unit_table)
+
+
+def unit_factors():
+    """
+    Bảng {unit_id: (id đơn vị gốc, factor)} hiện tại. Mỗi thao tác ghi kho đọc 1 lần rồi truyền cho các hàm
+    quy đổi (factors=...), để chỉ kiểm tra phiên bản trong cache 1 lần cho cả thao tác.
+    """
+    return _unit_table.get()[1]
+
+
+def unit_factor(unit_id, factors=None):
+    """(id đơn vị gốc, số đơn vị gốc trong 1 đơn vị unit_id)."""
+    factors = unit_factors() if factors is None else factors
+    return factors.get(unit_id, (unit_id, None))
+
+
+def _ratio(from_unit_id, to_unit_id, factors=None):
+    """Số to_unit trong 1 from_unit (qua đơn vị gốc chung)."""
+    factors = unit_factors() if factors is None else factors
+    from_root, from_factor = unit_factor(from_unit_id, factors)
+    to_root, to_factor = unit_factor(to_unit_id, factors)
+    if from_root != to_root or not from_factor or not to_factor:
+        # Dữ liệu cũ ghi theo 2 đơn vị không cùng gốc (vd dòng bán theo Bottle, tồn theo Piece):
+        # không quy đổi được nên giữ nguyên số lượng như trước khi có quy đổi đơn vị
+        return 1
+    return from_factor / to_factor
+
+
+def convert_qty(qty, from_unit_id, to_unit_id, factors=None):
+    """
+    Quy đổi qty từ from_unit sang to_unit qua đơn vị gốc chung.
+    Không có đơn vị (None) hoặc 2 đơn vị không cùng gốc thì giữ nguyên. Kết quả phải là số nguyên.
+    """
+    if from_unit_id is None or to_unit_id is None or from_unit_id == to_unit_id:
+        return qty
+    converted = qty * _ratio(from_unit_id, to_unit_id, factors)
+    if abs(converted - round(converted)) > 1e-9:
+        raise serializers.ValidationError(
+            f"Số lượng {qty} của đơn vị {from_unit_id} không quy đổi được thành số nguyên đơn vị {to_unit_id}."
+        )
+    return int(round(converted))
+
+
+def convert_price(price, from_unit_id, to_unit_id, factors=None):
+    """Giá của 1 from_unit quy ra giá của 1 to_unit (làm tròn)."""
+    if from_unit_id is None or to_unit_id is None or from_unit_id == to_unit_id:
+        return price
+    return int(round(price / _ratio(from_unit_id, to_unit_id, factors)))
+
+
+def creates_unit_cycle(unit_id, reference_id):
+    """True nếu đặt reference_unit của unit_id là reference_id sẽ tạo vòng lặp."""
+    parents = _unit_table.get()[0]
+    seen = set()
+    current = reference_id
+    while current is not None and current not in seen:
+        if current == unit_id:
+            return True
+        seen.add(current)
+        current = parents.get(current, (None, None))[0]
+    return False
+
+
+def invalidate_unit_factors():
+    _unit_table.invalidate()
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Gửi sau khi tồn kho của các variant thay đổi bằng thao tác hàng loạt
+# (bulk_update/bulk_create không phát post_save). Tham số: variant_ids
+stock_changed = Signal()
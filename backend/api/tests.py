@@ -1,3 +1,1017 @@
-from django.test import TestCase
+import importlib
+from datetime import timedelta
+from unittest import mock
+from django.apps import apps
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from backend.routers import ReadReplicaRouter, use_replica
+from .middleware import ReadReplicaMiddleware
+from .models import (
+    Category, Unit, Product, Attribute, AttributeValue, VariantAttribute, ProductVariant, Inventory, InventoryBatch,
+    Discount, PromotionCondition, Coupon, LoyaltyReward, RewardTier, Customer, PromotionRedemption, RedemptionShard,
+    Order, OrderDetail, Invoice, Supplier, PurchaseOrder, PurchaseDetail, BatchAllocation, ProductStockSummary,
+    DailyRevenue, ReturnOrder, CatalogChange, StockMovement, ExpiryAlert,
+)
+from .services import (
+    redeem, release_redemptions, remaining_uses, set_usage_shards,
+    allocate_batches, deduct_stock, release_stock, restock_stock, quarantine_stock, rebuild_daily_revenue,
+    catalog_version, catalog_delta, prune_catalog_changes, scan_lookup, search, merge_orders,
+    split_order, process_return, refresh_expiry_alerts, evaluate_promotions, best_promotion, promotion_applies, record_movements, stock_as_of, take_stock_snapshot, ledger_drift,
+)
+from .services.inventory import refresh_stock_summaries
+from .services.scan import scan_cache
+from .services.units import UNIT_VERSION_KEY
+from .services.profiling import request_metrics
+from .views import ProductListCreate, ProductDetail, RevenueStatisticsAPIView, ScanAPIView
 
-# Create your tests here.
+
+def stocked_variant(unit, sku, batches=(), price=100):
+    """Variant có Inventory theo unit và các lô (qty, purchase_price, expiry_date) theo thứ tự nhập."""
+    category = Category.objects.create(cate_name=f'Category {sku}')
+    product = Product.objects.create(prod_name=f'Product {sku}', category=category, unit=unit, prod_price=price)
+    variant = ProductVariant.objects.create(variant_name=sku, sku=sku, variant_price=price, product=product)
+    created = [
+        InventoryBatch.objects.create(variant=variant, unit=unit, qty=qty, purchase_price=cost, expiry_date=expiry_date)
+        for qty, cost, expiry_date in batches
+    ]
+    Inventory.objects.create(
+        variant=variant, unit=unit,
+        quantity_in=sum(qty for qty, _, _ in batches), balance=sum(qty for qty, _, _ in batches),
+        stock_value=sum(qty * cost for qty, cost, _ in batches),
+    )
+    return variant, created
+
+
+# Replica khi test là mirror của default nhưng dùng connection riêng (không thấy dữ liệu trong transaction của test),
+# nên đọc thẳng từ default
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class ListQueryCountTests(TestCase):
+    """Số query của các endpoint danh sách (ListCreate) không được tăng theo limit (N+1)."""
+    limits = [1, 3, 6]
+    rows = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='staff', password='x')
+        category = Category.objects.create(cate_name='Drinks')
+        unit = Unit.objects.create(unit_name='Bottle')
+        supplier = None
+        for i in range(cls.rows):
+            tier = RewardTier.objects.create(tier_name=f'Tier {i}', min_points=i * 100, exchange_rate=1)
+            customer = Customer.objects.create(cus_name=f'Customer {i}', cus_phone=f'09000000{i:02d}', tier=tier)
+            supplier = Supplier.objects.create(
+                sup_name=f'Supplier {i}', contact_person='A', sup_phone=f'0910000{i:03d}', sup_mail='a@b.c', sup_add='HN'
+            )
+            attribute = Attribute.objects.create(att_name=f'Size {i}')
+            values = [AttributeValue.objects.create(value=f'V{i}-{j}', attribute=attribute) for j in range(2)]
+            product = Product.objects.create(prod_name=f'Product {i}', category=category, unit=unit, prod_price=100)
+            variant = ProductVariant.objects.create(variant_name=f'Variant {i}', sku=f'SKU{i}', variant_price=100, product=product)
+            for value in values:
+                VariantAttribute.objects.create(value=value, variant=variant)
+            Inventory.objects.create(variant=variant, unit=unit, quantity_in=10, balance=10)
+            discount = Discount.objects.create(discount_name=f'Discount {i}', variant=variant, promotion_value=10, promotion_value_type='FIX')
+            PromotionCondition.objects.create(discount=discount, min_purchase_qty=1)
+            coupon = Coupon.objects.create(code=f'CODE{i}', promotion_value=10, promotion_value_type='FIX')
+            LoyaltyReward.objects.create(reward_type='COUPON', coupon=coupon, discount=discount, tier=tier)
+            order = Order.objects.create(customer=customer, employee=user, coupon=coupon, discount=discount)
+            OrderDetail.objects.create(order=order, variant=variant, qty=1, total=100, unit=unit)
+            Invoice.objects.create(order=order, total_amount=100, amount_received=100)
+            purchase = PurchaseOrder.objects.create(supplier=supplier, employee=user, status=PurchaseOrder.Status.PENDING)
+            PurchaseDetail.objects.create(purchase_order=purchase, variant=variant, unit=unit, qty=1, total=50)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertConstantQueries(self, name):
+        url = reverse(name)
+        with CaptureQueriesContext(connection) as baseline:
+            response = self.client.get(url, {'limit': self.limits[0]})
+        self.assertEqual(response.status_code, 200, url)
+        for limit in self.limits[1:]:
+            with self.subTest(url=url, limit=limit), self.assertNumQueries(len(baseline)):
+                self.client.get(url, {'limit': limit})
+
+    def test_attribute_list_prefetches_values(self):
+        # COUNT + trang Attribute + 1 query prefetch values (QueryPlanMixin suy ra từ AttributeSerializer)
+        for limit in self.limits:
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('attribute-list'), {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+        self.assertEqual(len(response.data['results']), self.rows)
+        self.assertEqual(len(response.data['results'][0]['values']), 2)
+
+    def test_list_endpoints_have_constant_query_count(self):
+        for name in [
+            'customer-list', 'supplier-list', 'unit-list', 'attribute-list', 'attribute-value-list',
+            'category-list', 'product-list', 'variant-list', 'condition-list', 'discount-list',
+            'coupon-list', 'reward-tier-list', 'loyalty-tier-list', 'order-list', 'invoice-list', 'purchase-list',
+        ]:
+            self.assertConstantQueries(name)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class RedemptionTests(TestCase):
+    """Trừ lượt dùng có điều kiện (không âm) và hoàn lượt khi sửa đơn."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(cate_name='Drinks')
+        cls.unit = Unit.objects.create(unit_name='Bottle')
+        product = Product.objects.create(prod_name='Milk', category=category, unit=cls.unit, prod_price=100)
+        cls.variant = ProductVariant.objects.create(variant_name='Milk', sku='MILK', variant_price=100, product=product)
+        Inventory.objects.create(variant=cls.variant, unit=cls.unit, quantity_in=20, balance=20)
+        InventoryBatch.objects.create(variant=cls.variant, unit=cls.unit, qty=20, purchase_price=50)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_redeem_stops_at_zero(self):
+        coupon = Coupon.objects.create(code='ONCE', usage_limit=1)
+        order = Order.objects.create()
+        self.assertTrue(redeem(order, coupon))
+        self.assertFalse(redeem(order, coupon))
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_limit, 0)
+        self.assertEqual(PromotionRedemption.objects.filter(coupon=coupon).count(), 1)
+
+    def test_sharded_redeem_stops_at_zero(self):
+        coupon = set_usage_shards(Coupon.objects.create(code='SHARDED', usage_limit=3), 2)
+        order = Order.objects.create()
+        self.assertEqual([redeem(order, coupon) for _ in range(4)], [True, True, True, False])
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_limit, 0)
+        self.assertEqual(remaining_uses(coupon), 0)
+        self.assertFalse(RedemptionShard.objects.filter(coupon=coupon, remaining__lt=0).exists())
+
+        release_redemptions(order)
+        coupon.refresh_from_db()
+        self.assertEqual(remaining_uses(coupon), 3)
+        self.assertGreater(coupon.usage_limit, 0)
+
+    def test_order_edit_releases_old_redemption(self):
+        coupon = Coupon.objects.create(code='EDIT', usage_limit=2, promotion_value=10, promotion_value_type='FIX')
+        response = self.client.post(reverse('order-list'), {
+            'payment_method': 'CASH', 'coupon': coupon.id,
+            'order_details': [{'variant': self.variant.id, 'qty': 1, 'unit': self.unit.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        order = Order.objects.get(id=response.data['id'])
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_limit, 1)
+
+        # Sửa đơn: lượt cũ được hoàn rồi trừ lại, không tốn thêm lượt
+        detail_id = response.data['order_details'][0]['id']
+        response = self.client.put(reverse('order-update', args=[order.id]), {
+            'payment_method': 'CASH', 'status': 'PENDING',
+            'order_details': [{'id': detail_id, 'variant': self.variant.id, 'qty': 3, 'unit': self.unit.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_limit, 1)
+        self.assertEqual(PromotionRedemption.objects.filter(order=order).count(), 1)
+
+        release_redemptions(order)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_limit, 2)
+        self.assertFalse(PromotionRedemption.objects.filter(order=order).exists())
+
+
+class BatchAllocationTests(TestCase):
+    """Phân bổ lô FIFO/FEFO và quy ước đơn vị của lô (luôn theo đơn vị của Inventory)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+        cls.case = Unit.objects.create(unit_name='Case', contains=24, reference_unit=cls.bottle)
+
+    def test_fifo_takes_oldest_batch_first(self):
+        variant, (first, second) = stocked_variant(self.bottle, 'FIFO', [(10, 50, None), (10, 60, None)])
+        allocations = allocate_batches([(variant, 15)], 'FIFO')
+        self.assertEqual([(a.batch_id, a.qty) for a in allocations[0]], [(first.id, 10), (second.id, 5)])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.qty, second.qty), (0, 5))
+
+    def test_fefo_takes_earliest_expiry_first(self):
+        today = timezone.localdate()
+        variant, (no_expiry, late, soon) = stocked_variant(self.bottle, 'FEFO', [
+            (5, 50, None), (5, 50, today + timedelta(days=30)), (5, 50, today + timedelta(days=5)),
+        ])
+        allocations = allocate_batches([(variant, 12)], 'FEFO')
+        self.assertEqual([(a.batch_id, a.qty) for a in allocations[0]], [(soon.id, 5), (late.id, 5), (no_expiry.id, 2)])
+
+    def test_shortage_raises(self):
+        variant, _ = stocked_variant(self.bottle, 'SHORT', [(3, 50, None)])
+        with self.assertRaises(ValidationError):
+            allocate_batches([(variant, 4)], 'FIFO')
+
+    def test_legacy_batch_in_other_unit_is_converted_to_stock_unit(self):
+        variant, (bottles,) = stocked_variant(self.bottle, 'MULTI', [(10, 100, None)])
+        # Lô cũ nhập theo thùng (2 thùng, 2400/thùng), nhập trước lô chai
+        cases = InventoryBatch.objects.create(variant=variant, unit=self.case, qty=2, purchase_price=2400)
+        InventoryBatch.objects.filter(id=cases.id).update(received_date=timezone.localdate() - timedelta(days=1))
+        Inventory.objects.filter(variant=variant).update(quantity_in=58, balance=58, stock_value=5800)
+        order = Order.objects.create()
+        detail = OrderDetail.objects.create(order=order, variant=variant, qty=1, total=2400, unit=self.case)
+
+        def stock():
+            cases.refresh_from_db()
+            bottles.refresh_from_db()
+            return Inventory.objects.get(variant=variant).balance, cases.qty + bottles.qty
+
+        allocations = deduct_stock([(variant, 1, self.case.id)])
+        for allocation in allocations[0]:
+            allocation.order_detail = detail
+        BatchAllocation.objects.bulk_create(allocations[0])
+        self.assertEqual([(a.batch_id, a.qty, a.unit_cost) for a in allocations[0]], [(cases.id, 24, 100)])
+        self.assertEqual(stock(), (34, 34))
+        self.assertEqual((cases.unit_id, cases.purchase_price), (self.bottle.id, 100))
+
+        release_stock([(detail, 1)])
+        self.assertEqual(stock(), (58, 58))
+        self.assertFalse(BatchAllocation.objects.filter(order_detail=detail).exists())
+
+        restock_stock([(variant.id, self.case.id, 1)])
+        self.assertEqual(stock(), (82, 82))
+        self.assertEqual(cases.qty, 72)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class StockSummaryTests(TestCase):
+    """ProductStockSummary được tính lại 1 lần khi commit sau mỗi thay đổi tồn kho/biến thể."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+
+    def test_summary_is_built_once_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            variant, _ = stocked_variant(self.bottle, 'SUMMARY', [(10, 50, None)])
+            attribute = Attribute.objects.create(att_name='Size')
+            VariantAttribute.objects.create(variant=variant, value=AttributeValue.objects.create(value='1L', attribute=attribute))
+        # Nhiều thay đổi trong 1 transaction chỉ tính lại 1 lần khi commit
+        refreshes = [c for c in callbacks if getattr(c, 'batched_func', None) is refresh_stock_summaries]
+        self.assertEqual(len(refreshes), 1)
+        summary = ProductStockSummary.objects.get(product=variant.product)
+        self.assertEqual((summary.total_balance, summary.variant_count), (10, 1))
+        self.assertEqual(summary.attributes_display, [{'value': '1L', 'default_extra_price': 0, 'order': str(variant.id)}])
+
+    def test_summary_follows_stock_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            variant, _ = stocked_variant(self.bottle, 'WRITES', [(10, 50, None)])
+        with self.captureOnCommitCallbacks(execute=True):
+            deduct_stock([(variant, 4, self.bottle.id)])
+            deduct_stock([(variant, 1, self.bottle.id)])
+        response = APIClient().get(reverse('product-detail', args=[variant.product_id]))
+        self.assertEqual((response.data['total_inventory'], response.data['variant_count']), (5, 1))
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class RevenueRollupTests(TestCase):
+    """DailyRevenue cập nhật dần phải khớp với rebuild_daily_revenue, báo cáo giữ doanh thu gộp."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cashier', password='x')
+
+    def rollup(self):
+        return list(DailyRevenue.objects.order_by('date').values_list('date', 'total_amount', 'refund_amount', 'order_count'))
+
+    def test_refunds_follow_return_status(self):
+        order = Order.objects.create(total_amount=1000)
+        order.status = Order.Status.COMPLETE
+        order.save()
+        ReturnOrder.objects.create(order=order, total_refurn=300, handled_by=self.user, note='')
+        today = timezone.localdate()
+        self.assertEqual(self.rollup(), [(today, 1000, 300, 1)])
+
+        response = APIClient().get(reverse('revenue-statistics'))
+        self.assertEqual(response.data, [{
+            'period': today.replace(day=1).strftime('%Y-%m-%d'), 'total_amount': 1000, 'refund_amount': 300, 'net_amount': 700,
+        }])
+
+        # Hủy phiếu trả thì hoàn tiền được trừ lại, khớp với rebuild (bỏ qua phiếu đã hủy)
+        return_order = ReturnOrder.objects.get()
+        return_order.status = ReturnOrder.Status.CANCELED
+        return_order.save()
+        self.assertEqual(self.rollup(), [(today, 1000, 0, 1)])
+        incremental = self.rollup()
+        rebuild_daily_revenue()
+        self.assertEqual(self.rollup(), incremental)
+
+        return_order = ReturnOrder.objects.get()
+        return_order.status = ReturnOrder.Status.APPROVED
+        return_order.save()
+        ReturnOrder.objects.create(total_refurn=50, handled_by=self.user, note='')
+        incremental = self.rollup()
+        self.assertEqual(incremental, [(today, 1000, 350, 1)])
+        rebuild_daily_revenue()
+        self.assertEqual(self.rollup(), incremental)
+
+        ReturnOrder.objects.filter(total_refurn=50).get().delete()
+        self.assertEqual(self.rollup(), [(today, 1000, 300, 1)])
+
+
+class ReadReplicaRoutingTests(SimpleTestCase):
+    """Chỉ request GET tới view danh sách/chi tiết hoặc view có use_read_replica mới đọc từ replica."""
+
+    def routed(self, method, view):
+        token = use_replica.set(False)
+        try:
+            ReadReplicaMiddleware(lambda request: None).process_view(RequestFactory().generic(method, '/'), view, (), {})
+            return ReadReplicaRouter().db_for_read(Product), ReadReplicaRouter().db_for_write(Product)
+        finally:
+            use_replica.reset(token)
+
+    def test_safe_requests_to_read_views_use_replica(self):
+        self.assertEqual(self.routed('GET', ProductListCreate.as_view()), ('replica', 'default'))
+        self.assertEqual(self.routed('GET', ProductDetail.as_view()), ('replica', 'default'))
+        self.assertEqual(self.routed('GET', RevenueStatisticsAPIView.as_view()), ('replica', 'default'))
+
+    def test_writes_and_other_views_use_default(self):
+        self.assertEqual(self.routed('POST', ProductListCreate.as_view()), ('default', 'default'))
+        self.assertEqual(self.routed('GET', ScanAPIView.as_view()), ('default', 'default'))
+        self.assertEqual(ReadReplicaRouter().db_for_read(Product), 'default')
+
+    def test_migrations_only_run_on_default(self):
+        router = ReadReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'api'))
+        self.assertFalse(router.allow_migrate('replica', 'api'))
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class CatalogDeltaTests(TestCase):
+    """Phiên bản catalog lấy từ bộ đếm ghi cùng nhật ký, delta sau khi prune trả về toàn bộ."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+
+    def test_delta_lists_changed_and_deleted_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept, _ = stocked_variant(self.bottle, 'KEPT', [(5, 50, None)])
+            removed, _ = stocked_variant(self.bottle, 'REMOVED', [(5, 50, None)])
+        since = catalog_version()
+        self.assertEqual(catalog_delta(since)['variants'], [])
+
+        removed_id = removed.id
+        with self.captureOnCommitCallbacks(execute=True):
+            kept.variant_price = 150
+            kept.save()
+            removed.delete()
+        # 1 transaction là 1 phiên bản
+        self.assertEqual(catalog_version(), since + 1)
+        delta = catalog_delta(since)
+        self.assertEqual((delta['full'], delta['version'], delta['deleted']), (False, since + 1, [removed_id]))
+        self.assertEqual([(row['id'], row['price']) for row in delta['variants']], [(kept.id, 150)])
+
+        response = APIClient().get(reverse('catalog-snapshot'), {'since': since}, HTTP_IF_NONE_MATCH=f'"catalog-{since + 1}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_pruned_history_falls_back_to_full_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            variant, _ = stocked_variant(self.bottle, 'OLD', [(5, 50, None)])
+        version = catalog_version()
+        self.assertGreater(prune_catalog_changes(days=0), 0)
+        self.assertFalse(CatalogChange.objects.exists())
+
+        stale = catalog_delta(version - 1)
+        self.assertTrue(stale['full'])
+        self.assertIn(variant.id, [row['id'] for row in stale['variants']])
+        current = catalog_delta(version)
+        self.assertEqual((current['full'], current['variants']), (False, []))
+
+
+class ScanLookupTests(TestCase):
+    """Cache quét mã chỉ giữ mã -> variant, tồn kho và giá luôn đọc mới."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+        cls.variant, _ = stocked_variant(cls.bottle, 'SCAN', [(10, 50, None)])
+        Product.objects.filter(id=cls.variant.product_id).update(barcode='8930000000001')
+
+    def setUp(self):
+        scan_cache.clear()
+
+    def test_cached_code_reads_fresh_stock_in_one_query(self):
+        self.assertEqual(scan_lookup('SCAN')[0]['balance'], 10)
+        # Worker khác bán hàng/đổi giá: không có invalidation nào tới được process này
+        Inventory.objects.filter(variant=self.variant).update(balance=7)
+        ProductVariant.objects.filter(id=self.variant.id).update(variant_price=120)
+        with self.assertNumQueries(1):
+            rows = scan_lookup('SCAN')
+        self.assertEqual((rows[0]['balance'], rows[0]['price']), (7, 120))
+
+    def test_code_moved_by_another_worker_is_looked_up_again(self):
+        self.assertEqual([row['id'] for row in scan_lookup('8930000000001')], [self.variant.id])
+        self.assertEqual([row['id'] for row in scan_lookup('SCAN')], [self.variant.id])
+        ProductVariant.objects.filter(id=self.variant.id).update(sku='SCAN-2')
+        other, _ = stocked_variant(self.bottle, 'SCAN', [(1, 50, None)])
+        self.assertEqual([row['id'] for row in scan_lookup('SCAN')], [other.id])
+        self.assertEqual([row['id'] for row in scan_lookup('SCAN-2')], [self.variant.id])
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class SearchTests(TestCase):
+    """Tìm kiếm toàn văn (FTS5 khi chạy SQLite): prefix, bỏ dấu, xếp hạng và phân trang trong SQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        bottle = Unit.objects.create(unit_name='Bottle')
+        category = Category.objects.create(cate_name='Milk')
+        cls.products = [
+            Product.objects.create(prod_name=f'Sữa tươi {i}', category=category, unit=bottle) for i in range(7)
+        ]
+        cls.other = Product.objects.create(prod_name='Nước cam', category=category, unit=bottle)
+
+    def test_prefix_and_diacritic_insensitive(self):
+        self.assertEqual(list(search(Product.objects.all(), 'sua tu')), self.products)
+        self.assertEqual(list(search(Product.objects.all(), 'CAM')), [self.other])
+        self.assertEqual(list(search(Product.objects.all(), '!!')), [])
+
+    def test_index_follows_renames(self):
+        product = self.products[0]
+        product.prod_name = 'Nước ép táo'
+        product.save()
+        self.assertEqual(list(search(Product.objects.all(), 'tao')), [product])
+        self.assertNotIn(product, search(Product.objects.all(), 'sua'))
+        product.delete()
+        self.assertEqual(list(search(Product.objects.all(), 'tao')), [])
+
+    def test_count_and_pages_come_from_sql(self):
+        self.assertEqual(search(Product.objects.all(), 'sua').count(), 7)
+        response = APIClient().get(reverse('product-list'), {'name': 'sua', 'limit': 3, 'offset': 6})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.products[6].id])
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+@override_settings(QUERY_PROFILING_HEADERS=True)
+class QueryProfilingTests(TestCase):
+    """Số liệu của QueryProfilingMiddleware: số query, thời gian SQL và thời gian xử lý ngoài SQL (app)."""
+
+    def setUp(self):
+        request_metrics.reset()
+
+    def test_headers_and_metrics(self):
+        Unit.objects.create(unit_name='Bottle')
+        response = APIClient().get(reverse('unit-list'))
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertIn('X-App-Time-Ms', response)
+        self.assertRegex(response['Server-Timing'], r'^sql;dur=[\d.]+, app;dur=[\d.]+$')
+        [row] = request_metrics.snapshot()
+        self.assertEqual((row['endpoint'], row['requests'], row['max_queries']), ('unit-list', 1, 2))
+        self.assertIn('avg_app_ms', row)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class OrderUpdateTests(TestCase):
+    """Sửa đơn chỉ xuất/hoàn kho phần chênh lệch của từng dòng."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+        cls.milk, _ = stocked_variant(cls.bottle, 'MILK', [(10, 50, None), (10, 60, None)])
+        cls.juice, _ = stocked_variant(cls.bottle, 'JUICE', [(10, 40, None)])
+        cls.tea, _ = stocked_variant(cls.bottle, 'TEA', [(10, 30, None)])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def line(self, variant, qty, detail_id=None):
+        data = {'variant': variant.id, 'qty': qty, 'unit': self.bottle.id}
+        if detail_id:
+            data['id'] = detail_id
+        return data
+
+    def balance(self, variant):
+        return Inventory.objects.get(variant=variant).balance
+
+    def allocated(self, detail_id):
+        return sum(BatchAllocation.objects.filter(order_detail_id=detail_id).values_list('qty', flat=True))
+
+    def create_order(self):
+        response = self.client.post(reverse('order-list'), {
+            'payment_method': 'CASH', 'order_details': [self.line(self.milk, 8), self.line(self.juice, 2)],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id'], {d['variant']: d['id'] for d in response.data['order_details']}
+
+    def update(self, order_id, details, **data):
+        return self.client.put(reverse('order-update', args=[order_id]), {
+            'payment_method': 'CASH', 'status': 'PENDING', 'order_details': details, **data,
+        }, format='json')
+
+    def test_only_differences_touch_stock(self):
+        order_id, lines = self.create_order()
+        self.assertEqual((self.balance(self.milk), self.balance(self.juice)), (12, 8))
+
+        response = self.update(order_id, [self.line(self.milk, 12, lines[self.milk.id]), self.line(self.tea, 3)])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((self.balance(self.milk), self.balance(self.juice), self.balance(self.tea)), (8, 10, 7))
+        self.assertEqual(self.allocated(lines[self.milk.id]), 12)
+        self.assertFalse(OrderDetail.objects.filter(id=lines[self.juice.id]).exists())
+        self.assertEqual(Order.objects.get(id=order_id).total_amount, 1500)
+
+        # Dòng không đổi: không có ghi kho nào
+        movements = StockMovement.objects.count()
+        response = self.update(order_id, [
+            self.line(self.milk, 12, lines[self.milk.id]),
+            self.line(self.tea, 3, OrderDetail.objects.get(order_id=order_id, variant=self.tea).id),
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(StockMovement.objects.count(), movements)
+
+        # Giảm số lượng: hoàn về lô xuất sau cùng trước
+        response = self.update(order_id, [self.line(self.milk, 5, lines[self.milk.id])])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((self.balance(self.milk), self.balance(self.tea)), (15, 10))
+        self.assertEqual(
+            list(InventoryBatch.objects.filter(variant=self.milk).order_by('id').values_list('qty', flat=True)), [5, 10]
+        )
+
+    def test_rejects_foreign_lines_and_closed_orders(self):
+        order_id, lines = self.create_order()
+        other_id, other_lines = self.create_order()
+        response = self.update(order_id, [self.line(self.milk, 1, other_lines[self.milk.id])])
+        self.assertEqual(response.status_code, 400)
+
+        Order.objects.filter(id=order_id).update(status=Order.Status.COMPLETE)
+        response = self.update(order_id, [self.line(self.milk, 1, lines[self.milk.id])], status='COMPLETE')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.balance(self.milk), 4)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class MergeSplitOrderTests(TestCase):
+    """Gộp/tách đơn giữ đúng khuyến mãi của đơn."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+        cls.milk, _ = stocked_variant(cls.bottle, 'MILK', [(50, 50, None)])
+        cls.juice, _ = stocked_variant(cls.bottle, 'JUICE', [(50, 40, None)])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_order(self, lines, **data):
+        response = self.client.post(reverse('order-list'), {
+            'payment_method': 'CASH',
+            'order_details': [{'variant': variant.id, 'qty': qty, 'unit': self.bottle.id} for variant, qty in lines],
+            **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.get(id=response.data['id'])
+
+    def test_merge_keeps_base_promotions(self):
+        percent = Coupon.objects.create(code='TEN', usage_limit=5, promotion_value=10, promotion_value_type='PERCENTAGE')
+        fixed = Coupon.objects.create(code='FIFTY', usage_limit=5, promotion_value=50, promotion_value_type='FIX')
+        base = self.create_order([(self.milk, 4)], coupon=percent.id)
+        source = self.create_order([(self.juice, 5)], coupon=fixed.id)
+        self.assertEqual((base.total_amount, source.total_amount), (360, 450))
+
+        merged = merge_orders([base.id, source.id])
+        self.assertEqual(merged.total_amount, 810)
+        self.assertEqual(Order.objects.get(id=base.id).total_amount, 810)
+        # Lượt của đơn đích vẫn được giữ, lượt của đơn bị gộp được hoàn
+        self.assertEqual(remaining_uses(Coupon.objects.get(id=percent.id)), 4)
+        self.assertEqual(remaining_uses(Coupon.objects.get(id=fixed.id)), 5)
+        self.assertEqual(list(PromotionRedemption.objects.values_list('order_id', flat=True)), [base.id])
+        self.assertEqual(Order.objects.get(id=source.id).status, Order.Status.CANCEL)
+
+    def test_split_shares_discount_proportionally(self):
+        coupon = Coupon.objects.create(code='TEN', promotion_value=10, promotion_value_type='PERCENTAGE')
+        order = self.create_order([(self.milk, 4), (self.juice, 5)], coupon=coupon.id)
+        self.assertEqual(order.total_amount, 810)
+        juice_line = order.order_details.get(variant=self.juice)
+
+        [new_order] = split_order(order.id, [{'items': [{'detail_id': juice_line.id, 'qty': 5}]}])
+        self.assertEqual((Order.objects.get(id=order.id).total_amount, new_order.total_amount), (360, 450))
+
+    def test_split_shares_fixed_discount(self):
+        discount = Discount.objects.create(discount_name='Fifty', promotion_value=50, promotion_value_type='FIX')
+        order = self.create_order([(self.milk, 4), (self.juice, 5)], discount=discount.id)
+        self.assertEqual(order.total_amount, 850)
+        juice_line = order.order_details.get(variant=self.juice)
+
+        new_orders = split_order(order.id, [
+            {'items': [{'detail_id': juice_line.id, 'qty': 2}]},
+            {'items': [{'detail_id': juice_line.id, 'qty': 3}]},
+        ])
+        totals = [new_order.total_amount for new_order in new_orders]
+        self.assertEqual(totals, [189, 283])
+        self.assertEqual(Order.objects.get(id=order.id).total_amount + sum(totals), 850)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class ReturnTests(TestCase):
+    """Trả hàng theo đơn gốc chỉ hoàn phần chưa trả ở các phiếu trước."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cashier', password='x')
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+        cls.milk, cls.batches = stocked_variant(cls.bottle, 'MILK', [(20, 50, None)])
+
+    def setUp(self):
+        response = APIClient().post(reverse('order-list'), {
+            'payment_method': 'CASH',
+            'order_details': [{'variant': self.milk.id, 'qty': qty, 'unit': self.bottle.id} for qty in (3, 2)],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.order = Order.objects.get(id=response.data['id'])
+        self.older, self.newer = self.order.order_details.order_by('id')
+
+    def return_milk(self, qty, restock=True):
+        return process_return({'order': self.order, 'handled_by': self.user, 'note': ''}, [{
+            'variant': self.milk, 'qty': qty, 'unit_price': 100, 'reason': '', 'unit': self.bottle, 'restock': restock,
+        }])
+
+    def allocated(self, detail):
+        return sum(BatchAllocation.objects.filter(order_detail=detail).values_list('qty', flat=True))
+
+    def test_second_return_continues_after_first(self):
+        self.return_milk(2)
+        self.assertEqual((self.allocated(self.newer), self.allocated(self.older)), (0, 3))
+
+        # Dòng mới nhất đã trả hết: phiếu thứ 2 hoàn từ dòng cũ hơn
+        self.return_milk(2)
+        self.assertEqual((self.allocated(self.newer), self.allocated(self.older)), (0, 1))
+        self.assertEqual(Inventory.objects.get(variant=self.milk).balance, 19)
+        self.assertEqual(InventoryBatch.objects.get(id=self.batches[0].id).qty, 19)
+
+        with self.assertRaises(ValidationError):
+            self.return_milk(2)
+        self.assertEqual(ReturnOrder.objects.filter(order=self.order).count(), 2)
+
+    def test_quarantined_return_counts_as_returned(self):
+        self.return_milk(2, restock=False)
+        self.return_milk(3)
+        self.assertEqual((self.allocated(self.newer), self.allocated(self.older)), (2, 0))
+        with self.assertRaises(ValidationError):
+            self.return_milk(1)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class GoodsReceiptTests(TestCase):
+    """Chuyển phiếu nhập sang RECEIVE nhập kho theo đơn vị của Inventory."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.piece = Unit.objects.create(unit_name='Piece')
+        cls.box = Unit.objects.create(unit_name='Box', contains=12, reference_unit=cls.piece)
+        cls.supplier = Supplier.objects.create(sup_name='Supplier', sup_phone='0900000000', sup_mail='s@example.com', sup_add='')
+        cls.milk, _ = stocked_variant(cls.piece, 'MILK', [(10, 5, None)])
+        cls.juice, _ = stocked_variant(cls.box, 'JUICE')
+        Inventory.objects.filter(variant=cls.juice).delete()
+
+    def receive(self, lines, expiry_dates=()):
+        purchase = PurchaseOrder.objects.create(supplier=self.supplier, status=PurchaseOrder.Status.PENDING)
+        details = PurchaseDetail.objects.bulk_create([
+            PurchaseDetail(purchase_order=purchase, variant=variant, unit=unit, qty=qty, total=total)
+            for variant, unit, qty, total in lines
+        ])
+        response = APIClient().patch(reverse('purchase-update', args=[purchase.id]), {
+            'status': 'RECEIVE',
+            'purchase_details': [
+                {'id': detail.id, 'variant': detail.variant_id, 'unit': detail.unit_id, 'qty': detail.qty, 'total': detail.total,
+                 **({'expiry_date': expiry_date} if expiry_date else {})}
+                for detail, expiry_date in zip(details, list(expiry_dates) + [None] * len(details))
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return purchase
+
+    def test_receipt_converts_to_stock_unit_and_averages_cost(self):
+        expiry = timezone.localdate() + timedelta(days=30)
+        self.receive([(self.milk, self.box, 2, 240), (self.juice, self.piece, 24, 480)], [expiry.isoformat()])
+
+        milk = Inventory.objects.get(variant=self.milk)
+        self.assertEqual((milk.unit_id, milk.quantity_in, milk.balance, milk.stock_value), (self.piece.id, 34, 34, 290))
+        self.assertEqual(ProductVariant.objects.get(id=self.milk.id).variant_cost_price, 290 // 34)
+        batch = InventoryBatch.objects.filter(variant=self.milk).latest('id')
+        self.assertEqual((batch.qty, batch.purchase_price, batch.unit_id, batch.expiry_date), (24, 10, self.piece.id, expiry))
+
+        # Variant chưa có Inventory: tạo theo đơn vị của sản phẩm
+        juice = Inventory.objects.get(variant=self.juice)
+        self.assertEqual((juice.unit_id, juice.balance, juice.stock_value), (self.box.id, 2, 480))
+        batch = InventoryBatch.objects.get(variant=self.juice)
+        self.assertEqual((batch.qty, batch.purchase_price, batch.unit_id), (2, 240, self.box.id))
+
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(kind=StockMovement.Kind.RECEIPT).values_list('variant_id', 'qty', 'value')),
+            sorted([(self.milk.id, 24, 240), (self.juice.id, 2, 480)])
+        )
+
+    def test_received_order_is_not_posted_twice(self):
+        purchase = self.receive([(self.milk, self.piece, 5, 50)])
+        response = APIClient().patch(reverse('purchase-update', args=[purchase.id]), {'status': 'RECEIVE'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Inventory.objects.get(variant=self.milk).balance, 15)
+        self.assertEqual(InventoryBatch.objects.filter(variant=self.milk).count(), 2)
+
+
+class CostingTests(TestCase):
+    """Giá vốn hàng xuất theo INVENTORY_COSTING_METHOD và dữ liệu giá nhập cũ khi chuyển sang tính giá vốn."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.piece = Unit.objects.create(unit_name='Piece')
+        cls.milk, _ = stocked_variant(cls.piece, 'MILK', [(10, 5, None), (10, 8, None)])
+
+    def sell(self, qty):
+        [allocations] = deduct_stock([(self.milk, qty, self.piece.id)])
+        return [(allocation.qty, allocation.unit_cost) for allocation in allocations]
+
+    @override_settings(INVENTORY_COSTING_METHOD='AVERAGE')
+    def test_average_cost(self):
+        self.assertEqual(self.sell(12), [(10, 6), (2, 6)])
+        self.assertEqual(Inventory.objects.get(variant=self.milk).stock_value, 130 - 72)
+        self.assertEqual(StockMovement.objects.get(kind=StockMovement.Kind.SALE).value, -72)
+
+    @override_settings(INVENTORY_COSTING_METHOD='FIFO')
+    def test_fifo_cost(self):
+        self.assertEqual(self.sell(12), [(10, 5), (2, 8)])
+        self.assertEqual(Inventory.objects.get(variant=self.milk).stock_value, 64)
+        self.assertEqual(ProductVariant.objects.get(id=self.milk.id).variant_cost_price, 8)
+        self.assertEqual(StockMovement.objects.get(kind=StockMovement.Kind.SALE).value, -66)
+
+    def test_costing_migration_keeps_line_totals(self):
+        migration = importlib.import_module('api.migrations.0057_inventory_costing')
+        supplier = Supplier.objects.create(sup_name='Supplier', sup_phone='0900000000', sup_mail='s@example.com', sup_add='')
+        purchase = PurchaseOrder.objects.create(supplier=supplier)
+        PurchaseDetail.objects.create(purchase_order=purchase, variant=self.milk, unit=self.piece, qty=10, total=50)
+        ProductVariant.objects.filter(id=self.milk.id).update(variant_cost_price=7)
+        # Lô cũ lưu tổng tiền dòng nhập: lô đầu tìm được dòng nhập, lô sau thì không
+        InventoryBatch.objects.filter(variant=self.milk, purchase_price=5).update(purchase_price=50)
+        InventoryBatch.objects.filter(variant=self.milk, purchase_price=8).update(purchase_price=80)
+
+        migration.backfill_costs(apps, None)
+        batches = InventoryBatch.objects.filter(variant=self.milk).order_by('id')
+        self.assertEqual(list(batches.values_list('purchase_price', 'legacy_purchase_total')), [(5, 50), (7, 80)])
+
+        migration.restore_purchase_prices(apps, None)
+        self.assertEqual(list(batches.values_list('purchase_price', flat=True)), [50, 80])
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class StockLedgerTests(TestCase):
+    """Sổ kho ghi đúng loại phát sinh và khớp với Inventory, hàng cách ly không tính vào tồn."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cashier', password='x')
+        cls.piece = Unit.objects.create(unit_name='Piece')
+        cls.box = Unit.objects.create(unit_name='Box', contains=12, reference_unit=cls.piece)
+        cls.milk, _ = stocked_variant(cls.piece, 'MILK', [(30, 5, None)])
+        record_movements(StockMovement.Kind.OPENING, {cls.milk.id: (30, 150)})
+
+    def kinds(self):
+        return list(StockMovement.objects.order_by('id').values_list('kind', 'qty', 'value'))
+
+    def return_line(self, qty, unit, restock):
+        return {'variant': self.milk, 'qty': qty, 'unit_price': 100, 'reason': '', 'unit': unit, 'restock': restock}
+
+    def test_sale_and_returns(self):
+        response = APIClient().post(reverse('order-list'), {
+            'payment_method': 'CASH', 'order_details': [{'variant': self.milk.id, 'qty': 10, 'unit': self.piece.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        order = Order.objects.get(id=response.data['id'])
+        line = self.return_line
+        process_return({'order': order, 'handled_by': self.user, 'note': ''}, [line(4, self.piece, True), line(2, self.piece, False)])
+        process_return({'handled_by': self.user, 'note': ''}, [line(1, self.box, False), line(3, self.piece, True)])
+
+        self.assertEqual(self.kinds(), [
+            ('OPENING', 30, 150), ('SALE', -10, -50),
+            ('RETURN', 4, 20), ('QUARANTINE', 2, 0),
+            ('RETURN', 3, 15), ('QUARANTINE', 12, 0),
+        ])
+        self.assertEqual(Inventory.objects.get(variant=self.milk).balance, 27)
+        self.assertEqual(ledger_drift(), [])
+        self.assertEqual(stock_as_of(timezone.localdate())['variants'], [
+            {'variant_id': self.milk.id, 'balance': 27, 'stock_value': 135},
+        ])
+
+    def test_snapshot_plus_later_movements(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(take_stock_snapshot(yesterday), 1)
+        quarantine_stock([(self.milk.id, self.piece.id, 5)])
+        record_movements(StockMovement.Kind.SALE, {self.milk.id: (-4, -20)})
+
+        today = stock_as_of(timezone.localdate())
+        self.assertEqual(today['snapshot_date'], yesterday)
+        self.assertEqual(today['variants'], [{'variant_id': self.milk.id, 'balance': 26, 'stock_value': 130}])
+        with self.assertRaises(ValueError):
+            take_stock_snapshot(timezone.localdate())
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+@override_settings(EXPIRY_WARNING_DAYS=10)
+class ExpiryAlertTests(TestCase):
+    """Bảng ExpiryAlert theo số ngày cảnh báo của category và được tính lại khi tồn kho đổi."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        cls.piece = Unit.objects.create(unit_name='Piece')
+        cls.milk, cls.milk_batches = stocked_variant(cls.piece, 'MILK', [
+            (5, 10, today + timedelta(days=5)), (5, 10, today + timedelta(days=20)), (5, 10, today - timedelta(days=1)),
+        ])
+        cls.juice, cls.juice_batches = stocked_variant(cls.piece, 'JUICE', [(0, 10, today + timedelta(days=2))])
+
+    def alerts(self):
+        return list(ExpiryAlert.objects.order_by('expiry_date').values_list('batch_id', 'qty'))
+
+    def test_warning_window_per_category(self):
+        self.assertEqual(refresh_expiry_alerts(), 1)
+        self.assertEqual(self.alerts(), [(self.milk_batches[0].id, 5)])
+
+        category = self.milk.product.category
+        category.expiry_warning_days = 30
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        self.assertEqual(self.alerts(), [(self.milk_batches[0].id, 5), (self.milk_batches[1].id, 5)])
+
+    def test_refreshed_after_sale(self):
+        refresh_expiry_alerts()
+        with self.captureOnCommitCallbacks(execute=True):
+            deduct_stock([(self.milk, 3, self.piece.id)])
+        self.assertEqual(self.alerts(), [(self.milk_batches[0].id, 2)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deduct_stock([(self.milk, 2, self.piece.id)])
+        self.assertEqual(self.alerts(), [])
+
+    def test_csv_export(self):
+        refresh_expiry_alerts()
+        response = APIClient().get(reverse('expiry-warning'), {'export': 'csv'})
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], 'id,qty,received_date,expiry_date,purchase_price,variant_name,unit_name')
+        batch = self.milk_batches[0]
+        self.assertEqual(rows[1:], [f'{batch.id},5,{batch.received_date},{batch.expiry_date},10,MILK,Piece'])
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class UnitConversionTests(TestCase):
+    """Quy đổi đơn vị khi ghi kho: dữ liệu cũ khác gốc giữ nguyên số lượng, bảng quy đổi đọc 1 lần mỗi thao tác."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cashier', password='x')
+        # Như variant 62 của dữ liệu cũ: tồn theo Piece, dòng bán theo Bottle, 2 đơn vị không cùng gốc
+        cls.piece = Unit.objects.create(unit_name='Piece')
+        cls.bottle = Unit.objects.create(unit_name='Bottle')
+        cls.box = Unit.objects.create(unit_name='Box', contains=12, reference_unit=cls.piece)
+        cls.milk, _ = stocked_variant(cls.piece, 'MILK', [(50, 5, None)])
+
+    def balance(self):
+        return Inventory.objects.get(variant=self.milk).balance
+
+    def test_legacy_rows_in_unrelated_unit(self):
+        client = APIClient()
+        response = client.post(reverse('order-list'), {
+            'payment_method': 'CASH', 'order_details': [{'variant': self.milk.id, 'qty': 3, 'unit': self.bottle.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.balance(), 47)
+
+        order_id = response.data['id']
+        detail_id = response.data['order_details'][0]['id']
+        response = client.put(reverse('order-update', args=[order_id]), {
+            'payment_method': 'CASH', 'status': 'PENDING',
+            'order_details': [{'id': detail_id, 'variant': self.milk.id, 'qty': 1, 'unit': self.bottle.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.balance(), 49)
+
+        process_return({'order': Order.objects.get(id=order_id), 'handled_by': self.user, 'note': ''}, [{
+            'variant': self.milk, 'qty': 1, 'unit_price': 100, 'reason': '', 'unit': self.bottle, 'restock': True,
+        }])
+        self.assertEqual(self.balance(), 50)
+
+    def test_factors_read_once_per_operation(self):
+        deduct_stock([(self.milk, 1, self.box.id)])
+        self.assertEqual(self.balance(), 38)
+
+        with mock.patch.object(cache, 'get_or_set', wraps=cache.get_or_set) as get_or_set, \
+                CaptureQueriesContext(connection) as queries:
+            deduct_stock([(self.milk, 1, self.box.id), (self.milk, 2, self.piece.id), (self.milk, 1, self.bottle.id)])
+        self.assertEqual([call.args[0] for call in get_or_set.call_args_list].count(UNIT_VERSION_KEY), 1)
+        # Bảng quy đổi không bị nạp lại khi ghi kho
+        self.assertFalse(any('FROM "api_unit"' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.balance(), 23)
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class PromotionTests(TestCase):
+    """Chọn khuyến mãi cho giỏ hàng theo bảng luật, sửa đơn giữ discount khách đã chọn."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.unit = Unit.objects.create(unit_name='Piece')
+        cls.milk, _ = stocked_variant(cls.unit, 'MILK', [(50, 50, None)])
+        cls.juice, _ = stocked_variant(cls.unit, 'JUICE', [(50, 50, None)])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_order(self, qty, **data):
+        response = self.client.post(reverse('order-list'), {
+            'payment_method': 'CASH', 'order_details': [{'variant': self.milk.id, 'qty': qty, 'unit': self.unit.id}], **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def edit_order(self, order, qty, **data):
+        response = self.client.put(reverse('order-update', args=[order['id']]), {
+            'payment_method': 'CASH', 'status': 'PENDING',
+            'order_details': [{'id': order['order_details'][0]['id'], 'variant': self.milk.id, 'qty': qty, 'unit': self.unit.id}],
+            **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return Order.objects.get(id=order['id'])
+
+    def test_evaluate_promotions(self):
+        general = Discount.objects.create(discount_name='Big cart', promotion_value=100, promotion_value_type='FIX')
+        PromotionCondition.objects.create(discount=general, min_purchase_amount=500)
+        juice_rule = Discount.objects.create(
+            discount_name='Juice', promotion_value=10, promotion_value_type='PERCENTAGE', variant=self.juice
+        )
+        PromotionCondition.objects.create(discount=juice_rule, min_purchase_qty=3)
+        Discount.objects.create(
+            discount_name='Expired', promotion_value=90, promotion_value_type='PERCENTAGE',
+            end_date=timezone.now() - timedelta(days=1),
+        )
+
+        cart = [(self.milk.id, 2, 200), (self.juice.id, 3, 300)]
+        self.assertEqual([(p['discount_id'], p['saving']) for p in evaluate_promotions(cart)], [(general.id, 100), (juice_rule.id, 50)])
+        self.assertEqual(best_promotion(cart)['discount_id'], general.id)
+
+        small_cart = [(self.milk.id, 2, 200), (self.juice.id, 2, 200)]
+        self.assertEqual(evaluate_promotions(small_cart), [])
+        self.assertFalse(promotion_applies(juice_rule.id, small_cart))
+        with override_settings(PROMOTION_AUTO_APPLY=False):
+            self.assertIsNone(best_promotion(cart))
+
+    def test_edit_keeps_chosen_discount(self):
+        small = Discount.objects.create(discount_name='Small', promotion_value=10, promotion_value_type='FIX')
+        Discount.objects.create(discount_name='Half', promotion_value=50, promotion_value_type='PERCENTAGE')
+        order = self.create_order(2, discount=small.id)
+        self.assertEqual(order['total_amount'], 190)
+
+        edited = self.edit_order(order, 3)
+        self.assertEqual((edited.discount_id, edited.total_amount), (small.id, 290))
+        self.assertEqual(list(PromotionRedemption.objects.values_list('discount_id', flat=True)), [small.id])
+
+    def test_auto_apply_only_when_order_never_had_discount(self):
+        order = self.create_order(2)
+        self.assertIsNone(order['discount'])
+
+        discount = Discount.objects.create(discount_name='Thirty', promotion_value=30, promotion_value_type='FIX')
+        edited = self.edit_order(order, 3)
+        self.assertEqual((edited.discount_id, edited.total_amount), (discount.id, 270))
+
+        # Khách bỏ discount: không tự áp dụng lại
+        edited = self.edit_order(order, 3, discount=None)
+        self.assertEqual((edited.discount_id, edited.total_amount), (None, 300))
+        self.assertFalse(PromotionRedemption.objects.exists())
+
+
+@modify_settings(MIDDLEWARE={'remove': 'api.middleware.ReadReplicaMiddleware'})
+class CouponCodeTests(TestCase):
+    """Tìm coupon theo mã và chuẩn hóa mã cũ khi thêm ràng buộc unique."""
+
+    def codes(self, **params):
+        response = APIClient().get(reverse('coupon-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['code'] for row in response.data['results'])
+
+    def test_code_search_is_substring_and_prefix_is_separate(self):
+        for code in ('summer10', 'xsum', 'winter'):
+            Coupon.objects.create(code=code)
+        self.assertEqual(self.codes(code='sum'), ['SUMMER10', 'XSUM'])
+        self.assertEqual(self.codes(code_prefix='sum'), ['SUMMER10'])
+        self.assertEqual(self.codes(), ['SUMMER10', 'WINTER', 'XSUM'])
+
+    def test_migration_suffix_skips_existing_codes(self):
+        migration = importlib.import_module('api.migrations.0061_coupon_code_unique')
+        # bulk_create không qua save() nên giữ nguyên mã chưa chuẩn hóa như dữ liệu cũ
+        Coupon.objects.bulk_create([
+            Coupon(id=101, code='promo'), Coupon(id=102, code='PROMO '), Coupon(id=103, code='PROMO-102'),
+            Coupon(id=104, code='a  b'),
+        ])
+        migration.normalize_codes(apps, None)
+        self.assertEqual(
+            list(Coupon.objects.order_by('id').values_list('code', flat=True)), ['PROMO', 'PROMO-102-2', 'PROMO-102', 'A B']
+        )
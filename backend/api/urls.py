@@ -62,10 +62,13 @@ urlpatterns = [
     path('discounts/<int:pk>/', DiscountDetail.as_view(), name='discount-detail'),
     path('discount/update/<int:pk>/', DiscountUpdate.as_view(), name='discount-update'),
     path('discount/delete/<int:pk>/', DiscountDelete.as_view(), name='discount-delete'),
+    path('promotions/evaluate/', PromotionEvaluateAPIView.as_view(), name='promotion-evaluate'),
     
     # MANAGE COUPON
     path('coupons/', CouponListCreate.as_view(), name='coupon-list'),
     path('coupons/<int:pk>/', CouponDetail.as_view(), name='coupon-detail'),
+    path('coupons/validate/', CouponValidateAPIView.as_view(), name='coupon-validate'),
+    path('coupons/lookup/', CouponLookupAPIView.as_view(), name='coupon-lookup'),
     path('coupon/update/<int:pk>/', CouponUpdate.as_view(), name='coupon-update'),
     path('coupon/delete/<int:pk>/', CouponDelete.as_view(), name='coupon-delete'),
     
@@ -102,7 +105,16 @@ urlpatterns = [
     # REVENUE
     path('revenue/', RevenueStatisticsAPIView.as_view(), name='revenue-statistics'),
     
+    # CATALOG (POS)
+    path('catalog/', CatalogSnapshotAPIView.as_view(), name='catalog-snapshot'),
+    path('scan/', ScanAPIView.as_view(), name='scan'),
+    
+    # MONITORING
+    path('metrics/', QueryMetricsAPIView.as_view(), name='query-metrics'),
+    
     # MANAGE INVENTORY
     path('expiry_warning/', ExpiryWarningAPIView.as_view(), name='expiry-warning'),
+    path('inventory/valuation/', InventoryValuationAPIView.as_view(), name='inventory-valuation'),
+    path('inventory/stock-as-of/', StockAsOfAPIView.as_view(), name='stock-as-of'),
     path('quantity_by_attribute/', QuantityVariantByAttributeAPIView.as_view(), name='quantity-by-attribute'),
 ]
\ No newline at end of file
@@ -3,9 +3,10 @@ from rest_framework.permissions import AllowAny
 from rest_framework.pagination import LimitOffsetPagination
 from ..serializers import AttributeSerializer, AttributeValueSerializer
 from ..models import Attribute, AttributeValue
+from .mixins import QueryPlanMixin
 
 
-class AttributeListCreate(generics.ListCreateAPIView):
+class AttributeListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = AttributeSerializer
     pagination_class = LimitOffsetPagination
     permission_classes = [AllowAny]
@@ -14,7 +15,7 @@ class AttributeListCreate(generics.ListCreateAPIView):
         name = self.request.query_params.get('name')
         if name:
             return Attribute.objects.filter(att_name__icontains=name)
-        return Attribute.objects.prefetch_related('values').all()
+        return Attribute.objects.all()
     
 
 class AttributeDetail(generics.RetrieveAPIView):
@@ -35,7 +36,7 @@ class AttributeDelete(generics.DestroyAPIView):
     permission_classes = [AllowAny]
     
     
-class AttributeValueListCreate(generics.ListCreateAPIView):
+class AttributeValueListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = AttributeValueSerializer
     queryset = AttributeValue.objects.all()
     permission_classes = [AllowAny]
@@ -0,0 +1,38 @@
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..services.catalog import catalog_snapshot, catalog_delta
+
+
+@method_decorator(gzip_page, name='dispatch')
+class CatalogSnapshotAPIView(APIView):
+    """
+    Catalog cho máy POS trong 1 lần gọi (nén gzip).
+    - Không có tham số: toàn bộ variant đang bán.
+    - ?since=<version>: chỉ các variant thay đổi sau phiên bản đó (full = true: nhật ký của
+      khoảng đó đã bị xóa, trả về toàn bộ và máy POS thay cả catalog).
+    ETag là số phiên bản, gửi If-None-Match để nhận 304 khi không có gì mới.
+    """
+    permission_classes = [AllowAny]
+    use_read_replica = True
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({"error": "since phải là số nguyên."}, status=status.HTTP_400_BAD_REQUEST)
+            data = catalog_delta(since)
+        else:
+            data = catalog_snapshot()
+
+        etag = f'"catalog-{data["version"]}"'
+        # GZip biến ETag thành dạng yếu W/"..." nên bỏ tiền tố khi so sánh
+        client_tags = [tag.strip().removeprefix('W/') for tag in request.headers.get('If-None-Match', '').split(',')]
+        if etag in client_tags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, status=status.HTTP_200_OK, headers={'ETag': etag})
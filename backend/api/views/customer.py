@@ -1,11 +1,13 @@
 from rest_framework import generics
 from ..serializers import CustomerSerializer
 from ..models import Customer
+from .mixins import QueryPlanMixin
+from ..services import search
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.pagination import LimitOffsetPagination
 
 
-class CustomerListCreate(generics.ListCreateAPIView):
+class CustomerListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = CustomerSerializer
     # permission_classes = [IsAuthenticated]
     permission_classes = [AllowAny]
@@ -21,7 +23,7 @@ class CustomerListCreate(generics.ListCreateAPIView):
         if phone:
             return Customer.objects.filter(cus_phone=phone)
         if name:
-            return Customer.objects.filter(cus_name__icontains=name)
+            return search(Customer.objects.all(), name)
         if address: 
             return Customer.objects.filter(cus_address__icontains=address)
         if tier:
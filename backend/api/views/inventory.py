@@ -1,33 +1,64 @@
+import csv
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.utils import timezone
-from datetime import timedelta
+from django.db import router
+from django.http import StreamingHttpResponse
 
-from ..models import InventoryBatch, ProductVariant, Inventory
-from ..serializers import InventoryBatchExpiryWarningSerializer, InvertorySerializer
+from ..models import ExpiryAlert, ProductVariant, Inventory
+from ..serializers import ExpiryAlertSerializer, InvertorySerializer
 from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+from django.utils.dateparse import parse_date
+from ..services import inventory_valuation, stock_as_of
+
+
+class _Echo:
+    # csv.writer ghi vào đây và trả lại dòng vừa ghi để stream từng dòng
+    def write(self, value):
+        return value
+
 
 class ExpiryWarningAPIView(GenericAPIView):
-    serializer_class = InventoryBatchExpiryWarningSerializer
+    """
+    Lô sắp hết hạn, đọc từ bảng ExpiryAlert (tính sẵn bởi refresh_expiry_alerts).
+    ?export=csv: stream toàn bộ danh sách dưới dạng CSV.
+    """
+    serializer_class = ExpiryAlertSerializer
     permission_classes = [AllowAny]
-    
+    use_read_replica = True
+    csv_fields = ['id', 'qty', 'received_date', 'expiry_date', 'purchase_price', 'variant_name', 'unit_name']
+
     def get_queryset(self):
-        today = timezone.now().date()
-        warning_date = today + timedelta(days=10)
-        
-        return InventoryBatch.objects.filter(expiry_date__range=(today, warning_date))
+        return ExpiryAlert.objects.order_by('expiry_date', 'batch_id')
 
     def get(self, request, *args, **kwargs):
-        expiring_batches = self.get_queryset()
-        serializer = self.get_serializer(expiring_batches, many=True)
-        
+        if request.query_params.get('export') == 'csv':
+            return self.export_csv()
+        serializer = self.get_serializer(self.get_queryset(), many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def export_csv(self):
+        # Chọn DB ngay trong request vì generator chạy sau khi middleware đã trả response
+        rows = self.get_queryset().using(router.db_for_read(ExpiryAlert)).values_list(
+            'batch_id', *self.csv_fields[1:]
+        ).iterator(chunk_size=2000)
+        writer = csv.writer(_Echo())
+
+        def stream():
+            yield writer.writerow(self.csv_fields)
+            for row in rows:
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="expiry_warning.csv"'
+        return response
+
 
 class QuantityVariantByAttributeAPIView(GenericAPIView):
     serializer_class = InvertorySerializer
     permission_classes = [AllowAny]
+    use_read_replica = True
     
     def get_queryset(self):
         product = self.request.query_params.get('product')
@@ -57,4 +88,38 @@ class QuantityVariantByAttributeAPIView(GenericAPIView):
         if not queryset.exists():
             return Response({"detail": "No inventory found."}, status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class InventoryValuationAPIView(APIView):
+    permission_classes = [AllowAny]
+    use_read_replica = True
+
+    def get(self, request):
+        # ?by_variant=true để lấy thêm giá trị tồn theo từng variant
+        by_variant = request.query_params.get('by_variant', '').lower() in ('1', 'true')
+        return Response(inventory_valuation(by_variant=by_variant), status=status.HTTP_200_OK)
+
+
+class StockAsOfAPIView(APIView):
+    """
+    Tồn kho tại cuối ngày ?date=YYYY-MM-DD (snapshot gần nhất + phát sinh sau đó).
+    ?variant_id=1,2 để giới hạn theo variant.
+    """
+    permission_classes = [AllowAny]
+    use_read_replica = True
+
+    def get(self, request):
+        try:
+            day = parse_date(request.query_params.get('date', ''))
+        except ValueError:
+            day = None
+        if day is None:
+            return Response({"error": "date phải có dạng YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        variant_ids = request.query_params.get('variant_id')
+        if variant_ids:
+            try:
+                variant_ids = [int(variant_id) for variant_id in variant_ids.split(',')]
+            except ValueError:
+                return Response({"error": "variant_id phải là danh sách số nguyên."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stock_as_of(day, variant_ids or None), status=status.HTTP_200_OK)
\ No newline at end of file
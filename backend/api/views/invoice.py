@@ -2,8 +2,9 @@ from rest_framework import generics
 from rest_framework.permissions import AllowAny
 from ..models import Invoice
 from ..serializers import InvoiceSerializer
+from .mixins import QueryPlanMixin
 
-class InvoiceListCreate(generics.ListCreateAPIView):
+class InvoiceListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class=InvoiceSerializer
     queryset=Invoice.objects.all()
     permission_classes=[AllowAny]
@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..services.profiling import request_metrics
+
+
+class QueryMetricsAPIView(APIView):
+    """
+    Số liệu của QueryProfilingMiddleware theo từng endpoint trong process hiện tại.
+    DELETE để xóa số liệu đã cộng dồn (ví dụ trước khi đo lại sau khi sửa N+1).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "default_budget": getattr(settings, 'DEFAULT_QUERY_BUDGET', None),
+            "budgets": getattr(settings, 'QUERY_BUDGETS', {}),
+            "endpoints": request_metrics.snapshot(),
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        request_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,90 @@
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def _relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _walk_source(model, parts, prefix, select, prefetch):
+    # Đi theo chuỗi source kiểu 'product.prod_name' qua các quan hệ của model
+    path = prefix
+    in_prefetch = False
+    for name in parts:
+        field = _relation(model, name)
+        if field is None or field.related_model is None:
+            return
+        path = f"{path}__{name}" if path else name
+        if field.many_to_many or field.one_to_many:
+            in_prefetch = True
+        (prefetch if in_prefetch else select).add(path)
+        model = field.related_model
+
+
+def _walk_serializer(serializer, model, prefix, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        parts = field.source.split('.')
+        if isinstance(field, serializers.ListSerializer):
+            relation = _relation(model, parts[0])
+            if relation is None or relation.related_model is None:
+                continue
+            path = f"{prefix}__{parts[0]}" if prefix else parts[0]
+            prefetch.add(path)
+            nested_select = set()
+            _walk_serializer(field.child, relation.related_model, path, nested_select, prefetch)
+            prefetch.update(nested_select)
+        elif isinstance(field, serializers.BaseSerializer):
+            relation = _relation(model, parts[0])
+            if relation is None or relation.related_model is None:
+                continue
+            _walk_source(model, parts, prefix, select, prefetch)
+            path = f"{prefix}__{parts[0]}" if prefix else parts[0]
+            _walk_serializer(field, relation.related_model, path, select, prefetch)
+        elif isinstance(field, serializers.ManyRelatedField):
+            _walk_source(model, parts, prefix, prefetch, prefetch)
+        elif len(parts) > 1:
+            # Bỏ phần tử cuối vì đó là thuộc tính, không phải quan hệ
+            _walk_source(model, parts[:-1], prefix, select, prefetch)
+
+
+@lru_cache(maxsize=None)
+def relation_graph(serializer_class):
+    """
+    Suy ra các đường dẫn select_related/prefetch_related từ field của serializer:
+    - source có dấu chấm qua FK/OneToOne => select_related
+    - serializer lồng many=True, quan hệ ngược hoặc many-to-many => prefetch_related
+    """
+    model = serializer_class.Meta.model
+    select, prefetch = set(), set()
+    _walk_serializer(serializer_class(), model, '', select, prefetch)
+    return tuple(sorted(select)), tuple(sorted(prefetch))
+
+
+class QueryPlanMixin:
+    """
+    Thêm select_related/prefetch_related vào queryset của view để số query
+    không tăng theo số dòng trên một trang.
+    View khai báo thêm select_related_fields/prefetch_related_fields cho các
+    quan hệ mà serializer dùng nhưng không suy ra được (SerializerMethodField,
+    to_representation).
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        select, prefetch = relation_graph(self.get_serializer_class())
+        select = set(select) | set(self.select_related_fields)
+        prefetch = set(prefetch) | set(self.prefetch_related_fields)
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
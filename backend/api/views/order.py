@@ -3,9 +3,10 @@ from rest_framework.permissions import AllowAny
 from rest_framework.pagination import LimitOffsetPagination
 from ..serializers import OrderSerializer
 from ..models import Order
+from .mixins import QueryPlanMixin
 
 
-class OrderListCreate(generics.ListCreateAPIView):
+class OrderListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class=OrderSerializer
     pagination_class=LimitOffsetPagination
     permission_classes=[AllowAny]
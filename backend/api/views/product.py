@@ -3,9 +3,11 @@ from rest_framework.permissions import AllowAny
 from rest_framework.pagination import LimitOffsetPagination
 from ..models import Category, Product, ProductVariant
 from ..serializers import CategorySerializer, ProductSerializer, ProductVariantSerializer
+from .mixins import QueryPlanMixin
+from ..services import search
 
 
-class CategoryListCreate(generics.ListCreateAPIView):
+class CategoryListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     pagination_class = LimitOffsetPagination
     permission_classes = [AllowAny]
@@ -38,31 +40,34 @@ class CategoryDelete(generics.DestroyAPIView):
     permission_classes = [AllowAny]
     
     
-class ProductListCreate(generics.ListCreateAPIView):
+class ProductListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
     pagination_class = LimitOffsetPagination
+    # Tồn kho và thuộc tính được đọc từ bảng tổng hợp bằng 1 join
+    select_related_fields = ('stock_summary',)
     
     def get_queryset(self):
         name = self.request.query_params.get('name')
         type = self.request.query_params.get('type')
         cate = self.request.query_params.get('category')
         price= self.request.query_params.get('price')
+        queryset = Product.objects.all()
         if name:
-            return Product.objects.filter(prod_name__icontains=name)
+            return search(queryset, name)
         if type:
-            return Product.objects.filter(prod_type__icontains=type)
+            return queryset.filter(prod_type__icontains=type)
         if cate:
             category_ids = Category.objects.filter(cate_name__icontains=cate).values_list('id', flat=True)
-            return Product.objects.filter(category__in=category_ids)
+            return queryset.filter(category__in=category_ids)
         if price:
             return
-        return Product.objects.all()
+        return queryset.all()
     
     
 class ProductDetail(generics.RetrieveAPIView):
     serializer_class = ProductSerializer
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('stock_summary')
     permission_classes = [AllowAny]
     
     
@@ -78,7 +83,7 @@ class ProductDelete(generics.DestroyAPIView):
     permission_classes = [AllowAny]
     
     
-class VariantListCreate(generics.ListCreateAPIView):
+class VariantListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = ProductVariantSerializer
     pagination_class = LimitOffsetPagination
     permission_classes = [AllowAny]
@@ -87,7 +92,7 @@ class VariantListCreate(generics.ListCreateAPIView):
         name = self.request.query_params.get('name')
         product = self.request.query_params.get('product')
         if name: 
-            return ProductVariant.objects.filter(variant_name__icontains=name)
+            return search(ProductVariant.objects.all(), name)
         if product:
             return ProductVariant.objects.filter(product__prod_name__icontains=product)
         return ProductVariant.objects.all()
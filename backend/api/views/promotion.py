@@ -1,10 +1,13 @@
 from rest_framework.permissions import AllowAny
 from rest_framework.pagination import LimitOffsetPagination
-from rest_framework import generics
-from ..serializers import DiscountSerializer, CouponSerializer, RewardTierSerializer, LoyaltyRewardSerializer, PromotionConditionSerializer
+from rest_framework import generics, status
+from rest_framework.response import Response
+from ..serializers import DiscountSerializer, CouponSerializer, RewardTierSerializer, LoyaltyRewardSerializer, PromotionConditionSerializer, PromotionEvaluateSerializer, CouponValidateSerializer
+from ..services import evaluate_promotions, validate_coupon, lookup_coupons, code_prefix_filter
 from ..models import Discount, Coupon, RewardTier, LoyaltyReward, PromotionCondition
+from .mixins import QueryPlanMixin
 
-class DiscountListCreate(generics.ListCreateAPIView):
+class DiscountListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = DiscountSerializer
     pagination_class = LimitOffsetPagination
     permission_classes = [AllowAny]
@@ -45,15 +48,22 @@ class DiscountDelete(generics.DestroyAPIView):
     permission_classes = [AllowAny]
     
     
-class CouponListCreate(generics.ListCreateAPIView):
+class CouponListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = CouponSerializer
     pagination_class = LimitOffsetPagination
     permission_classes = [AllowAny]
     
     def get_queryset(self):
+        """
+        ?code=: mã chứa chuỗi (không phân biệt hoa thường).
+        ?code_prefix=: mã bắt đầu bằng chuỗi, dùng index của cột code (nhanh hơn khi bảng lớn).
+        """
         code = self.request.query_params.get('code')
         if code:
             return Coupon.objects.filter(code__icontains=code)
+        prefix = self.request.query_params.get('code_prefix')
+        if prefix:
+            return Coupon.objects.filter(code_prefix_filter(prefix)).order_by('code')
         return Coupon.objects.all()
 
 
@@ -75,7 +85,7 @@ class CouponDelete(generics.DestroyAPIView):
     permission_classes = [AllowAny]
     
     
-class RewardTierListCreate(generics.ListCreateAPIView):
+class RewardTierListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = RewardTierSerializer
     pagination_class = LimitOffsetPagination
     queryset = RewardTier.objects.all()
@@ -100,7 +110,7 @@ class RewardTierDelete(generics.DestroyAPIView):
     permission_classes = [AllowAny]
     
     
-class LoyaltyTierListCreate(generics.ListCreateAPIView):
+class LoyaltyTierListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = LoyaltyRewardSerializer
     pagination_class = LimitOffsetPagination
     queryset = LoyaltyReward.objects.all()
@@ -125,7 +135,7 @@ class LoyaltyTierDelete(generics.DestroyAPIView):
     permission_classes = [AllowAny]
     
     
-class PromotionConditionListCreate(generics.ListCreateAPIView):
+class PromotionConditionListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = PromotionConditionSerializer
     permission_classes = [AllowAny]
     def get_queryset(self):
@@ -154,4 +164,45 @@ class PromotionConditionUpdate(generics.UpdateAPIView):
 class PromotionConditionDelete(generics.DestroyAPIView):
     serializer_class = PromotionConditionSerializer
     queryset = PromotionCondition.objects.all()
-    permission_classes = [AllowAny]
\ No newline at end of file
+    permission_classes = [AllowAny]
+
+
+class PromotionEvaluateAPIView(generics.GenericAPIView):
+    """Các khuyến mãi áp dụng được cho giỏ hàng (khuyến mãi tốt nhất đứng đầu), không tạo đơn."""
+    serializer_class = PromotionEvaluateSerializer
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        promotions = evaluate_promotions(serializer.cart_lines())
+        return Response({
+            'best': promotions[0] if promotions else None,
+            'promotions': promotions,
+        }, status=status.HTTP_200_OK)
+
+
+class CouponValidateAPIView(generics.GenericAPIView):
+    """Kiểm tra mã coupon có dùng được cho giỏ hàng lúc này không (đọc bảng coupon đã cache), không tạo đơn."""
+    serializer_class = CouponValidateSerializer
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        result = validate_coupon(serializer.validated_data['code'], serializer.cart_total())
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class CouponLookupAPIView(generics.GenericAPIView):
+    """Gợi ý mã coupon còn hiệu lực theo phần đầu mã đang gõ (?code=...&limit=...)."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({"error": "limit phải là số nguyên."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(lookup_coupons(request.query_params.get('code', ''), limit), status=status.HTTP_200_OK)
\ No newline at end of file
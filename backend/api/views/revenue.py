@@ -5,26 +5,28 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 from rest_framework import status
-from ..models import Order
+from ..models import DailyRevenue
 from ..serializers import EmptySerializer
 
 
 class RevenueStatisticsAPIView(APIView):
     # serializer_class = EmptySerializer
     permission_classes = [AllowAny]
+    use_read_replica = True
     
     def get(self, request):
         period = request.query_params.get("period", "month").lower()  # default: month
         start_date = request.query_params.get("start_date")
         end_date = request.query_params.get("end_date")
 
-        queryset = Order.objects.filter(status=Order.Status.COMPLETE)
+        # Đọc từ bảng doanh thu theo ngày thay vì quét toàn bộ Order
+        queryset = DailyRevenue.objects.all()
 
         # Lọc theo khoảng thời gian nếu có
         if start_date:
-            queryset = queryset.filter(order_date__gte=start_date)
+            queryset = queryset.filter(date__gte=start_date)
         if end_date:
-            queryset = queryset.filter(order_date__lte=end_date)
+            queryset = queryset.filter(date__lte=end_date)
 
         # Chọn kiểu thống kê
         if period == "week":
@@ -36,17 +38,20 @@ class RevenueStatisticsAPIView(APIView):
 
         data = (
             queryset
-            .annotate(period=trunc_func("order_date"))
+            .annotate(period=trunc_func("date"))
             .values("period")
-            .annotate(total=Sum("total_amount"))
+            .annotate(total=Sum("total_amount"), refund=Sum("refund_amount"))
             .order_by("period")
         )
         
         # Chuyển định dạng datetime -> string cho JSON
+        # total_amount giữ nghĩa doanh thu gộp như trước, tiền hoàn và doanh thu thuần là các field riêng
         formatted_data = [
             {
                 'period': item['period'].strftime('%Y-%m-%d'),
-                'total_amount': item['total']
+                'total_amount': item['total'],
+                'refund_amount': item['refund'],
+                'net_amount': item['total'] - item['refund'],
             }
             for item in data
         ]
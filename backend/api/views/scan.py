@@ -0,0 +1,25 @@
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from ..services.scan import scan_lookup
+
+
+class ScanAPIView(APIView):
+    """
+    Quét mã tại quầy: ?code=<sku hoặc barcode>.
+    Trả về variant kèm giá, đơn vị và tồn kho hiện tại; nếu barcode ứng với
+    nhiều variant thì trả 300 cùng danh sách để thu ngân chọn.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        code = request.query_params.get('code')
+        if not code:
+            return Response({"error": "Thiếu mã cần quét (code)."}, status=status.HTTP_400_BAD_REQUEST)
+        rows = scan_lookup(code)
+        if not rows:
+            return Response({"detail": "Không tìm thấy sản phẩm."}, status=status.HTTP_404_NOT_FOUND)
+        if len(rows) > 1:
+            return Response({"variants": rows}, status=status.HTTP_300_MULTIPLE_CHOICES)
+        return Response(rows[0], status=status.HTTP_200_OK)
@@ -1,11 +1,13 @@
 from rest_framework import generics
 from ..models import Supplier, PurchaseOrder
 from ..serializers import SupplierSerializer, PurchaseOrderSerializer
+from .mixins import QueryPlanMixin
+from ..services import search
 from rest_framework.permissions import AllowAny, DjangoModelPermissions
 from rest_framework.pagination import LimitOffsetPagination
 
 
-class SupplierListCreate(generics.ListCreateAPIView):
+class SupplierListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = SupplierSerializer
     permission_classes = [AllowAny]
     pagination_class = LimitOffsetPagination
@@ -18,7 +20,7 @@ class SupplierListCreate(generics.ListCreateAPIView):
         if phone: 
             return Supplier.objects.filter(sup_phone=phone)
         if name:
-            return Supplier.objects.filter(sup_name__icontains=name)
+            return search(Supplier.objects.all(), name)
         if address: 
             return Supplier.objects.filter(sup_add__icontains=address)
         if contact:
@@ -44,10 +46,12 @@ class SupplierUpdate(generics.UpdateAPIView):
     permission_classes = [AllowAny]
     
     
-class PurchaseOrderListCreate(generics.ListCreateAPIView):
+class PurchaseOrderListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class=PurchaseOrderSerializer
     pagination_class=LimitOffsetPagination
     permission_classes=[AllowAny]
+    # supplier_name được thêm trong to_representation
+    select_related_fields=('supplier',)
     
     def get_queryset(self):
         return PurchaseOrder.objects.all()
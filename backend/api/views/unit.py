@@ -3,9 +3,10 @@ from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import AllowAny
 from ..serializers import UnitSerializer
 from ..models import Unit
+from .mixins import QueryPlanMixin
 
 
-class UnitListCreate(generics.ListCreateAPIView):
+class UnitListCreate(QueryPlanMixin, generics.ListCreateAPIView):
     serializer_class = UnitSerializer
     pagination_class = LimitOffsetPagination
     permission_classes = [AllowAny]
@@ -0,0 +1,29 @@
+from contextvars import ContextVar
+from django.conf import settings
+
+
+REPLICA_ALIAS = 'replica'
+
+# Được bật bởi api.middleware.ReadReplicaMiddleware trong các request chỉ đọc
+use_replica = ContextVar('use_replica', default=False)
+
+
+class ReadReplicaRouter:
+    """
+    Gửi các truy vấn đọc của request chỉ đọc sang alias 'replica',
+    mọi truy vấn ghi và migrate luôn dùng 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -84,6 +84,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReadReplicaMiddleware',
+    'api.middleware.QueryProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -110,12 +112,85 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Mặc định dùng SQLite. Đặt DB_ENGINE=postgres để dùng PostgreSQL:
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT   - database chính (ghi)
+#   DB_CONN_MAX_AGE                                   - giữ kết nối lâu dài (giây)
+#   DB_POOL=1, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE     - connection pool (cần psycopg 3 + psycopg_pool)
+#   DB_REPLICA_HOST, DB_REPLICA_PORT, DB_REPLICA_NAME - read replica cho các view chỉ đọc
+# Với SQLite, alias 'replica' trỏ tới cùng file (hoặc DB_REPLICA_NAME) làm replica giả lập khi chạy local.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'erp'),
+            'USER': os.getenv('DB_USER', 'postgres'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if os.getenv('DB_POOL') == '1':
+        # Pool của psycopg 3 không dùng chung được với CONN_MAX_AGE
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        }
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # WAL cho phép đọc trong lúc ghi, IMMEDIATE tránh lỗi "database is locked"
+                # khi nhiều giao dịch cùng nâng cấp từ khóa đọc lên khóa ghi
+                'init_command': 'PRAGMA journal_mode=WAL;',
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        }
+    }
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['backend.routers.ReadReplicaRouter']
+
+
+# Cache
+# Các bảng tra cứu cache trong process (tier, quy đổi đơn vị, luật khuyến mãi, coupon - xem api/services/cache.py)
+# báo cho nhau khi dữ liệu đổi qua 1 key phiên bản trong cache này. Chạy nhiều worker (gunicorn) cần
+# REDIS_URL (vd redis://localhost:6379/1) để cache dùng chung giữa các worker. Không đặt REDIS_URL thì dùng
+# LocMemCache riêng từng process và các bảng đó tự nạp lại sau LOCAL_CACHE_TABLE_TTL giây.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+LOCAL_CACHE_TABLE_TTL = 10
 
 
 # Password validation
@@ -165,4 +240,43 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # Thư mục trên server nơi cá
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
-CORS_ALLOWS_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOWS_CREDENTIALS = True
+
+# Chiến lược xuất lô hàng: 'FIFO' (nhập trước xuất trước) hoặc 'FEFO' (hết hạn trước xuất trước)
+INVENTORY_ALLOCATION_STRATEGY = 'FIFO'
+
+# Phương pháp tính giá vốn hàng xuất: 'AVERAGE' (bình quân gia quyền di động) hoặc 'FIFO' (giá nhập của lô được xuất)
+INVENTORY_COSTING_METHOD = 'AVERAGE'
+
+# Số ngày cảnh báo trước khi lô hết hạn (mặc định cho category không đặt expiry_warning_days)
+EXPIRY_WARNING_DAYS = 10
+
+# Tự áp dụng khuyến mãi có lợi nhất khi tạo/sửa đơn không chọn discount
+PROMOTION_AUTO_APPLY = True
+
+# Thời gian sống (giây) của bảng coupon còn hạn cache trong process, dùng khi kiểm tra/gợi ý mã
+COUPON_CACHE_TTL = 30
+
+# Cache mã vạch/SKU -> variant trong process, chỉ giữ id variant (số mục tối đa, thời gian sống tính bằng giây)
+SCAN_CACHE_SIZE = 4096
+SCAN_CACHE_TTL = 30
+
+# Số ngày giữ nhật ký thay đổi catalog (prune_catalog_changes), máy POS đồng bộ cũ hơn sẽ tải lại toàn bộ
+CATALOG_CHANGE_RETENTION_DAYS = 30
+
+# Đo số query/thời gian SQL/thời gian xử lý ngoài SQL (app) cho mỗi view DRF (xem api/metrics/)
+QUERY_PROFILING = True
+# Trả số liệu qua header X-Query-Count, X-SQL-Time-Ms, X-App-Time-Ms, Server-Timing
+QUERY_PROFILING_HEADERS = DEBUG
+# Ngân sách số query theo tên URL, vượt quá sẽ ghi log cảnh báo
+DEFAULT_QUERY_BUDGET = 50
+QUERY_BUDGETS = {
+    'product-list': 5,
+    'variant-list': 5,
+    'customer-list': 5,
+    'supplier-list': 5,
+    'scan': 3,
+}
+
+# Xếp lại tier khách hàng trong thread nền sau khi sửa ngưỡng tier (dùng khi có rất nhiều khách hàng)
+TIER_REASSIGN_IN_BACKGROUND = False